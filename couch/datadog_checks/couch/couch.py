@@ -36,8 +36,8 @@ class CouchDb(AgentCheck):
         request_headers['Accept'] = 'text/json'
 
         try:
-            r = requests.get(url, auth=auth, headers=request_headers,
-                             timeout=int(instance.get('timeout', self.TIMEOUT)))
+            r = self.http.get(url, auth=auth, headers=request_headers,
+                              timeout=int(instance.get('timeout', self.TIMEOUT)))
             r.raise_for_status()
             if run_check:
                 self.service_check(self.SERVICE_CHECK_NAME, AgentCheck.OK,
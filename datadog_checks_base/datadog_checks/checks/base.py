@@ -10,6 +10,8 @@ import copy
 import traceback
 import unicodedata
 
+from six.moves import intern
+
 try:
     import datadog_agent
     from ..log import init_logging
@@ -24,6 +26,8 @@ except ImportError:
 
 from ..config import is_affirmative
 from ..utils.common import ensure_bytes
+from ..utils.http import HTTPClient
+from ..utils.lru_cache import LRUCache
 from ..utils.proxy import config_proxy_skip
 
 
@@ -33,6 +37,12 @@ class AgentCheck(object):
     """
     OK, WARNING, CRITICAL, UNKNOWN = (0, 1, 2, 3)
 
+    # Maximum number of distinct tag lists whose normalized form is kept in memory
+    TAGS_CACHE_SIZE = 4096
+
+    # Maximum number of normalized metric names remembered by `normalize`
+    METRIC_NAME_CACHE_SIZE = 2048
+
     def __init__(self, *args, **kwargs):
         """
         args: `name`, `init_config`, `agentConfig` (deprecated), `instances`
@@ -45,6 +55,14 @@ class AgentCheck(object):
         self.agentConfig = kwargs.get('agentConfig', {})
         self.warnings = []
 
+        # Normalized tags, keyed on the tuple of tags they were built from
+        self._tags_cache = {}
+        self._tags_cache_hits = 0
+        self._tags_cache_misses = 0
+
+        # Normalized metric names, keyed on `(metric, prefix, fix_case)`
+        self._metric_name_cache = LRUCache(self.METRIC_NAME_CACHE_SIZE)
+
         if len(args) > 0:
             self.name = args[0]
         if len(args) > 1:
@@ -75,6 +93,9 @@ class AgentCheck(object):
 
         self.default_integration_http_timeout = float(self.agentConfig.get('default_integration_http_timeout', 9))
 
+        # Pooled HTTP client, see `http`
+        self._http = None
+
         self._deprecations = {
             'increment': [
                 False,
@@ -102,6 +123,32 @@ class AgentCheck(object):
         self._log_deprecation('in_developer_mode')
         return False
 
+    @property
+    def http(self):
+        """
+        HTTP client keeping its connections alive across requests and check runs, to be used
+        instead of `requests`. Its pool size is set with the `http_pool_size` option of the
+        instance or `init_config`, and at least `get_http_min_pool_size`, the default timeout
+        is `default_integration_http_timeout`.
+        The Agent runs each instance with its own check object, so the client, like its
+        cookies, belongs to that single instance.
+        """
+        if self._http is None:
+            instance = self.instances[0] if self.instances else {}
+            self._http = HTTPClient.from_config(
+                instance, self.init_config, timeout=self.default_integration_http_timeout,
+                min_pool_size=self.get_http_min_pool_size(instance)
+            )
+
+        return self._http
+
+    def get_http_min_pool_size(self, instance):
+        """
+        Minimum pool size of `http` for the instance. Checks making concurrent requests
+        override it, so that each of them keeps its connection alive.
+        """
+        return 0
+
     def get_instance_proxy(self, instance, uri, proxies=None):
         proxies = proxies if proxies is not None else self.proxies.copy()
         proxies['no'] = os.getenv('no_proxy', os.getenv('NO_PROXY', None))
@@ -128,6 +175,42 @@ class AgentCheck(object):
 
         aggregator.submit_metric(self, self.check_id, mtype, name, float(value), tags, hostname)
 
+    def submit_metrics_batch(self, samples):
+        """
+        Submit many metric samples at once.
+
+        `samples` is an iterable of `(mtype, name, value, tags, hostname)` tuples, where `mtype` is
+        one of the aggregator types (e.g. `aggregator.GAUGE`). Samples with a `None` value are ignored.
+
+        Each distinct tag list is normalized only once for the whole batch, and the batch is handed
+        to the aggregator in a single call when it supports it.
+        """
+        normalized_tags = {}
+        batch = []
+        for mtype, name, value, tags, hostname in samples:
+            if value is None:
+                # ignore metric sample
+                continue
+
+            tags_key = tuple(tags) if tags else ()
+            try:
+                tags = normalized_tags[tags_key]
+            except KeyError:
+                tags = normalized_tags[tags_key] = self._normalize_tags_type(tags_key)
+
+            batch.append((mtype, name, float(value), tags, hostname or ""))
+
+        if not batch:
+            return
+
+        submit_metrics = getattr(aggregator, 'submit_metrics', None)
+        if submit_metrics is not None:
+            submit_metrics(self, self.check_id, batch)
+        else:
+            # Older agents only expose the per-sample binding
+            for mtype, name, value, tags, hostname in batch:
+                aggregator.submit_metric(self, self.check_id, mtype, name, value, tags, hostname)
+
     def gauge(self, name, value, tags=None, hostname=None, device_name=None):
         self._submit_metric(aggregator.GAUGE, name, value, tags=tags, hostname=hostname, device_name=device_name)
 
@@ -208,32 +291,52 @@ class AgentCheck(object):
         :param prefix A prefix to to add to the normalized name, default None
         :param fix_case A boolean, indicating whether to make sure that
                         the metric name returned is in underscore_case
+
+        Results are memoized, see `METRIC_NAME_CACHE_SIZE` and `get_metric_name_cache_stats`.
         """
+        key = (metric, prefix, fix_case)
+        name = self._metric_name_cache.get(key)
+        if name is None:
+            name = self._normalize(metric, prefix, fix_case)
+            self._metric_name_cache.set(key, name)
+
+        return name
+
+    # Runs of illegal characters and underscores become a single `_`, unless they
+    # surround a `.` in which case they are dropped
+    METRIC_NAME_CLEANUP = re.compile(r"([,\+\*\-/()\[\]{}\s_]*\.[,\+\*\-/()\[\]{}\s_]*)|[,\+\*\-/()\[\]{}\s_]+")
+
+    @staticmethod
+    def _metric_name_cleanup_repl(match):
+        return '.' if match.group(1) is not None else '_'
+
+    def _normalize(self, metric, prefix=None, fix_case=False):
         if isinstance(metric, unicode):
             metric_name = unicodedata.normalize('NFKD', metric).encode('ascii', 'ignore')
         else:
             metric_name = metric
 
         if fix_case:
-            name = self.convert_to_underscore_separated(metric_name)
+            metric_name = self.convert_to_underscore_separated(metric_name)
             if prefix is not None:
                 prefix = self.convert_to_underscore_separated(prefix)
-        else:
-            name = re.sub(r"[,\+\*\-/()\[\]{}\s]", "_", metric_name)
-        # Eliminate multiple _
-        name = re.sub(r"__+", "_", name)
+
+        # Replace illegal characters, eliminate multiple _ and drop ._ and _.
+        name = self.METRIC_NAME_CLEANUP.sub(self._metric_name_cleanup_repl, metric_name)
         # Don't start/end with _
-        name = re.sub(r"^_", "", name)
-        name = re.sub(r"_$", "", name)
-        # Drop ._ and _.
-        name = re.sub(r"\._", ".", name)
-        name = re.sub(r"_\.", ".", name)
+        name = name.strip('_')
 
         if prefix is not None:
             return prefix + "." + name
         else:
             return name
 
+    def get_metric_name_cache_stats(self):
+        """
+        Return the hit/miss counters and the current size of the `normalize` cache
+        """
+        return self._metric_name_cache.stats()
+
     FIRST_CAP_RE = re.compile('(.)([A-Z][a-z]+)')
     ALL_CAP_RE = re.compile('([a-z0-9])([A-Z])')
     METRIC_REPLACEMENT = re.compile(r'([^a-zA-Z0-9_.]+)|(^[^a-zA-Z]+)')
@@ -268,22 +371,61 @@ class AgentCheck(object):
         """
         Normalize all the tags to bytes (type `bytes`) so that the go bindings can handle them easily
         Doesn't mutate the passed list, returns a new list
+
+        The normalized tags are cached per distinct tag list, up to `TAGS_CACHE_SIZE` entries.
         """
-        normalized_tags = []
-        if tags is not None:
-            for tag in tags:
-                # TODO: On Python 3, move this `if` line to the `except` branch
-                # as the common case will indeed no longer be bytes.
-                if not isinstance(tag, bytes):
-                    try:
-                        tag = tag.encode('utf-8')
-                    except Exception:
-                        self.log.warning('Error encoding tag to utf-8 encoded string, ignoring tag')
-                        continue
-
-                normalized_tags.append(tag)
+        if not tags:
+            return []
 
-        return normalized_tags
+        try:
+            key = tuple(tags)
+            normalized_tags = self._tags_cache[key]
+        except KeyError:
+            self._tags_cache_misses += 1
+            normalized_tags = self._encode_tags(key)
+            if len(self._tags_cache) >= self.TAGS_CACHE_SIZE:
+                self._tags_cache.clear()
+            self._tags_cache[key] = normalized_tags
+        except TypeError:
+            # Unhashable tags, don't cache them
+            return list(self._encode_tags(tags))
+        else:
+            self._tags_cache_hits += 1
+
+        return list(normalized_tags)
+
+    def _encode_tags(self, tags):
+        """
+        Encode the tags to utf-8, interning the resulting strings, and return them as a tuple
+        """
+        encoded_tags = []
+        for tag in tags:
+            # TODO: On Python 3, move this `if` line to the `except` branch
+            # as the common case will indeed no longer be bytes.
+            if not isinstance(tag, bytes):
+                try:
+                    tag = tag.encode('utf-8')
+                except Exception:
+                    self.log.warning('Error encoding tag to utf-8 encoded string, ignoring tag')
+                    continue
+
+                # Only `str` can be interned, i.e. on Python 2
+                if isinstance(tag, str):
+                    tag = intern(tag)
+
+            encoded_tags.append(tag)
+
+        return tuple(encoded_tags)
+
+    def get_tags_cache_stats(self):
+        """
+        Return the hit/miss counters and the current size of the normalized tags cache
+        """
+        return {
+            'hits': self._tags_cache_hits,
+            'misses': self._tags_cache_misses,
+            'size': len(self._tags_cache),
+        }
 
     def warning(self, warning_message):
         warning_message = str(warning_message)
@@ -18,6 +18,10 @@ class PrometheusScraper(PrometheusScraperMixin):
         super(PrometheusScraper, self).__init__()
         self.check = check
 
+    @property
+    def http(self):
+        return self.check.http
+
     def _submit_rate(self, metric_name, val, metric, custom_tags=None, hostname=None):
         """
         Submit a metric as a rate, additional tags provided will be added to
@@ -53,18 +57,6 @@ class PrometheusScraper(PrometheusScraperMixin):
         _tags = self._metric_tags(metric_name, val, metric, custom_tags, hostname)
         self.check.monotonic_count('{}.{}'.format(self.NAMESPACE, metric_name), val, _tags, hostname=hostname)
 
-    def _metric_tags(self, metric_name, val, metric, custom_tags=None, hostname=None):
-        _tags = []
-        if custom_tags is not None:
-            _tags += custom_tags
-        for label in metric.label:
-            if self.exclude_labels is None or label.name not in self.exclude_labels:
-                tag_name = label.name
-                if self.labels_mapper is not None and label.name in self.labels_mapper:
-                    tag_name = self.labels_mapper[label.name]
-                _tags.append('{}:{}'.format(tag_name, label.value))
-        return self._finalize_tags_to_submit(_tags, metric_name, val, metric, custom_tags=custom_tags, hostname=hostname)
-
     def _submit_service_check(self, *args, **kwargs):
         self.check.service_check(*args, **kwargs)
 
@@ -161,6 +153,7 @@ class GenericPrometheusCheck(AgentCheck):
         scraper.prometheus_metrics_prefix = instance.get("prometheus_metrics_prefix", default_instance.get("prometheus_metrics_prefix", ''))
         scraper.label_to_hostname = instance.get("label_to_hostname", default_instance.get("label_to_hostname", None))
         scraper.health_service_check = instance.get("health_service_check", default_instance.get("health_service_check", True))
+        scraper.fast_text_parser = instance.get("fast_text_parser", default_instance.get("fast_text_parser", False))
         scraper.ssl_cert = instance.get("ssl_cert", default_instance.get("ssl_cert", None))
         scraper.ssl_private_key = instance.get("ssl_private_key", default_instance.get("ssl_private_key", None))
         scraper.ssl_ca_cert = instance.get("ssl_ca_cert", default_instance.get("ssl_ca_cert", None))
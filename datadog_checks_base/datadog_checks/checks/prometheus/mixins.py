@@ -8,9 +8,11 @@ import requests
 from urllib3 import disable_warnings
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 from collections import defaultdict
-from google.protobuf.internal.decoder import _DecodeVarint32  # pylint: disable=E0611,E0401
 from ...utils.prometheus import metrics_pb2
+from ...utils.prometheus.functions import get_metric_family_name, iter_delimited_messages
+from ...utils.prometheus.text_parser import parse_text_families
 from math import isnan, isinf
+from six import viewkeys
 from prometheus_client.parser import text_fd_to_metric_families
 
 # toolkit
@@ -89,18 +91,19 @@ class PrometheusScraperMixin(object):
         # }
         self._label_mapping = {}
 
-        # `_active_label_mapping` holds a dictionary of label values found during the run
-        # to cleanup the label_mapping of unused values, example:
+        # `_active_label_mapping` holds the label values found during the current scrape,
+        # the values of `_label_mapping` that aren't part of it at the end of the scrape
+        # are expired, example:
         # self._active_label_mapping = {
-        #     'pod': {
-        #         'dd-agent-9s1l1': True
-        #     }
+        #     'pod': {'dd-agent-9s1l1'}
         # }
         self._active_label_mapping = {}
 
         # `_watched_labels` holds the list of label to watch for enrichment
         self._watched_labels = set()
 
+        # On the first scrape with label joins, `_label_mapping` is empty: the payload
+        # is read twice, the first pass only stores the labels to join
         self._dry_run = True
 
         # Some metrics are ignored because they are duplicates or introduce a
@@ -155,29 +158,50 @@ class PrometheusScraperMixin(object):
         # INTERNAL FEATURE, might be removed in future versions
         self._text_filter_blacklist = []
 
-    def parse_metric_family(self, response):
+        # Request the text format and submit its samples as they are parsed in `process`, without
+        # building MetricFamily messages. Only families handled by a method are still converted to
+        # messages. Not used when `label_joins` are configured.
+        self.fast_text_parser = False
+
+        # `_label_tags_plan` maps each label name seen to the tag name it is submitted as, or to
+        # None if it's excluded. It's built from `exclude_labels` and `labels_mapper`, which are
+        # snapshotted in `_label_tags_config` to detect changes.
+        self._label_tags_plan = {}
+        self._label_tags_config = None
+
+    def parse_metric_family(self, response, skip_unprocessed=False, metric_names=None):
         """
         Parse the MetricFamily from a valid requests.Response object to provide a MetricFamily object (see [0])
 
         The text format uses iter_lines() generator.
 
-        The protobuf format directly parse the response.content property searching for Prometheus messages of type
-        MetricFamily [0] delimited by a varint32 [1] when the content-type is a `application/vnd.google.protobuf`.
+        The protobuf format reads the response by chunks using iter_content() and parses the Prometheus messages of
+        type MetricFamily [0] delimited by a varint32 [1] as soon as they are complete, when the content-type is a
+        `application/vnd.google.protobuf`. Memory usage is bounded by the largest MetricFamily, not the payload size.
 
         [0] https://github.com/prometheus/client_model/blob/086fe7ca28bde6cec2acd5223423c1475a362858/metrics.proto#L76-%20%20L81
         [1] https://developers.google.com/protocol-buffers/docs/reference/java/com/google/protobuf/AbstractMessageLite#writeDelimitedTo(java.io.OutputStream)
 
+        If `skip_unprocessed` is True, protobuf MetricFamily messages that `process_metric` would not submit
+        (see `_is_metric_processed`) are skipped after reading their name, without being parsed.
+
+        If `metric_names` is given, only the MetricFamily with one of these names are returned.
+
         :param response: requests.Response
+        :param skip_unprocessed: bool
+        :param metric_names: collection of metric names
         :return: metrics_pb2.MetricFamily()
         """
         if 'application/vnd.google.protobuf' in response.headers['Content-Type']:
-            n = 0
-            buf = response.content
-            while n < len(buf):
-                msg_len, new_pos = _DecodeVarint32(buf, n)
-                n = new_pos
-                msg_buf = buf[n:n+msg_len]
-                n += msg_len
+            for msg_buf in iter_delimited_messages(response.iter_content(chunk_size=self.REQUESTS_CHUNK_SIZE)):
+                if skip_unprocessed or metric_names is not None:
+                    name = get_metric_family_name(msg_buf)
+                    if name is not None:
+                        name = self.remove_metric_prefix(name)
+                        if metric_names is not None and name not in metric_names:
+                            continue
+                        if skip_unprocessed and not self._is_metric_processed(name):
+                            continue
 
                 message = metrics_pb2.MetricFamily()
                 message.ParseFromString(msg_buf)
@@ -204,6 +228,8 @@ class PrometheusScraperMixin(object):
             obj_help = {}  # help for the metrics
             for metric in text_fd_to_metric_families(input_gen):
                 metric.name = self.remove_metric_prefix(metric.name)
+                if metric_names is not None and metric.name not in metric_names:
+                    continue
                 metric_name = "%s_bucket" % metric.name if metric.type == "histogram" else metric.name
                 metric_type = self.type_overrides.get(metric_name, metric.type)
                 if metric_type == "untyped" or metric_type not in self.METRIC_TYPES:
@@ -242,6 +268,27 @@ class PrometheusScraperMixin(object):
                 # No blacklist matches, passing the line through
                 yield line
 
+    def _is_metric_processed(self, name):
+        """
+        Return whether `process_metric` could use the metric family with the given name: it is
+        used for label joins, or it is not ignored and is either mapped, handled by a method
+        of the same name or matched by a wildcard.
+        """
+        if name in self.label_joins:
+            return True
+        if name in self.ignore_metrics:
+            return False
+        if name in self.metrics_mapper or hasattr(self, name):
+            return True
+
+        if self._metrics_wildcards is None:
+            self._metrics_wildcards = [x for x in self.metrics_mapper.keys() if '*' in x]
+        for wildcard in self._metrics_wildcards:
+            if fnmatchcase(name, wildcard):
+                return True
+
+        return False
+
     def remove_metric_prefix(self, metric):
         return metric[len(self.prometheus_metrics_prefix):] if metric.startswith(self.prometheus_metrics_prefix) else metric
 
@@ -341,9 +388,10 @@ class PrometheusScraperMixin(object):
                         _l.value = _metric['labels'][lbl]
         return _obj
 
-    def scrape_metrics(self, endpoint):
+    def scrape_metrics(self, endpoint, skip_unprocessed=False):
         """
         Poll the data from prometheus and return the metrics as a generator.
+        See `parse_metric_family` for `skip_unprocessed`.
         """
         response = self.poll(endpoint)
         try:
@@ -355,17 +403,24 @@ class PrometheusScraperMixin(object):
                 for metric, val in self.label_joins.iteritems():
                     self._watched_labels.add(val['label_to_match'])
 
-            for metric in self.parse_metric_family(response):
+            self._active_label_mapping = {label: set() for label in self._watched_labels}
+
+            if self._dry_run:
+                # Load the whole payload in memory so that it can be read twice: a first pass stores the
+                # labels to join, so that they are already joined during the second one
+                response.content
+                for metric in self.parse_metric_family(response, metric_names=self.label_joins):
+                    self.store_labels(metric)
+                self._dry_run = False
+
+            for metric in self.parse_metric_family(response, skip_unprocessed=skip_unprocessed):
                 yield metric
 
-            # Set dry run off
-            self._dry_run = False
-            # Garbage collect unused mapping and reset active labels
-            for metric, mapping in self._label_mapping.items():
-                for key, val in mapping.items():
-                    if key not in self._active_label_mapping[metric]:
-                        del self._label_mapping[metric][key]
-            self._active_label_mapping = {}
+            # Expire the mapping of the label values that weren't found during this scrape
+            for label_name, mapping in self._label_mapping.iteritems():
+                active = self._active_label_mapping.get(label_name, ())
+                for value in viewkeys(mapping) - active:
+                    del mapping[value]
         finally:
             response.close()
 
@@ -381,26 +436,170 @@ class PrometheusScraperMixin(object):
         if instance:
             kwargs['custom_tags'] = instance.get('tags', [])
 
-        for metric in self.scrape_metrics(endpoint):
+        self._check_label_tags_plan()
+
+        if self.fast_text_parser and not self.label_joins:
+            self._process_text_samples(endpoint, **kwargs)
+            return
+
+        for metric in self.scrape_metrics(endpoint, skip_unprocessed=True):
             self.process_metric(metric, **kwargs)
 
+    def _process_text_samples(self, endpoint, **kwargs):
+        """
+        Polls the data from prometheus in the text format and submits the samples of each
+        family as soon as it is parsed, see `fast_text_parser`.
+        """
+        response = self.poll(endpoint, pFormat=PrometheusFormat.TEXT)
+        try:
+            self._dry_run = False
+            if 'text/plain' not in response.headers['Content-Type']:
+                # The endpoint may not support the text format
+                for metric in self.parse_metric_family(response, skip_unprocessed=True):
+                    self.process_metric(metric, **kwargs)
+                return
+
+            input_gen = response.iter_lines(chunk_size=self.REQUESTS_CHUNK_SIZE)
+            if self._text_filter_blacklist:
+                input_gen = self._text_filter_input(input_gen)
+
+            for name, metric_type, samples in parse_text_families(input_gen):
+                self.process_text_family(self.remove_metric_prefix(name), metric_type, samples, **kwargs)
+        finally:
+            response.close()
+
+    def process_text_family(self, name, metric_type, samples, **kwargs):
+        """
+        Handle the samples of a metric family parsed from the text format, following the
+        same flow as `process_metric`.
+        """
+        type_override_name = '{}_bucket'.format(name) if metric_type == 'histogram' else name
+        metric_type = self.type_overrides.get(type_override_name, metric_type)
+        if metric_type == 'untyped' or metric_type not in self.METRIC_TYPES:
+            return
+
+        if name in self.ignore_metrics:
+            return  # Ignore the metric
+
+        try:
+            metric_name = self.metrics_mapper[name]
+        except KeyError:
+            if not kwargs.get('ignore_unmapped', False):
+                if hasattr(self, name):
+                    # call magic method (non-generic check) with a MetricFamily
+                    self.process_metric(self._text_family_to_message(name, metric_type, samples), **kwargs)
+                else:
+                    self.log.debug("Unable to handle metric: {} - error: no mapping or method found".format(name))
+                return
+
+            # build the wildcard list if first pass
+            if self._metrics_wildcards is None:
+                self._metrics_wildcards = [x for x in self.metrics_mapper.keys() if '*' in x]
+            # try matching wildcard (generic check)
+            if not any(fnmatchcase(name, wildcard) for wildcard in self._metrics_wildcards):
+                return
+            metric_name = name
+
+        self._submit_text_samples(
+            metric_name,
+            name,
+            metric_type,
+            samples,
+            send_histograms_buckets=kwargs.get('send_histograms_buckets', True),
+            send_monotonic_counter=kwargs.get('send_monotonic_counter', False),
+            custom_tags=kwargs.get('custom_tags'),
+        )
+
+    def _submit_text_samples(self, metric_name, name, metric_type, samples, send_histograms_buckets=True,
+                             send_monotonic_counter=False, custom_tags=None, hostname=None):
+        """
+        Submit the samples of a text format family the same way `_submit` does for a MetricFamily.
+        The samples are passed as the `metric` argument of the submission methods.
+        """
+        if custom_tags is None:
+            custom_tags = []
+        # Sample names still hold the `prometheus_metrics_prefix`
+        count_suffix, sum_suffix = '{}_count'.format(name), '{}_sum'.format(name)
+
+        for sample in samples:
+            val = sample.value
+            if not self._is_value_valid(val):
+                self.log.debug("Metric value is not supported for metric {}.".format(metric_name))
+                continue
+
+            if metric_type == 'counter':
+                custom_hostname = self._get_hostname(hostname, sample)
+                if send_monotonic_counter:
+                    self._submit_monotonic_count(metric_name, val, sample, custom_tags, custom_hostname)
+                else:
+                    self._submit_gauge(metric_name, val, sample, custom_tags, custom_hostname)
+            elif metric_type == 'gauge':
+                custom_hostname = self._get_hostname(hostname, sample)
+                if name in self.rate_metrics:
+                    self._submit_rate(metric_name, val, sample, custom_tags, custom_hostname)
+                else:
+                    self._submit_gauge(metric_name, val, sample, custom_tags, custom_hostname)
+            elif sample.name.endswith(count_suffix):
+                self._submit_gauge("{}.count".format(metric_name), val, sample, custom_tags)
+            elif sample.name.endswith(sum_suffix):
+                self._submit_gauge("{}.sum".format(metric_name), val, sample, custom_tags)
+            elif metric_type == 'summary':
+                self._submit_text_bucket("{}.quantile".format(metric_name), val, sample, 'quantile', 'quantile',
+                                         custom_tags, hostname)
+            elif send_histograms_buckets:
+                self._submit_text_bucket("{}.count".format(metric_name), val, sample, 'le', 'upper_bound',
+                                         custom_tags, hostname)
+
+    def _submit_text_bucket(self, metric_name, val, sample, label_name, tag_name, custom_tags, hostname):
+        """
+        Submit a summary quantile or a histogram bucket: the label holding its bound
+        is sent as the `tag_name` tag instead.
+        """
+        labels = []
+        limit = None
+        for label in sample.label:
+            if label.name == label_name:
+                limit = float(label.value)
+            else:
+                labels.append(label)
+        sample = sample._replace(label=tuple(labels))
+
+        self._submit_gauge(metric_name, val, sample, custom_tags=custom_tags + ["{}:{}".format(tag_name, limit)],
+                           hostname=self._get_hostname(hostname, sample))
+
+    def _text_family_to_message(self, name, metric_type, samples):
+        """
+        Build a MetricFamily from the samples of a text format family
+        """
+        messages = defaultdict(list)
+        metric_name = "%s_bucket" % name if metric_type == "histogram" else name
+        suffixes = ("{}_sum".format(name), "{}_count".format(name))
+        for sample in samples:
+            sample_name = metric_name
+            if metric_type in ("histogram", "summary"):
+                for suffix in suffixes:
+                    if sample.name.endswith(suffix):
+                        sample_name = suffix
+            messages[sample_name].append({"labels": dict(sample.label), "value": sample.value})
+
+        return self._extract_metric_from_map(name, messages, {name: metric_type}, {})
+
     def store_labels(self, message):
         # If targeted metric, store labels
         if message.name in self.label_joins:
             matching_label = self.label_joins[message.name]['label_to_match']
+            labels_to_get = self.label_joins[message.name]['labels_to_get']
+            mapping = self._label_mapping.setdefault(matching_label, {})
             for metric in message.metric:
                 labels_list = []
                 matching_value = None
                 for label in metric.label:
                     if label.name == matching_label:
                         matching_value = label.value
-                    elif label.name in self.label_joins[message.name]['labels_to_get']:
+                    elif label.name in labels_to_get:
                         labels_list.append((label.name, label.value))
-                try:
-                    self._label_mapping[matching_label][matching_value] = labels_list
-                except KeyError:
-                    if matching_value is not None:
-                        self._label_mapping[matching_label] = {matching_value: labels_list}
+                if matching_value is not None and mapping.get(matching_value) != labels_list:
+                    mapping[matching_value] = labels_list
 
     def join_labels(self, message):
         # Filter metric to see if we can enrich with joined labels
@@ -409,9 +608,10 @@ class PrometheusScraperMixin(object):
                 for label in metric.label:
                     if label.name in self._watched_labels:
                         # Set this label value as active
-                        if label.name not in self._active_label_mapping:
-                            self._active_label_mapping[label.name] = {}
-                        self._active_label_mapping[label.name][label.value] = True
+                        try:
+                            self._active_label_mapping[label.name].add(label.value)
+                        except KeyError:
+                            self._active_label_mapping[label.name] = {label.value}
                         # If mapping found add corresponding labels
                         try:
                             for label_tuple in self._label_mapping[label.name][label.value]:
@@ -506,7 +706,7 @@ class PrometheusScraperMixin(object):
             disable_warnings(InsecureRequestWarning)
             verify = False
         try:
-            response = requests.get(endpoint, headers=headers, stream=False, timeout=self.prometheus_timeout, cert=cert, verify=verify)
+            response = self.http.get(endpoint, headers=headers, stream=True, timeout=self.prometheus_timeout, cert=cert, verify=verify)
         except requests.exceptions.SSLError:
             self.log.error("Invalid SSL settings for requesting {} endpoint".format(endpoint))
             raise
@@ -590,6 +790,54 @@ class PrometheusScraperMixin(object):
 
         return hostname
 
+    def _metric_tags(self, metric_name, val, metric, custom_tags=None, hostname=None):
+        _tags = []
+        if custom_tags is not None:
+            _tags += custom_tags
+        _tags += self._get_label_tags(metric.label)
+        return self._finalize_tags_to_submit(_tags, metric_name, val, metric, custom_tags=custom_tags, hostname=hostname)
+
+    def _get_label_tags(self, labels):
+        """
+        Return the tags for the labels of a metric, resolving each label name through `_label_tags_plan`
+        """
+        if self._label_tags_config is None:
+            self._check_label_tags_plan()
+
+        plan = self._label_tags_plan
+        tags = []
+        for label in labels:
+            try:
+                tag_name = plan[label.name]
+            except KeyError:
+                tag_name = plan[label.name] = self._get_label_tag_name(label.name)
+            if tag_name is not None:
+                tags.append('{}:{}'.format(tag_name, label.value))
+        return tags
+
+    def _get_label_tag_name(self, label_name):
+        """
+        Return the tag name to use for a label, None if the label is excluded
+        """
+        if self.exclude_labels is not None and label_name in self.exclude_labels:
+            return None
+        if self.labels_mapper is not None and label_name in self.labels_mapper:
+            return self.labels_mapper[label_name]
+        return label_name
+
+    def _check_label_tags_plan(self):
+        """
+        Called before each scrape: start a new `_label_tags_plan` if `exclude_labels`
+        or `labels_mapper` changed.
+        """
+        config = (
+            frozenset(self.exclude_labels or ()),
+            frozenset((self.labels_mapper or {}).items()),
+        )
+        if config != self._label_tags_config:
+            self._label_tags_config = config
+            self._label_tags_plan = {}
+
     def _finalize_tags_to_submit(self, _tags, metric_name, val, metric, custom_tags=None, hostname=None):
         """
         Format the finalized tags
@@ -67,17 +67,5 @@ class PrometheusCheck(PrometheusScraperMixin, AgentCheck):
         _tags = self._metric_tags(metric_name, val, metric, custom_tags, hostname)
         self.gauge('{}.{}'.format(self.NAMESPACE, metric_name), val, _tags, hostname=hostname)
 
-    def _metric_tags(self, metric_name, val, metric, custom_tags=None, hostname=None):
-        _tags = []
-        if custom_tags is not None:
-            _tags += custom_tags
-        for label in metric.label:
-            if self.exclude_labels is None or label.name not in self.exclude_labels:
-                tag_name = label.name
-                if self.labels_mapper is not None and label.name in self.labels_mapper:
-                    tag_name = self.labels_mapper[label.name]
-                _tags.append('{}:{}'.format(tag_name, label.value))
-        return self._finalize_tags_to_submit(_tags, metric_name, val, metric, custom_tags=custom_tags, hostname=hostname)
-
     def _submit_service_check(self, *args, **kwargs):
         self.service_check(*args, **kwargs)
@@ -0,0 +1,71 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import time
+
+from ..checks.libs.thread_pool import Pool, TimeoutError
+from .timeout import TimeoutException
+
+
+class BoundedExecutor(object):
+    """
+    Runs blocking calls, such as REST requests, on at most `max_workers` threads at a time.
+
+    Results are returned in the order the calls were made, whatever the order they complete in,
+    so that metrics can be submitted from the calling thread in a deterministic order.
+    If `timeout` is set, all the calls made through the executor must complete within `timeout`
+    seconds from its creation, `TimeoutException` is raised otherwise.
+    """
+    def __init__(self, max_workers, timeout=None, name='BoundedExecutor'):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.name = name
+        self.deadline = time.time() + timeout if timeout else None
+
+    @classmethod
+    def from_config(cls, instance, default_max_workers, name='BoundedExecutor'):
+        """
+        Return an executor running at most `max_concurrent_requests` calls at a time, whose
+        deadline is the `collection_timeout` of the instance, so it covers a whole check run.
+        """
+        max_workers = int(instance.get('max_concurrent_requests', default_max_workers))
+        timeout = instance.get('collection_timeout')
+        if timeout is not None:
+            timeout = float(timeout)
+
+        return cls(max_workers, timeout=timeout, name=name)
+
+    def map(self, func, args_list):
+        """
+        Call `func(*args)` for each `args` of `args_list`, and yield the results in the same order.
+        An exception raised by a call is raised when its result is reached, the calls that
+        haven't started yet are then cancelled.
+        """
+        args_list = list(args_list)
+        if self.max_workers <= 1 or len(args_list) <= 1:
+            for args in args_list:
+                self._check_deadline()
+                yield func(*args)
+            return
+
+        pool = Pool(min(self.max_workers, len(args_list)), name=self.name)
+        try:
+            results = [pool.apply_async(func, args) for args in args_list]
+            for result in results:
+                yield self._get_result(result)
+        finally:
+            # Workers exit once their current call returns
+            pool.terminate()
+
+    def _get_result(self, result):
+        if self.deadline is None:
+            return result.get()
+
+        try:
+            return result.get(max(self.deadline - time.time(), 0))
+        except TimeoutError:
+            raise TimeoutException('Calls did not complete within {} seconds'.format(self.timeout))
+
+    def _check_deadline(self):
+        if self.deadline is not None and time.time() > self.deadline:
+            raise TimeoutException('Calls did not complete within {} seconds'.format(self.timeout))
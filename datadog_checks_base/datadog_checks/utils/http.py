@@ -0,0 +1,63 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+
+
+class HTTPClient(object):
+    """
+    A thin wrapper around a `requests.Session` keeping its connections alive between
+    requests and check runs, so that TCP and TLS handshakes are only paid when a
+    connection is opened, instead of on every request as with `requests.get`.
+
+    `pool_size` is the maximum number of connections kept per host, it bounds the number
+    of requests that can run concurrently on the same host without opening new ones.
+    `timeout` is used for the requests that don't provide their own.
+    """
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._session = None
+
+    @classmethod
+    def from_config(cls, instance, init_config, timeout=None, min_pool_size=0):
+        """
+        Return a client whose pool size is the `http_pool_size` option of the instance,
+        or of `init_config`, and at least `min_pool_size`.
+        """
+        init_config = init_config or {}
+        pool_size = instance.get('http_pool_size', init_config.get('http_pool_size', DEFAULT_POOL_SIZE))
+        return cls(pool_size=max(int(pool_size), min_pool_size), timeout=timeout)
+
+    @property
+    def session(self):
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+
+        return self._session
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **self._request_options(kwargs))
+
+    def head(self, url, **kwargs):
+        return self.session.head(url, **self._request_options(kwargs))
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **self._request_options(kwargs))
+
+    def _request_options(self, options):
+        if options.get('timeout') is None:
+            options['timeout'] = self.timeout
+        return options
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
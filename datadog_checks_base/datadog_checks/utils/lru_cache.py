@@ -0,0 +1,55 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    A dictionary-like cache holding at most `maxsize` entries, evicting the least
+    recently used one when full. Hits and misses are counted to help sizing it.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+
+        # Re-insert to mark the entry as the most recently used
+        self._data[key] = value
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+
+        if key in self._data:
+            del self._data[key]
+        elif len(self._data) >= self.maxsize:
+            self._data.popitem(last=False)
+        self._data[key] = value
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
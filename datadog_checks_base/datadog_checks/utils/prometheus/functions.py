@@ -6,6 +6,13 @@ from google.protobuf.internal.decoder import _DecodeVarint32  # pylint: disable=
 
 from . import metrics_pb2
 
+try:
+    # Python 2: zero-copy, read-only slice that protobuf accepts as input
+    _buffer_view = buffer
+except NameError:
+    def _buffer_view(buf, offset, size):
+        return memoryview(buf)[offset:offset + size]
+
 
 # Deprecated, please use the PrometheusCheck class
 def parse_metric_family(buf):
@@ -26,3 +33,98 @@ def parse_metric_family(buf):
         message = metrics_pb2.MetricFamily()
         message.ParseFromString(msg_buf)
         yield message
+
+
+def iter_delimited_messages(chunks):
+    """
+    Split a stream of binary chunks into the messages it holds, each one prefixed by its
+    length as a varint32 [1], without loading the whole stream in memory.
+
+    Each message is yielded as a read-only view over the received data rather than as a copy,
+    so that the memory used is bounded by the size of the largest message.
+
+    [1] https://developers.google.com/protocol-buffers/docs/reference/java/com/google/protobuf/AbstractMessageLite#writeDelimitedTo(java.io.OutputStream)
+
+    :param chunks: iterable of bytes, e.g. requests.Response.iter_content()
+    :return: generator of buffers, one per message
+    """
+    buf = b''
+    pos = 0
+    # Chunks received but not yet merged in `buf`, we only merge them once we have
+    # enough data to decode the next message to avoid copying large messages over and over
+    pending = []
+    pending_size = 0
+    needed = 0
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if len(buf) - pos + pending_size < needed:
+            continue
+
+        pending.insert(0, buf[pos:])
+        buf = b''.join(pending)
+        pos = 0
+        pending = []
+        pending_size = 0
+
+        while pos < len(buf):
+            try:
+                msg_len, start = _DecodeVarint32(buf, pos)
+            except IndexError:
+                # The varint itself is truncated
+                needed = len(buf) - pos + 1
+                break
+
+            if start + msg_len > len(buf):
+                needed = start + msg_len - pos
+                break
+
+            yield _buffer_view(buf, start, msg_len)
+            pos = start + msg_len
+        else:
+            needed = 0
+
+    if pending:
+        pending.insert(0, buf[pos:])
+        buf = b''.join(pending)
+        pos = 0
+
+    while pos < len(buf):
+        # Only happens on a truncated payload, let the parser report the error
+        msg_len, start = _DecodeVarint32(buf, pos)
+        yield _buffer_view(buf, start, msg_len)
+        pos = start + msg_len
+
+
+def get_metric_family_name(msg_buf):
+    """
+    Read the name (field 1) of a serialized MetricFamily without parsing the whole message.
+
+    :param msg_buf: the serialized MetricFamily, as bytes or a buffer returned by iter_delimited_messages
+    :return: the name as a unicode string, or None if it can't be found
+    """
+    pos = 0
+    end = len(msg_buf)
+    while pos < end:
+        tag, pos = _DecodeVarint32(msg_buf, pos)
+        field_number, wire_type = tag >> 3, tag & 0x7
+        if wire_type == 2:
+            size, pos = _DecodeVarint32(msg_buf, pos)
+            if field_number == 1:
+                return bytes(msg_buf[pos:pos + size]).decode('utf-8')
+            pos += size
+        elif wire_type == 0:
+            _, pos = _DecodeVarint32(msg_buf, pos)
+        elif wire_type == 1:
+            pos += 8
+        elif wire_type == 5:
+            pos += 4
+        else:
+            # Groups are not used by the Prometheus protocol
+            return None
+
+    return None
@@ -0,0 +1,125 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from collections import namedtuple
+import re
+
+# `label` mimics the `label` attribute of the protobuf Metric message so that
+# samples can be used wherever the labels of a Metric are read
+TextLabel = namedtuple('TextLabel', 'name value')
+TextSample = namedtuple('TextSample', 'name label value')
+
+# Suffixes of the samples belonging to a summary or histogram family
+FAMILY_SUFFIXES = {
+    'summary': ('_sum', '_count'),
+    'histogram': ('_sum', '_count', '_bucket'),
+}
+
+LABEL_RE = re.compile(r'\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*"((?:[^"\\]|\\.)*)"\s*,?')
+ESCAPE_RE = re.compile(r'\\(.)')
+ESCAPES = {'n': '\n', '\\': '\\', '"': '"'}
+
+
+def _unescape(match):
+    return ESCAPES.get(match.group(1), match.group(0))
+
+
+def _parse_labels(text):
+    if '\\' not in text:
+        # Without escape sequences label values can't contain any `"`, so splitting on
+        # them alternates between `,name=` and `value` parts
+        parts = text.split('"')
+        return tuple(TextLabel(name.strip(' \t,='), value) for name, value in zip(parts[0::2], parts[1::2]))
+
+    labels = []
+    for name, value in LABEL_RE.findall(text):
+        if '\\' in value:
+            value = ESCAPE_RE.sub(_unescape, value)
+        labels.append(TextLabel(name, value))
+
+    return tuple(labels)
+
+
+def parse_sample(line):
+    """
+    Parse a sample line of the Prometheus text exposition format [0], the timestamp is ignored.
+
+    [0] https://prometheus.io/docs/instrumenting/exposition_formats/#text-format-details
+
+    :param line: string like `name{label="value"} 1.0 1395066363000`
+    :return: TextSample
+    """
+    brace = line.find('{')
+    if brace == -1:
+        parts = line.split(None, 2)
+        return TextSample(parts[0], (), float(parts[1]))
+
+    end = line.rfind('}')
+    if end == -1:
+        raise ValueError('Invalid sample line: {}'.format(line))
+
+    return TextSample(
+        line[:brace].strip(),
+        _parse_labels(line[brace + 1:end]),
+        float(line[end + 1:].split(None, 1)[0]),
+    )
+
+
+def parse_text_families(lines):
+    """
+    Parse lines of the Prometheus text exposition format [0] into metric families, in a single
+    streaming pass: only the samples of the current family are kept in memory.
+
+    Samples are grouped as in the official parser: `_sum`, `_count` and `_bucket` samples are part
+    of the family of the same name when it is declared as a summary or histogram. Samples of a
+    family without a TYPE line make an `untyped` family of their own.
+
+    [0] https://prometheus.io/docs/instrumenting/exposition_formats/#text-format-details
+
+    :param lines: iterable of strings
+    :return: generator of (family name, family type, list of TextSample) tuples
+    """
+    name = None
+    mtype = 'untyped'
+    suffixes = ()
+    samples = []
+    # Types declared by a `# TYPE` line which samples haven't been read yet
+    declared = {}
+
+    for line in lines:
+        if not line:
+            continue
+
+        if line[0] == '#':
+            parts = line.split(None, 3)
+            if len(parts) == 4 and parts[1] == 'TYPE':
+                declared[parts[2]] = parts[3].strip()
+            continue
+
+        sample = parse_sample(line)
+        sample_name = sample.name
+        if sample_name != name and not (
+                suffixes and sample_name.startswith(name) and sample_name[len(name):] in suffixes):
+            if samples:
+                yield name, mtype, samples
+
+            name = sample_name
+            mtype = declared.pop(sample_name, None)
+            if mtype is None:
+                for suffix in ('_sum', '_count', '_bucket'):
+                    if sample_name.endswith(suffix):
+                        family_name = sample_name[:-len(suffix)]
+                        family_type = declared.get(family_name)
+                        if family_type is not None and suffix in FAMILY_SUFFIXES.get(family_type, ()):
+                            name = family_name
+                            mtype = declared.pop(family_name)
+                            break
+                else:
+                    mtype = 'untyped'
+            suffixes = FAMILY_SUFFIXES.get(mtype, ())
+            samples = []
+
+        samples.append(sample)
+
+    if samples:
+        yield name, mtype, samples
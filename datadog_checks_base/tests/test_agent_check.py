@@ -1,6 +1,8 @@
 # (C) Datadog, Inc. 2018
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
+import mock
+
 from datadog_checks.checks import AgentCheck
 
 
@@ -45,3 +47,121 @@ class TestTags:
 
         assert normalized_tags is not tags
         assert normalized_tag == tag.encode('utf-8')
+
+    def test_tags_cache(self):
+        check = AgentCheck()
+        tags = [u'unicode:string', 'default:string']
+
+        first = check._normalize_tags(tags, None)
+        second = check._normalize_tags(tags, None)
+
+        assert first == second == [b'unicode:string', b'default:string']
+        # The returned lists must be safe to mutate
+        assert first is not second
+        assert first[0] is second[0]
+        assert check.get_tags_cache_stats() == {'hits': 1, 'misses': 1, 'size': 1}
+
+    def test_tags_cache_bounded(self):
+        check = AgentCheck()
+        check.TAGS_CACHE_SIZE = 2
+
+        for i in range(5):
+            check._normalize_tags(['tag:{}'.format(i)], None)
+
+        assert check.get_tags_cache_stats()['size'] <= 2
+        assert check.get_tags_cache_stats()['misses'] == 5
+
+    def test_tags_cache_device_name(self):
+        check = AgentCheck()
+        tags = ['default:string']
+
+        assert check._normalize_tags(tags, 'sda') == [b'default:string', b'device:sda']
+        assert check._normalize_tags(tags, None) == [b'default:string']
+
+
+class TestMetricsBatch:
+    def test_submit_metrics_batch(self):
+        from datadog_checks.stubs import aggregator
+        aggregator.reset()
+        check = AgentCheck()
+        tags = [u'foo:bar']
+
+        check.submit_metrics_batch([
+            (aggregator.GAUGE, 'test.gauge', 1, tags, None),
+            (aggregator.RATE, 'test.rate', '2.5', tags, 'myhost'),
+            (aggregator.GAUGE, 'test.ignored', None, tags, None),
+        ])
+
+        aggregator.assert_metric('test.gauge', value=1.0, tags=['foo:bar'], count=1, metric_type=aggregator.GAUGE)
+        aggregator.assert_metric('test.rate', value=2.5, tags=['foo:bar'], count=1, hostname='myhost',
+                                 metric_type=aggregator.RATE)
+        assert not aggregator.metrics('test.ignored')
+
+        # Identical tag lists are normalized once and shared across the batch
+        assert aggregator.metrics('test.gauge')[0].tags is aggregator.metrics('test.rate')[0].tags
+        assert aggregator.metrics('test.gauge')[0].hostname == ''
+
+
+class TestNormalize:
+    def test_normalize(self):
+        check = AgentCheck()
+
+        assert check.normalize('metric-name (total)') == 'metric_name_total'
+        assert check.normalize('_a._b_.c_', prefix='prefix') == 'prefix.a.b.c'
+        assert check.normalize('a--_b') == 'a_b'
+        assert check.normalize(u'r\xe9sum\xe9.count') == 'resume.count'
+
+    def test_normalize_fix_case(self):
+        check = AgentCheck()
+
+        assert check.normalize('PauseNs', 'Memstats', fix_case=True) == 'memstats.pause_ns'
+        assert check.normalize('HTTPRequests.Total__Count', fix_case=True) == 'http_requests.total_count'
+
+    def test_normalize_cache(self):
+        check = AgentCheck()
+
+        assert check.normalize('some-metric', 'prefix') == 'prefix.some_metric'
+        assert check.normalize('some-metric', 'prefix') == 'prefix.some_metric'
+        assert check.normalize('some-metric', 'prefix', fix_case=True) == 'prefix.some_metric'
+
+        stats = check.get_metric_name_cache_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 2
+        assert stats['size'] == 2
+
+
+class TestHTTP:
+    def test_session_reused(self):
+        check = AgentCheck('test', {}, [{}])
+
+        assert check.http is check.http
+        assert check.http.session is check.http.session
+
+    def test_pool_size(self):
+        check = AgentCheck('test', {'http_pool_size': 4}, [{}])
+        assert check.http.pool_size == 4
+        assert check.http.session.get_adapter('https://foo')._pool_maxsize == 4
+
+        check = AgentCheck('test', {'http_pool_size': 4}, [{'http_pool_size': 2}])
+        assert check.http.pool_size == 2
+
+    def test_min_pool_size(self):
+        class ConcurrentCheck(AgentCheck):
+            def get_http_min_pool_size(self, instance):
+                return instance.get('max_concurrent_requests', 0)
+
+        check = ConcurrentCheck('test', {'http_pool_size': 4}, [{'max_concurrent_requests': 16}])
+        assert check.http.pool_size == 16
+
+        check = ConcurrentCheck('test', {'http_pool_size': 4}, [{'max_concurrent_requests': 2}])
+        assert check.http.pool_size == 4
+
+    def test_default_timeout(self):
+        check = AgentCheck('test', {}, {'default_integration_http_timeout': 3}, [{}])
+
+        with mock.patch('requests.Session.get') as get:
+            check.http.get('http://foo')
+            get.assert_called_with('http://foo', timeout=3.0)
+
+            check.http.get('http://foo', timeout=1)
+            get.assert_called_with('http://foo', timeout=1)
@@ -0,0 +1,69 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import os
+
+import mock
+import pytest
+
+from datadog_checks.checks.prometheus import PrometheusCheck
+from datadog_checks.utils.prometheus.text_parser import parse_text_families
+
+SERIES_COUNT = 100000
+
+
+@pytest.fixture(scope='module')
+def large_text_payload():
+    """
+    Scale the recorded kube-state-metrics payload up to ~100k series, adding a `replica`
+    label to every sample while keeping the samples of each family together
+    """
+    f_name = os.path.join(os.path.dirname(__file__), 'fixtures', 'prometheus', 'ksm.txt')
+    with open(f_name, 'r') as f:
+        lines = f.read().splitlines()
+
+    samples_count = sum(1 for line in lines if line and not line.startswith('#'))
+    replicas = SERIES_COUNT // samples_count + 1
+
+    families = []
+    for line in lines:
+        if not line or line.startswith('#'):
+            families.append([line])
+        elif '{' in line:
+            families.append(['{}replica="{}",{}'.format(line[:line.index('{') + 1], i, line[line.index('{') + 1:])
+                             for i in range(replicas)])
+        else:
+            name, value = line.split(' ', 1)
+            families.append(['{}{{replica="{}"}} {}'.format(name, i, value) for i in range(replicas)])
+
+    return '\n'.join(line for family in families for line in family)
+
+
+def _check(text_data, fast_text_parser):
+    check = PrometheusCheck('prometheus_check', {}, {}, {})
+    check.NAMESPACE = 'ksm'
+    check.fast_text_parser = fast_text_parser
+    check.metrics_mapper = {'*': 'unused'}
+    check.gauge = check.rate = check.monotonic_count = lambda *args, **kwargs: None
+    check.poll = mock.MagicMock(return_value=mock.MagicMock(
+        iter_lines=lambda **kwargs: iter(text_data.split('\n')),
+        headers={'Content-Type': 'text/plain'}))
+    return check
+
+
+def test_text_parser(benchmark, large_text_payload):
+    lines = large_text_payload.split('\n')
+
+    benchmark(lambda: sum(len(samples) for _, _, samples in parse_text_families(lines)))
+
+
+def test_process_text_legacy(benchmark, large_text_payload):
+    check = _check(large_text_payload, False)
+
+    benchmark(check.process, 'http://fake.endpoint:10055/metrics', ignore_unmapped=True)
+
+
+def test_process_text_fast(benchmark, large_text_payload):
+    check = _check(large_text_payload, True)
+
+    benchmark(check.process, 'http://fake.endpoint:10055/metrics', ignore_unmapped=True)
@@ -8,8 +8,9 @@ import pytest
 import mock
 import requests
 
-from datadog_checks.checks.prometheus import PrometheusCheck, UnknownFormatError
+from datadog_checks.checks.prometheus import PrometheusCheck, PrometheusFormat, UnknownFormatError
 from datadog_checks.utils.prometheus import parse_metric_family, metrics_pb2
+from datadog_checks.utils.prometheus.functions import get_metric_family_name, iter_delimited_messages
 
 
 protobuf_content_type = 'application/vnd.google.protobuf; proto=io.prometheus.client.MetricFamily; encoding=delimited'
@@ -27,6 +28,10 @@ class MockResponse:
         for elt in self.content.split("\n"):
             yield elt
 
+    def iter_content(self, chunk_size=1, **_):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
     def close(self):
         pass
 
@@ -110,6 +115,28 @@ def test_parse_metric_family():
         assert messages[-1].name == 'process_virtual_memory_bytes'
 
 
+@pytest.mark.parametrize('chunk_size', [1, 7, 1024, 10 * 1024, 100 * 1024])
+def test_iter_delimited_messages(bin_data, chunk_size):
+    chunks = (bin_data[i:i + chunk_size] for i in range(0, len(bin_data), chunk_size))
+    messages = []
+    for msg_buf in iter_delimited_messages(chunks):
+        message = metrics_pb2.MetricFamily()
+        message.ParseFromString(msg_buf)
+        messages.append(message)
+
+    assert messages == list(parse_metric_family(bin_data))
+
+
+def test_parse_metric_family_protobuf_chunked(bin_data, mocked_prometheus_check):
+    response = MockResponse(bin_data, protobuf_content_type)
+    mocked_prometheus_check.REQUESTS_CHUNK_SIZE = 100
+
+    messages = list(mocked_prometheus_check.parse_metric_family(response))
+
+    assert len(messages) == 61
+    assert messages[-1].name == 'process_virtual_memory_bytes'
+
+
 def test_check(mocked_prometheus_check):
     """ Should not be implemented as it is the mother class """
     with pytest.raises(NotImplementedError):
@@ -245,6 +272,32 @@ def test_process(bin_data, mocked_prometheus_check, ref_gauge):
     check.process_metric.assert_called_with(ref_gauge, instance=None)
 
 
+def test_get_metric_family_name(bin_data):
+    names = [get_metric_family_name(msg_buf) for msg_buf in iter_delimited_messages([bin_data])]
+
+    assert names == [m.name for m in parse_metric_family(bin_data)]
+    assert get_metric_family_name(b'') is None
+
+
+def test_process_skips_unprocessed_families(bin_data, mocked_prometheus_check):
+    endpoint = "http://fake.endpoint:10055/metrics"
+    check = mocked_prometheus_check
+    check.metrics_mapper = {'process_virtual_memory_bytes': 'process.vm.bytes', 'go_memstats_*': 'go.memstats'}
+    check.ignore_metrics = ['go_memstats_frees_total']
+    check.label_joins = {'go_goroutines': {'label_to_match': 'foo', 'labels_to_get': []}}
+    check.poll = mock.MagicMock(return_value=MockResponse(bin_data, protobuf_content_type))
+    check.process_metric = mock.MagicMock()
+
+    check.process(endpoint)
+
+    processed = set(call[0][0].name for call in check.process_metric.call_args_list)
+    assert 'process_virtual_memory_bytes' in processed
+    assert 'go_goroutines' in processed
+    assert 'go_memstats_alloc_bytes' in processed
+    assert 'go_memstats_frees_total' not in processed
+    assert 'go_gc_duration_seconds' not in processed
+
+
 def test_process_send_histograms_buckets(bin_data, mocked_prometheus_check, ref_gauge):
     """ Checks that the send_histograms_buckets parameter is passed along """
     endpoint = "http://fake.endpoint:10055/metrics"
@@ -311,9 +364,9 @@ def test_poll_protobuf(mocked_prometheus_check, bin_data):
     check = mocked_prometheus_check
     mock_response = mock.MagicMock(
         status_code=200,
-        content=bin_data,
+        iter_content=lambda **kwargs: iter([bin_data]),
         headers={'Content-Type': protobuf_content_type})
-    p = mock.patch('requests.get', return_value=mock_response, __name__="get")
+    p = mock.patch('requests.Session.get', return_value=mock_response, __name__="get")
     p.start()
     response = check.poll("http://fake.endpoint:10055/metrics")
     messages = list(check.parse_metric_family(response))
@@ -329,7 +382,7 @@ def test_poll_text_plain(mocked_prometheus_check, text_data):
         status_code=200,
         iter_lines=lambda **kwargs: text_data.split("\n"),
         headers={'Content-Type': "text/plain"})
-    p = mock.patch('requests.get', return_value=mock_response, __name__="get")
+    p = mock.patch('requests.Session.get', return_value=mock_response, __name__="get")
     p.start()
     response = check.poll("http://fake.endpoint:10055/metrics")
     messages = list(check.parse_metric_family(response))
@@ -1212,7 +1265,7 @@ def test_label_joins(sorted_tags_check):
         status_code=200,
         iter_lines=lambda **kwargs: text_data.split("\n"),
         headers={'Content-Type': "text/plain"})
-    p = mock.patch('requests.get', return_value=mock_response, __name__="get")
+    p = mock.patch('requests.Session.get', return_value=mock_response, __name__="get")
     p.start()
     check = sorted_tags_check
     check.NAMESPACE = 'ksm'
@@ -1385,7 +1438,7 @@ def test_label_joins_gc(sorted_tags_check):
         status_code=200,
         iter_lines=lambda **kwargs: text_data.split("\n"),
         headers={'Content-Type': "text/plain"})
-    p = mock.patch('requests.get', return_value=mock_response, __name__="get")
+    p = mock.patch('requests.Session.get', return_value=mock_response, __name__="get")
     p.start()
     check = sorted_tags_check
     check.NAMESPACE = 'ksm'
@@ -1423,7 +1476,7 @@ def test_label_joins_gc(sorted_tags_check):
         status_code=200,
         iter_lines=lambda **kwargs: text_data.split("\n"),
         headers={'Content-Type': "text/plain"})
-    p = mock.patch('requests.get', return_value=mock_response, __name__="get")
+    p = mock.patch('requests.Session.get', return_value=mock_response, __name__="get")
     p.start()
     check.process("http://fake.endpoint:10055/metrics")
     assert 'dd-agent-1337' in check._label_mapping['pod']
@@ -1432,6 +1485,39 @@ def test_label_joins_gc(sorted_tags_check):
     p.stop()
 
 
+def test_label_joins_first_scrape(sorted_tags_check):
+    """ Tests labels are joined on the first scrape, without a dry run """
+    f_name = os.path.join(os.path.dirname(__file__), 'fixtures', 'prometheus', 'ksm.txt')
+    with open(f_name, 'r') as f:
+        text_data = f.read()
+    mock_response = mock.MagicMock(
+        status_code=200,
+        iter_lines=lambda **kwargs: text_data.split("\n"),
+        headers={'Content-Type': "text/plain"})
+    check = sorted_tags_check
+    check.NAMESPACE = 'ksm'
+    check.label_joins = {
+        'kube_pod_info': {
+            'label_to_match': 'pod',
+            'labels_to_get': ['node', 'pod_ip']
+        }
+    }
+    check.metrics_mapper = {'kube_pod_status_ready': 'pod.ready'}
+    check.gauge = mock.MagicMock()
+    with mock.patch('requests.Session.get', return_value=mock_response, __name__="get"):
+        check.process("http://fake.endpoint:10055/metrics")
+    check.gauge.assert_has_calls([
+        mock.call('ksm.pod.ready', 1.0,
+            sorted(['pod:fluentd-gcp-v2.0.9-6dj58',
+                'namespace:kube-system',
+                'condition:true',
+                'node:gke-foobar-test-kube-default-pool-9b4ff111-0kch',
+                'pod_ip:11.132.0.7']), hostname=None),
+    ], any_order=True)
+    assert 15 == len(check._label_mapping['pod'])
+    assert check._active_label_mapping['pod'] == set(check._label_mapping['pod'])
+
+
 def test_label_joins_missconfigured(sorted_tags_check):
     """ Tests label join missconfigured label is ignored """
     text_data = None
@@ -1442,7 +1528,7 @@ def test_label_joins_missconfigured(sorted_tags_check):
         status_code=200,
         iter_lines=lambda **kwargs: text_data.split("\n"),
         headers={'Content-Type': "text/plain"})
-    p = mock.patch('requests.get', return_value=mock_response, __name__="get")
+    p = mock.patch('requests.Session.get', return_value=mock_response, __name__="get")
     p.start()
     check = sorted_tags_check
     check.NAMESPACE = 'ksm'
@@ -1484,7 +1570,7 @@ def test_label_join_not_existing(sorted_tags_check):
         status_code=200,
         iter_lines=lambda **kwargs: text_data.split("\n"),
         headers={'Content-Type': "text/plain"})
-    p = mock.patch('requests.get', return_value=mock_response, __name__="get")
+    p = mock.patch('requests.Session.get', return_value=mock_response, __name__="get")
     p.start()
     check = sorted_tags_check
     check.NAMESPACE = 'ksm'
@@ -1524,7 +1610,7 @@ def test_label_join_metric_not_existing(sorted_tags_check):
         status_code=200,
         iter_lines=lambda **kwargs: text_data.split("\n"),
         headers={'Content-Type': "text/plain"})
-    p = mock.patch('requests.get', return_value=mock_response, __name__="get")
+    p = mock.patch('requests.Session.get', return_value=mock_response, __name__="get")
     p.start()
     check = sorted_tags_check
     check.NAMESPACE = 'ksm'
@@ -1564,7 +1650,7 @@ def test_label_join_with_hostname(sorted_tags_check):
         status_code=200,
         iter_lines=lambda **kwargs: text_data.split("\n"),
         headers={'Content-Type': "text/plain"})
-    p = mock.patch('requests.get', return_value=mock_response, __name__="get")
+    p = mock.patch('requests.Session.get', return_value=mock_response, __name__="get")
     p.start()
     check = sorted_tags_check
     check.NAMESPACE = 'ksm'
@@ -1603,7 +1689,7 @@ def mock_get():
     with open(f_name, 'r') as f:
         text_data = f.read()
     mock_get = mock.patch(
-        'requests.get',
+        'requests.Session.get',
         return_value=mock.MagicMock(
             status_code=200,
             iter_lines=lambda **kwargs: text_data.split("\n"),
@@ -1688,3 +1774,84 @@ def test_text_filter_input():
 
     filtered = [x for x in check._text_filter_input(lines_in)]
     assert filtered == expected_out
+
+
+def _run_text_check(check, text_data, **kwargs):
+    """ Run `process` on a text payload and return the submitted gauges, rates and counts """
+    submitted = []
+
+    def submit(method):
+        def _submit(name, value, tags, hostname=None):
+            submitted.append((method, name, value, tuple(sorted(tags)), hostname))
+        return _submit
+
+    check.gauge = submit('gauge')
+    check.rate = submit('rate')
+    check.monotonic_count = submit('monotonic_count')
+    check.poll = mock.MagicMock(return_value=mock.MagicMock(
+        iter_lines=lambda **kw: text_data.split("\n"),
+        headers={'Content-Type': "text/plain"}))
+    check.process("http://fake.endpoint:10055/metrics", **kwargs)
+    return sorted(submitted)
+
+
+@pytest.mark.parametrize('fixture', ['metrics.txt', 'ksm.txt'])
+@pytest.mark.parametrize('send_histograms_buckets', [True, False])
+def test_fast_text_parser_same_output(p_check, fixture, send_histograms_buckets):
+    f_name = os.path.join(os.path.dirname(__file__), 'fixtures', 'prometheus', fixture)
+    with open(f_name, 'r') as f:
+        text_data = f.read()
+
+    results = []
+    for fast_text_parser in (False, True):
+        check = PrometheusCheck('prometheus_check', {}, {}, {})
+        check.NAMESPACE = 'prometheus'
+        check.fast_text_parser = fast_text_parser
+        check.metrics_mapper = {'*': 'unused'}
+        check.label_to_hostname = 'namespace'
+        results.append(_run_text_check(
+            check, text_data, ignore_unmapped=True, send_monotonic_counter=True, custom_tags=['env:test'],
+            send_histograms_buckets=send_histograms_buckets))
+
+    assert results[0]
+    assert results[0] == results[1]
+
+
+def test_fast_text_parser_handler(text_data):
+    check = PrometheusCheck('prometheus_check', {}, {}, {})
+    check.NAMESPACE = 'prometheus'
+    check.fast_text_parser = True
+    check.metrics_mapper = {'process_virtual_memory_bytes': 'process.vm.bytes'}
+    check.ignore_metrics = ['go_goroutines']
+    check.go_gc_duration_seconds = mock.MagicMock()
+    check.go_goroutines = mock.MagicMock()
+
+    submitted = _run_text_check(check, text_data)
+
+    check.poll.assert_called_with("http://fake.endpoint:10055/metrics", pFormat=PrometheusFormat.TEXT)
+    assert submitted == [('gauge', 'prometheus.process.vm.bytes', 54927360.0, (), None)]
+    message = check.go_gc_duration_seconds.call_args[0][0]
+    assert isinstance(message, metrics_pb2.MetricFamily)
+    assert message.type == 2
+    assert message.metric[0].summary.sample_count == 2351
+    assert len(message.metric[0].summary.quantile) == 5
+    check.go_goroutines.assert_not_called()
+
+
+def test_label_tags_plan(p_check):
+    check = p_check
+    metric = metrics_pb2.Metric()
+    for name, value in (('pod', 'web-1'), ('namespace', 'default'), ('uid', '123')):
+        label = metric.label.add()
+        label.name, label.value = name, value
+    check.exclude_labels = ['uid']
+    check.labels_mapper = {'namespace': 'kube_namespace'}
+
+    tags = check._metric_tags('metric', 1, metric, custom_tags=['env:test'])
+    assert tags == ['env:test', 'pod:web-1', 'kube_namespace:default']
+    assert check._label_tags_plan == {'pod': 'pod', 'namespace': 'kube_namespace', 'uid': None}
+
+    # Configuration changes are taken into account at the next scrape
+    check.exclude_labels = []
+    check._check_label_tags_plan()
+    assert check._metric_tags('metric', 1, metric) == ['pod:web-1', 'kube_namespace:default', 'uid:123']
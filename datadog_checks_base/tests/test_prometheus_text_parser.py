@@ -0,0 +1,60 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import pytest
+
+from datadog_checks.utils.prometheus.text_parser import parse_sample, parse_text_families, TextLabel, TextSample
+
+
+def test_parse_sample():
+    assert parse_sample('go_goroutines 42') == TextSample('go_goroutines', (), 42.0)
+    assert parse_sample('go_goroutines 42 1395066363000') == TextSample('go_goroutines', (), 42.0)
+    assert parse_sample('up{job="a",instance="b:80",} +Inf') == TextSample(
+        'up', (TextLabel('job', 'a'), TextLabel('instance', 'b:80')), float('inf'))
+    assert parse_sample('up{a = "x,y=z", b=""} NaN').label == (TextLabel('a', 'x,y=z'), TextLabel('b', ''))
+
+
+def test_parse_sample_escaped_labels():
+    sample = parse_sample(r'msg{text="a \"quoted\" \\ {value}\nline", other="x,y"} 1')
+
+    assert sample.label == (TextLabel('text', 'a "quoted" \\ {value}\nline'), TextLabel('other', 'x,y'))
+    assert sample.value == 1.0
+
+
+def test_parse_sample_invalid():
+    with pytest.raises(ValueError):
+        parse_sample('up{job="a" 1')
+
+
+def test_parse_text_families():
+    lines = [
+        '# HELP rpc_duration_seconds A summary of the RPC duration in seconds.',
+        '# TYPE rpc_duration_seconds summary',
+        'rpc_duration_seconds{quantile="0.5"} 4773',
+        'rpc_duration_seconds_sum 1.7560473e+07',
+        'rpc_duration_seconds_count 2693',
+        '',
+        '# TYPE http_request_duration_seconds histogram',
+        'http_request_duration_seconds_bucket{le="0.05"} 24054',
+        'http_request_duration_seconds_bucket{le="+Inf"} 144320',
+        'http_request_duration_seconds_sum 53423',
+        'http_request_duration_seconds_count 144320',
+        '# TYPE requests_total counter',
+        'requests_total{code="200"} 1027',
+        'requests_total{code="400"} 3',
+        'requests_total_count 3',
+        'no_type 1',
+    ]
+
+    families = [(name, mtype, [s.name for s in samples]) for name, mtype, samples in parse_text_families(lines)]
+
+    assert families == [
+        ('rpc_duration_seconds', 'summary',
+         ['rpc_duration_seconds', 'rpc_duration_seconds_sum', 'rpc_duration_seconds_count']),
+        ('http_request_duration_seconds', 'histogram',
+         ['http_request_duration_seconds_bucket', 'http_request_duration_seconds_bucket',
+          'http_request_duration_seconds_sum', 'http_request_duration_seconds_count']),
+        ('requests_total', 'counter', ['requests_total', 'requests_total']),
+        ('requests_total_count', 'untyped', ['requests_total_count']),
+        ('no_type', 'untyped', ['no_type']),
+    ]
@@ -1,7 +1,15 @@
 # (C) Datadog, Inc. 2018
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
+import threading
+import time
+
+import pytest
+
 from datadog_checks.utils.common import pattern_filter
+from datadog_checks.utils.executor import BoundedExecutor
+from datadog_checks.utils.lru_cache import LRUCache
+from datadog_checks.utils.timeout import TimeoutException
 
 
 class Item:
@@ -50,3 +58,88 @@ class TestPatternFilter:
         assert pattern_filter(items, whitelist=whitelist, key=lambda item: item.name) == [
             Item('abc'), Item('def'), Item('abcdef')
         ]
+
+
+class TestLRUCache:
+    def test_get_set(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 2}
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert 'c' in cache
+        assert len(cache) == 2
+
+    def test_disabled(self):
+        cache = LRUCache(0)
+        cache.set('a', 1)
+
+        assert 'a' not in cache
+
+
+class TestBoundedExecutor:
+    def test_results_in_order(self):
+        executor = BoundedExecutor(4)
+        delays = [0.04, 0.01, 0.03, 0, 0.02]
+
+        def call(i, delay):
+            time.sleep(delay)
+            return i
+
+        assert list(executor.map(call, enumerate(delays))) == [0, 1, 2, 3, 4]
+
+    def test_max_workers(self):
+        executor = BoundedExecutor(2)
+        lock = threading.Lock()
+        running = [0]
+        max_running = [0]
+
+        def call():
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+        list(executor.map(call, [()] * 6))
+        assert max_running[0] == 2
+
+    def test_exception(self):
+        executor = BoundedExecutor(2)
+
+        def call(i):
+            if i == 1:
+                raise ValueError(i)
+            return i
+
+        results = executor.map(call, [(0,), (1,), (2,)])
+        assert next(results) == 0
+        with pytest.raises(ValueError):
+            next(results)
+
+    def test_deadline(self):
+        executor = BoundedExecutor(2, timeout=0.05)
+
+        with pytest.raises(TimeoutException):
+            list(executor.map(time.sleep, [(0,), (1,)]))
+
+    def test_from_config(self):
+        executor = BoundedExecutor.from_config({'max_concurrent_requests': '4', 'collection_timeout': '2.5'}, 10)
+        assert executor.max_workers == 4
+        assert executor.timeout == 2.5
+
+        executor = BoundedExecutor.from_config({}, 10)
+        assert executor.max_workers == 10
+        assert executor.deadline is None
@@ -0,0 +1,225 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import io
+import os
+import resource
+
+# Value of the cgroup v2 limits that aren't set
+CGROUP_V2_MAX = 2 ** 63 - 1
+
+# cgroup pseudo files are small, the buffer grows if one doesn't fit
+DEFAULT_BUFFER_SIZE = 4096
+
+
+def _read_into(f, view, offset):
+    if hasattr(os, 'preadv'):
+        return os.preadv(f.fileno(), [view], offset)
+
+    f.seek(offset)
+    return f.readinto(view)
+
+
+class CgroupReader(object):
+    """
+    Reads the cgroup pseudo files of the containers, keeping them open across check runs:
+    files are re-read from offset 0 into a buffer shared by all the reads, instead of being
+    opened, read and closed each time.
+
+    At most `max_open_files` files are kept open, half of the RLIMIT_NOFILE soft limit by
+    default, the other files are opened on every read.
+    """
+    def __init__(self, max_open_files=None):
+        if max_open_files is None:
+            max_open_files = resource.getrlimit(resource.RLIMIT_NOFILE)[0] // 2
+        self.max_open_files = max_open_files
+        self._files = {}
+        self._open_count = 0
+        self._buffer = bytearray(DEFAULT_BUFFER_SIZE)
+
+    def is_open(self, container_id, filename):
+        return filename in self._files.get(container_id, {})
+
+    def read(self, container_id, filename, path=None):
+        """
+        Return the content of the `filename` cgroup file of a container. `path` is only
+        needed when the file isn't open yet. Raise IOError if the file can't be read.
+        """
+        container_files = self._files.get(container_id)
+        f = container_files.get(filename) if container_files else None
+        if f is not None:
+            try:
+                return self._read(f)
+            except (IOError, OSError) as e:
+                # The cgroup is likely gone with its container, the file will be reopened if it comes back
+                self._close_file(container_id, filename)
+                raise IOError(str(e))
+
+        f = io.FileIO(path, 'r')
+        try:
+            content = self._read(f)
+        except (IOError, OSError) as e:
+            f.close()
+            raise IOError(str(e))
+
+        if self._open_count < self.max_open_files:
+            self._files.setdefault(container_id, {})[filename] = f
+            self._open_count += 1
+        else:
+            f.close()
+
+        return content
+
+    def close(self, container_id):
+        """Close the files of a container."""
+        for f in self._files.pop(container_id, {}).itervalues():
+            f.close()
+            self._open_count -= 1
+
+    def retain(self, container_ids):
+        """Close the files of the containers that aren't part of `container_ids`."""
+        for container_id in [c_id for c_id in self._files if c_id not in container_ids]:
+            self.close(container_id)
+
+    def _close_file(self, container_id, filename):
+        container_files = self._files[container_id]
+        container_files.pop(filename).close()
+        self._open_count -= 1
+        if not container_files:
+            del self._files[container_id]
+
+    def _read(self, f):
+        size = 0
+        while True:
+            if size == len(self._buffer):
+                self._buffer.extend(bytearray(len(self._buffer)))
+            view = memoryview(self._buffer)[size:]
+            read = _read_into(f, view, size)
+            # Release the view before the buffer can be resized
+            del view
+            size += read
+            if size < len(self._buffer):
+                # The pseudo file is generated in full on a read that isn't short of the buffer size
+                break
+
+        return self._buffer[:size].decode('ascii')
+
+
+def parse_flat_keyed(content, keys):
+    """Parse the `key value` lines of a cgroup file, keeping only `keys`."""
+    stats = {}
+    for line in content.splitlines():
+        key, _, value = line.partition(' ')
+        if key in keys:
+            stats[key] = int(value)
+            if len(stats) == len(keys):
+                break
+    return stats
+
+
+def parse_blkio(content, keys=None):
+    """Sum the bytes read and written on every device of `blkio.throttle.io_service_bytes`."""
+    metrics = {
+        'io_read': 0,
+        'io_write': 0,
+    }
+    for line in content.splitlines():
+        if 'Read' in line:
+            metrics['io_read'] += int(line.split()[2])
+        if 'Write' in line:
+            metrics['io_write'] += int(line.split()[2])
+    return metrics
+
+
+def parse_io_stat(content, keys=None):
+    """Sum the bytes read and written on every device of the cgroup v2 `io.stat`."""
+    metrics = {
+        'io_read': 0,
+        'io_write': 0,
+    }
+    for line in content.splitlines():
+        for field in line.split()[1:]:
+            name, _, value = field.partition('=')
+            if name == 'rbytes':
+                metrics['io_read'] += int(value)
+            elif name == 'wbytes':
+                metrics['io_write'] += int(value)
+    return metrics
+
+
+def parse_cpuacct_usage(content, keys=None):
+    # Nanoseconds, reported in hundredths of a second like `cpuacct.stat`
+    return {'usage': int(content) // 10000000}
+
+
+def parse_soft_limit(content, keys=None):
+    value = int(content)
+    # do not report kernel max default value (uint64 * 4096)
+    # see https://github.com/torvalds/linux/blob/5b36577109be007a6ecf4b65b54cbc9118463c2b/mm/memcontrol.c#L2844-L2845
+    # 2 ** 60 is kept for consistency of other cgroups metrics
+    if value < 2 ** 60:
+        return {'softlimit': value}
+    return {}
+
+
+def parse_v2_value(content):
+    content = content.strip()
+    if content == 'max':
+        return CGROUP_V2_MAX
+    return int(content)
+
+
+def single_value_parser(key):
+    """Return a parser storing the value of a single value cgroup file as `key`."""
+    def parse(content, keys=None):
+        return {key: parse_v2_value(content)}
+    return parse
+
+
+def parse_v2_soft_limit(content, keys=None):
+    # `memory.low` is where docker sets the memory reservation, 0 when not set
+    value = parse_v2_value(content)
+    if 0 < value < 2 ** 60:
+        return {'softlimit': value}
+    return {}
+
+
+CGROUP_FILE_PARSERS = {
+    'blkio.throttle.io_service_bytes': parse_blkio,
+    'cpuacct.usage': parse_cpuacct_usage,
+    'memory.soft_limit_in_bytes': parse_soft_limit,
+    'cpu.shares': single_value_parser('shares'),
+    # cgroup v2
+    'io.stat': parse_io_stat,
+    'memory.low': parse_v2_soft_limit,
+    'memory.max': single_value_parser('limit'),
+    'memory.swap.current': single_value_parser('swap'),
+    'memory.swap.max': single_value_parser('swap_limit'),
+    'cpu.weight': single_value_parser('weight'),
+}
+
+
+def parse_cgroup_file(filename, content, keys):
+    """Parse the content of a cgroup file, returning the values of `keys` for flat keyed files."""
+    return CGROUP_FILE_PARSERS.get(filename, parse_flat_keyed)(content, keys)
+
+
+def get_cgroup_keys(cgroup):
+    """Return the keys of the cgroup files used by a `CGROUP_METRICS` entry."""
+    keys = set(cgroup['metrics'])
+    for key_list, _, _ in cgroup.get('to_compute', {}).itervalues():
+        keys.update(key_list)
+    return frozenset(keys)
+
+
+def get_cgroup_v2_path(proc_root, cgroup_root):
+    """
+    Return the directory of the cgroup v2 of a process, from the `0::<path>` line
+    of its `/proc/<pid>/cgroup` file.
+    """
+    with open(os.path.join(proc_root, 'cgroup'), 'r') as f:
+        for line in f:
+            if line.startswith('0::'):
+                return os.path.join(cgroup_root, line[3:].strip().lstrip('/'))
+
+    raise IOError('No cgroup v2 found in {}'.format(os.path.join(proc_root, 'cgroup')))
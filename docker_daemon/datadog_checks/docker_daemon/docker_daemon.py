@@ -25,6 +25,9 @@ from utils.platform import Platform
 from utils.service_discovery.sd_backend import get_sd_backend
 from utils.orchestrator import MetadataCollector
 
+from .cgroup import CgroupReader, get_cgroup_keys, get_cgroup_v2_path, parse_cgroup_file
+from .pids import ContainerPidIndex
+
 
 EVENT_TYPE = 'docker'
 SERVICE_CHECK_NAME = 'docker.service_up'
@@ -32,6 +35,8 @@ HEALTHCHECK_SERVICE_CHECK_NAME = 'docker.container_health'
 EXIT_SERVICE_CHECK_NAME = 'docker.exit'
 SIZE_REFRESH_RATE = 5  # Collect container sizes every 5 iterations of the check
 CONTAINER_ID_RE = re.compile('[0-9a-f]{64}')
+# Events after which the cgroup files of a container are closed
+CONTAINER_EXIT_EVENTS = ('die', 'destroy')
 
 DISK_STATS_RE = re.compile('([0-9.]+)\s?([a-zA-Z]+)')
 
@@ -114,6 +119,64 @@ CGROUP_METRICS = [
     },
 ]
 
+# Same metrics, from the files of the cgroup v2 unified hierarchy. Entries can read several
+# files, their values are then computed together.
+CGROUP_V2_METRICS = [
+    {
+        "cgroup": "memory",
+        "file": ("memory.stat", "memory.max", "memory.swap.current", "memory.swap.max"),
+        "metrics": {
+            "file": ("docker.mem.cache", GAUGE),
+            "anon": ("docker.mem.rss", GAUGE),
+            "swap": ("docker.mem.swap", GAUGE),
+        },
+        "to_compute": {
+            # Limits that aren't set are reported as "max" and not submitted
+            "docker.mem.limit": (["limit"], lambda x: float(x) if x < 2 ** 60 else None, GAUGE),
+            "docker.mem.sw_limit": (["limit", "swap_limit"], lambda x, y: float(x + y) if x + y < 2 ** 60 else None, GAUGE),
+            "docker.mem.in_use": (["anon", "limit"], lambda x, y: float(x)/float(y) if y < 2 ** 60 else None, GAUGE),
+            "docker.mem.sw_in_use": (["swap", "anon", "limit", "swap_limit"], lambda w, x, y, z: float(w + x)/float(y + z) if y + z < 2 ** 60 else None, GAUGE)
+        }
+    },
+    {
+        "cgroup": "memory",
+        "file": "memory.low",
+        "metrics": {
+            "softlimit": ("docker.mem.soft_limit", GAUGE),
+        },
+    },
+    {
+        "cgroup": "cpu",
+        "file": "cpu.stat",
+        "metrics": {
+            "nr_throttled": ("docker.cpu.throttled", RATE)
+        },
+        "to_compute": {
+            # Microseconds, reported in hundredths of a second like `cpuacct.stat`
+            "docker.cpu.user": (["user_usec"], lambda x: x // 10000, RATE),
+            "docker.cpu.system": (["system_usec"], lambda x: x // 10000, RATE),
+            "docker.cpu.usage": (["usage_usec"], lambda x: x // 10000, RATE),
+        }
+    },
+    {
+        "cgroup": "cpu",
+        "file": "cpu.weight",
+        "metrics": {},
+        "to_compute": {
+            # Inverse of the conversion of cpu shares [2, 262144] to weights [1, 10000]
+            "docker.cpu.shares": (["weight"], lambda x: 2 + (x - 1) * 262142 // 9999, GAUGE),
+        }
+    },
+    {
+        "cgroup": "io",
+        "file": "io.stat",
+        "metrics": {
+            "io_read": ("docker.io.read_bytes", RATE),
+            "io_write": ("docker.io.write_bytes", RATE),
+        },
+    },
+]
+
 DEFAULT_CONTAINER_TAGS = [
     "docker_image",
     "short_image",
@@ -224,7 +287,18 @@ class DockerDaemon(AgentCheck):
 
             # We configure the check with the right cgroup settings for this host
             # Just needs to be done once
-            self._mountpoints = self.docker_util.get_mountpoints(CGROUP_METRICS)
+            self._cgroup_root = os.path.join(self.docker_util._docker_root, 'sys/fs/cgroup')
+            self._cgroup_v2 = os.path.exists(os.path.join(self._cgroup_root, 'cgroup.controllers'))
+            if self._cgroup_v2:
+                self._mountpoints = {}
+                cgroup_metrics = CGROUP_V2_METRICS
+            else:
+                self._mountpoints = self.docker_util.get_mountpoints(CGROUP_METRICS)
+                cgroup_metrics = CGROUP_METRICS
+            # Only the keys used by the metrics are parsed out of the cgroup files
+            self._cgroup_metrics = [(cgroup, get_cgroup_keys(cgroup)) for cgroup in cgroup_metrics]
+            # Cgroup files are kept open between runs, and closed when their container exits
+            self._cgroup_reader = CgroupReader()
             self._latest_size_query = 0
             self._filtered_containers = set()
             self._disable_net_metrics = False
@@ -254,6 +328,9 @@ class DockerDaemon(AgentCheck):
             # Container network mapping cache
             self.network_mappings = {}
 
+            # Container PID index, invalidated by the container events
+            self._container_pids = ContainerPidIndex()
+
             # get the health check whitelist
             self.whitelist_patterns = None
             health_scs_whitelist = instance.get('health_service_check_whitelist', [])
@@ -325,11 +402,14 @@ class DockerDaemon(AgentCheck):
             # Get the list of containers and the index of their names
             health_service_checks = True if self.whitelist_patterns else False
             containers_by_id = self._get_and_count_containers(custom_cgroups, health_service_checks)
+
+            # Get the events from Docker API before the PIDs are looked up, they invalidate the PID index
+            api_events = self._get_events()
             containers_by_id = self._crawl_container_pids(containers_by_id, custom_cgroups)
 
             # Send events from Docker API
-            if self.collect_events or self._service_discovery or not self._disable_net_metrics or self.collect_exit_codes:
-                self._process_events(containers_by_id)
+            if self.collect_events or self.collect_exit_codes:
+                self._process_events(containers_by_id, api_events)
 
             # Report performance container metrics (cpu, mem, net, io)
             self._report_performance_metrics(containers_by_id)
@@ -675,6 +755,9 @@ class DockerDaemon(AgentCheck):
             except BogusPIDException as e:
                 self.log.warning('Unable to report cgroup metrics for container %s: %s', container_id[:12], e)
 
+        # Close the files of the containers that exited without an event being seen
+        self._cgroup_reader.retain(containers_by_id)
+
         if containers_without_proc_root:
             message = "Couldn't find pid directory for containers: {0}. They'll be missing network metrics".format(
                 ", ".join(containers_without_proc_root))
@@ -689,19 +772,16 @@ class DockerDaemon(AgentCheck):
         if not container.get('_pid'):
             raise BogusPIDException('Cannot report on bogus pid(0)')
 
-        for cgroup in CGROUP_METRICS:
+        for cgroup, keys in self._cgroup_metrics:
             try:
-                stat_file = self._get_cgroup_from_proc(cgroup["cgroup"], container['_pid'], cgroup['file'])
+                stats = self._read_cgroup_stats(container, cgroup, keys)
             except MountException as e:
                 # We can't find a stat file
                 self.warning(str(e))
                 cgroup_stat_file_failures += 1
-                if cgroup_stat_file_failures >= len(CGROUP_METRICS):
+                if cgroup_stat_file_failures >= len(self._cgroup_metrics):
                     self.warning("Couldn't find the cgroup files. Skipping the CGROUP_METRICS for now.")
-            except IOError as e:
-                self.log.debug("Cannot read cgroup file, container likely raced to finish : %s", e)
             else:
-                stats = self._parse_cgroup_file(stat_file)
                 if stats:
                     for key, (dd_key, metric_func) in cgroup['metrics'].iteritems():
                         metric_func = FUNC_MAP[metric_func][self.use_histogram]
@@ -774,9 +854,7 @@ class DockerDaemon(AgentCheck):
             except Exception:
                 self.log.warning('Malformed network event: %s' % str(ev))
 
-    def _process_events(self, containers_by_id):
-        api_events = self._get_events()
-
+    def _process_events(self, containers_by_id, api_events):
         if self.collect_exit_codes:
             self._report_exit_codes(api_events, containers_by_id)
 
@@ -805,8 +883,15 @@ class DockerDaemon(AgentCheck):
             get_sd_backend(self.agentConfig).update_checks(changed_container_ids)
         if changed_container_ids:
             self.metadata_collector.invalidate_cache(events)
+        self._container_pids.invalidate(events)
+        self._close_cgroup_files(events)
         return events
 
+    def _close_cgroup_files(self, api_events):
+        for ev in api_events:
+            if ev.get('status') in CONTAINER_EXIT_EVENTS:
+                self._cgroup_reader.close(ev.get('id'))
+
     def _pre_aggregate_events(self, api_events, containers_by_id):
         # Aggregate events, one per image. Put newer events first.
         events = defaultdict(deque)
@@ -1017,44 +1102,42 @@ class DockerDaemon(AgentCheck):
         }
         return DockerUtil.find_cgroup_from_proc(self._mountpoints, pid, cgroup, self.docker_util._docker_root) % (params)
 
-    def _parse_cgroup_file(self, stat_file):
-        """Parse a cgroup pseudo file for key/values."""
-        self.log.debug("Opening cgroup file: %s" % stat_file)
-        try:
-            with open(stat_file, 'r') as fp:
-                if 'blkio' in stat_file:
-                    return self._parse_blkio_metrics(fp.read().splitlines())
-                elif 'cpuacct.usage' in stat_file:
-                    return dict({'usage': str(int(fp.read())/10000000)})
-                elif 'memory.soft_limit_in_bytes' in stat_file:
-                    value = int(fp.read())
-                    # do not report kernel max default value (uint64 * 4096)
-                    # see https://github.com/torvalds/linux/blob/5b36577109be007a6ecf4b65b54cbc9118463c2b/mm/memcontrol.c#L2844-L2845
-                    # 2 ** 60 is kept for consistency of other cgroups metrics
-                    if value < 2 ** 60:
-                        return dict({'softlimit': value})
-                elif 'cpu.shares' in stat_file:
-                    value = int(fp.read())
-                    return {'shares': value}
+    def _get_cgroup_file_path(self, container, cgroup, filename):
+        if self._cgroup_v2:
+            proc_root = container.get('_proc_root') or \
+                os.path.join(self.docker_util._docker_root, 'proc', str(container['_pid']))
+            return os.path.join(get_cgroup_v2_path(proc_root, self._cgroup_root), filename)
+
+        return self._get_cgroup_from_proc(cgroup, container['_pid'], filename)
+
+    def _read_cgroup_stats(self, container, cgroup, keys):
+        """
+        Read the cgroup files of a `CGROUP_METRICS` entry, and return the values of `keys`.
+        The files are kept open by the cgroup reader, their path is only resolved on the first read.
+        """
+        filenames = cgroup['file'] if isinstance(cgroup['file'], tuple) else (cgroup['file'],)
+        stats = {}
+        for filename in filenames:
+            try:
+                if self._cgroup_reader.is_open(container['Id'], filename):
+                    content = self._cgroup_reader.read(container['Id'], filename)
                 else:
-                    return dict(map(lambda x: x.split(' ', 1), fp.read().splitlines()))
-        except IOError:
-            # It is possible that the container got stopped between the API call and now.
-            # Some files can also be missing (like cpu.stat) and that's fine.
-            self.log.debug("Can't open %s. Its metrics will be missing." % stat_file)
-
-    def _parse_blkio_metrics(self, stats):
-        """Parse the blkio metrics."""
-        metrics = {
-            'io_read': 0,
-            'io_write': 0,
-        }
-        for line in stats:
-            if 'Read' in line:
-                metrics['io_read'] += int(line.split()[2])
-            if 'Write' in line:
-                metrics['io_write'] += int(line.split()[2])
-        return metrics
+                    stat_file = self._get_cgroup_file_path(container, cgroup['cgroup'], filename)
+                    self.log.debug("Opening cgroup file: %s", stat_file)
+                    content = self._cgroup_reader.read(container['Id'], filename, stat_file)
+            except IOError as e:
+                # It is possible that the container got stopped between the API call and now.
+                # Some files can also be missing (like cpu.stat) and that's fine.
+                self.log.debug("Can't read cgroup file %s, its metrics will be missing: %s", filename, e)
+                continue
+
+            stats.update(self._parse_cgroup_file(filename, content, keys))
+
+        return stats
+
+    def _parse_cgroup_file(self, filename, content, keys):
+        """Parse the content of a cgroup pseudo file for the values of `keys`."""
+        return parse_cgroup_file(filename, content, keys)
 
     def _is_container_cgroup(self, line, selinux_policy):
         if line[1] not in ('cpu,cpuacct', 'cpuacct,cpu', 'cpuacct') or line[2] == '/docker-daemon':
@@ -1071,8 +1154,50 @@ class DockerDaemon(AgentCheck):
 
     # proc files
     def _crawl_container_pids(self, container_dict, custom_cgroups=False):
-        """Crawl `/proc` to find container PIDs and add them to `containers_by_id`."""
+        """
+        Find the PID of the running containers and add them to `containers_by_id`.
+
+        PIDs are kept in an index across runs, new containers are looked up with the Docker API,
+        and `/proc` is only crawled for the containers whose PID couldn't be found this way.
+        A PID inspected during this run takes precedence over the indexed one.
+        """
         proc_path = os.path.join(self.docker_util._docker_root, 'proc')
+
+        # Forget the containers that are gone
+        self._container_pids.retain(container_dict)
+
+        missing = {}
+        for container_id, container in container_dict.iteritems():
+            if not self._is_container_running(container):
+                continue
+
+            indexed_pid = self._container_pids.get(container_id, proc_path)
+            pid = container.get('_pid') or indexed_pid or self._inspect_container_pid(container_id)
+            if pid and (pid == indexed_pid or self._container_pids.add(container_id, pid, proc_path)):
+                container['_pid'] = pid
+                container['_proc_root'] = os.path.join(proc_path, str(pid))
+            else:
+                missing[container_id] = container
+
+        if len(self._container_pids):
+            self._disable_net_metrics = False
+
+        if missing:
+            self._crawl_proc_pids(proc_path, missing, custom_cgroups)
+            for container_id, container in missing.iteritems():
+                if container.get('_proc_root'):
+                    self._container_pids.add(container_id, container['_pid'], proc_path)
+
+        return container_dict
+
+    def _inspect_container_pid(self, container_id):
+        try:
+            return self.docker_util.client.inspect_container(container_id)['State']['Pid']
+        except Exception as e:
+            self.log.debug("Unable to inspect Docker container: %s", e)
+
+    def _crawl_proc_pids(self, proc_path, container_dict, custom_cgroups=False):
+        """Crawl `/proc` to find container PIDs and add them to `container_dict`."""
         pid_dirs = [_dir for _dir in os.listdir(proc_path) if _dir.isdigit()]
 
         if len(pid_dirs) == 0:
@@ -1082,10 +1207,16 @@ class DockerDaemon(AgentCheck):
                          "See https://github.com/DataDog/docker-dd-agent/blob/master/README.md for more information. "
                          "Network metrics will be missing".format(proc_path))
             self._disable_net_metrics = True
-            return container_dict
+            return
 
         self._disable_net_metrics = False
 
+        containers_by_pid = {}
+        if custom_cgroups:
+            for container in container_dict.itervalues():
+                if container.get('_pid'):
+                    containers_by_pid[str(container['_pid'])] = container
+
         for folder in pid_dirs:
             try:
                 path = os.path.join(proc_path, folder, 'cgroup')
@@ -1120,18 +1251,14 @@ class DockerDaemon(AgentCheck):
                             "Container %s not in container_dict, it's likely excluded", container_id
                         )
                         continue
-                    container_dict[container_id]['_pid'] = folder
+                    container_dict[container_id]['_pid'] = int(folder)
                     container_dict[container_id]['_proc_root'] = os.path.join(proc_path, folder)
-                elif custom_cgroups:  # if we match by pid that should be enough (?) - O(n) ugh!
-                    for _, container in container_dict.iteritems():
-                        if container.get('_pid') == int(folder):
-                            container['_proc_root'] = os.path.join(proc_path, folder)
-                            break
+                elif folder in containers_by_pid:  # custom cgroups are matched by pid
+                    containers_by_pid[folder]['_proc_root'] = os.path.join(proc_path, folder)
 
             except Exception, e:
                 self.warning("Cannot parse %s content: %s" % (path, str(e)))
                 continue
-        return container_dict
 
     def filter_capped_metrics(self):
         metrics = self.aggregator.metrics.values()
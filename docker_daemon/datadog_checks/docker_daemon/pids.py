@@ -0,0 +1,77 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import os
+
+# Events after which the PID of a container has to be looked up again
+CONTAINER_PID_EVENTS = ('start', 'restart', 'die', 'kill', 'oom', 'destroy')
+
+
+def get_process_start_time(proc_root):
+    """
+    Return the start time of the process of `proc_root`, in clock ticks since boot,
+    or None if the process is gone.
+    """
+    try:
+        with open(os.path.join(proc_root, 'stat'), 'r') as f:
+            stat = f.read()
+    except (IOError, OSError):
+        return None
+
+    # The command name can contain spaces and parentheses, the fields after it start with the state (3rd field)
+    try:
+        return int(stat[stat.rindex(')') + 2:].split()[19])
+    except (ValueError, IndexError):
+        return None
+
+
+class ContainerPidIndex(object):
+    """
+    PIDs of the running containers, kept across check runs.
+
+    Each PID is indexed with the start time of its process. An indexed PID is only returned
+    while `/proc/<pid>` is still the same process: a PID reused by another process after the
+    container exited doesn't match. Containers are also dropped from the index on the events
+    that change their process, and when they're gone.
+    """
+    def __init__(self):
+        # container id -> (pid, process start time)
+        self._pids = {}
+
+    def __len__(self):
+        return len(self._pids)
+
+    def get(self, container_id, proc_path):
+        """Return the PID of a container if it's indexed and its process is still running, None otherwise."""
+        entry = self._pids.get(container_id)
+        if entry is None:
+            return None
+
+        pid, start_time = entry
+        if get_process_start_time(os.path.join(proc_path, str(pid))) != start_time:
+            del self._pids[container_id]
+            return None
+
+        return pid
+
+    def add(self, container_id, pid, proc_path):
+        """Index the PID of a container. Return False if its process isn't running."""
+        start_time = get_process_start_time(os.path.join(proc_path, str(pid)))
+        if start_time is None:
+            self._pids.pop(container_id, None)
+            return False
+
+        self._pids[container_id] = (pid, start_time)
+        return True
+
+    def invalidate(self, api_events):
+        """Drop the containers whose process changed according to the Docker events."""
+        for ev in api_events:
+            if ev.get('status') in CONTAINER_PID_EVENTS:
+                self._pids.pop(ev.get('id'), None)
+
+    def retain(self, container_ids):
+        """Drop the containers that aren't part of `container_ids`."""
+        for container_id in self._pids.keys():
+            if container_id not in container_ids:
+                del self._pids[container_id]
@@ -0,0 +1,92 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import os
+
+import pytest
+
+from datadog_checks.docker_daemon.cgroup import (
+    CGROUP_V2_MAX, CgroupReader, get_cgroup_v2_path, parse_cgroup_file
+)
+
+
+def write(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+class TestCgroupReader:
+    def test_reread_open_file(self, tmpdir):
+        path = str(tmpdir.join('memory.stat'))
+        write(path, 'cache 1\nrss 2\n')
+        reader = CgroupReader()
+
+        assert reader.read('abc', 'memory.stat', path) == 'cache 1\nrss 2\n'
+        assert reader.is_open('abc', 'memory.stat')
+
+        write(path, 'cache 3\nrss 4\n')
+        assert reader.read('abc', 'memory.stat') == 'cache 3\nrss 4\n'
+
+    def test_buffer_grows(self, tmpdir):
+        path = str(tmpdir.join('memory.stat'))
+        content = 'rss 1\n' * 2000
+        write(path, content)
+
+        assert CgroupReader().read('abc', 'memory.stat', path) == content
+
+    def test_max_open_files(self, tmpdir):
+        path = str(tmpdir.join('cpu.shares'))
+        write(path, '1024\n')
+        reader = CgroupReader(max_open_files=1)
+
+        reader.read('abc', 'cpu.shares', path)
+        reader.read('def', 'cpu.shares', path)
+        assert reader.is_open('abc', 'cpu.shares')
+        assert not reader.is_open('def', 'cpu.shares')
+
+    def test_close_and_retain(self, tmpdir):
+        path = str(tmpdir.join('cpu.shares'))
+        write(path, '1024\n')
+        reader = CgroupReader()
+        for container_id in ('abc', 'def', 'ghi'):
+            reader.read(container_id, 'cpu.shares', path)
+
+        reader.close('abc')
+        reader.retain(['def'])
+        assert not reader.is_open('abc', 'cpu.shares')
+        assert reader.is_open('def', 'cpu.shares')
+        assert not reader.is_open('ghi', 'cpu.shares')
+        assert reader._open_count == 1
+
+    def test_missing_file(self, tmpdir):
+        with pytest.raises(IOError):
+            CgroupReader().read('abc', 'cpu.stat', str(tmpdir.join('cpu.stat')))
+
+
+class TestParseCgroupFile:
+    def test_flat_keyed_only_keys(self):
+        content = 'cache 10\nrss 20\nmapped_file 30\n'
+        assert parse_cgroup_file('memory.stat', content, frozenset(['cache', 'rss'])) == {'cache': 10, 'rss': 20}
+
+    def test_blkio(self):
+        content = '8:0 Read 10\n8:0 Write 20\n8:16 Read 1\n8:16 Write 2\nTotal 33\n'
+        assert parse_cgroup_file('blkio.throttle.io_service_bytes', content, None) == {'io_read': 11, 'io_write': 22}
+
+    def test_io_stat(self):
+        content = '8:0 rbytes=10 wbytes=20 rios=1 wios=2\n8:16 rbytes=1 wbytes=2 rios=1 wios=1\n'
+        assert parse_cgroup_file('io.stat', content, None) == {'io_read': 11, 'io_write': 22}
+
+    def test_soft_limit(self):
+        assert parse_cgroup_file('memory.soft_limit_in_bytes', '1024\n', None) == {'softlimit': 1024}
+        assert parse_cgroup_file('memory.soft_limit_in_bytes', '9223372036854771712\n', None) == {}
+        assert parse_cgroup_file('memory.low', '0\n', None) == {}
+
+    def test_v2_max(self):
+        assert parse_cgroup_file('memory.max', 'max\n', None) == {'limit': CGROUP_V2_MAX}
+        assert parse_cgroup_file('memory.max', '1024\n', None) == {'limit': 1024}
+
+
+def test_get_cgroup_v2_path(tmpdir):
+    write(os.path.join(str(tmpdir), 'cgroup'), '0::/system.slice/docker-abc.scope\n')
+
+    assert get_cgroup_v2_path(str(tmpdir), '/host/sys/fs/cgroup') == '/host/sys/fs/cgroup/system.slice/docker-abc.scope'
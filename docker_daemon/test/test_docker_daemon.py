@@ -16,6 +16,8 @@ from tests.checks.common import AgentCheckTest
 from tests.checks.common import load_check
 from utils.dockerutil import DockerUtil
 
+from datadog_checks.docker_daemon.cgroup import parse_cgroup_file
+
 log = logging.getLogger('tests')
 
 CONTAINERS_TO_RUN = [
@@ -879,22 +881,17 @@ class TestCheckDockerDaemon(AgentCheckTest):
                 expected_tags += tags
             self.assertMetric(mname, tags=expected_tags, count=1, at_least=1)
 
-    def mock_parse_cgroup_file(self, stat_file):
-        with open(stat_file, 'r') as fp:
-            if 'blkio' in stat_file:
-                return {}
-            elif 'cpuacct.usage' in stat_file:
-                return dict({'usage': str(int(fp.read())/10000000)})
-            # mocked part
-            elif 'cpu' in stat_file:
-                return {'user': 1000 * self.run, 'system': 1000 * self.run}
-                self.run += 1
-            elif 'memory.soft_limit_in_bytes' in stat_file:
-                    value = int(fp.read())
-                    if value < 2 ** 60:
-                        return dict({'softlimit': value})
-            else:
-                return dict(map(lambda x: x.split(' ', 1), fp.read().splitlines()))
+    def mock_parse_cgroup_file(self, filename, content, keys):
+        if 'blkio' in filename:
+            return {}
+        elif 'cpuacct.usage' in filename:
+            return parse_cgroup_file(filename, content, keys)
+        # mocked part
+        elif 'cpu' in filename:
+            return {'user': 1000 * self.run, 'system': 1000 * self.run}
+            self.run += 1
+        else:
+            return parse_cgroup_file(filename, content, keys)
 
     def test_filter_capped_metrics(self):
         config = {
@@ -0,0 +1,87 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from datadog_checks.docker_daemon.pids import ContainerPidIndex, get_process_start_time
+
+
+def write_stat(proc_path, pid, start_time, comm='dockerd'):
+    proc_root = proc_path.ensure(str(pid), dir=True)
+    fields = ['S'] + ['0'] * 18 + [str(start_time)] + ['0'] * 10
+    proc_root.join('stat').write('{0} ({1}) {2}\n'.format(pid, comm, ' '.join(fields)))
+
+
+class TestGetProcessStartTime:
+    def test_start_time(self, tmpdir):
+        write_stat(tmpdir, 42, 1234)
+        assert get_process_start_time(str(tmpdir.join('42'))) == 1234
+
+    def test_command_name_with_spaces_and_parentheses(self, tmpdir):
+        write_stat(tmpdir, 42, 1234, comm='my (odd) cmd')
+        assert get_process_start_time(str(tmpdir.join('42'))) == 1234
+
+    def test_missing_process(self, tmpdir):
+        assert get_process_start_time(str(tmpdir.join('42'))) is None
+
+    def test_malformed_stat(self, tmpdir):
+        tmpdir.ensure('42', dir=True).join('stat').write('42 (dockerd) S 1\n')
+        assert get_process_start_time(str(tmpdir.join('42'))) is None
+
+
+class TestContainerPidIndex:
+    def test_get_indexed_pid(self, tmpdir):
+        write_stat(tmpdir, 42, 1234)
+        index = ContainerPidIndex()
+
+        assert index.add('abc', 42, str(tmpdir))
+        assert index.get('abc', str(tmpdir)) == 42
+        assert index.get('def', str(tmpdir)) is None
+
+    def test_add_missing_process(self, tmpdir):
+        index = ContainerPidIndex()
+
+        assert not index.add('abc', 42, str(tmpdir))
+        assert len(index) == 0
+
+    def test_process_gone(self, tmpdir):
+        write_stat(tmpdir, 42, 1234)
+        index = ContainerPidIndex()
+        index.add('abc', 42, str(tmpdir))
+
+        tmpdir.join('42').remove()
+        assert index.get('abc', str(tmpdir)) is None
+        assert len(index) == 0
+
+    def test_reused_pid(self, tmpdir):
+        write_stat(tmpdir, 42, 1234)
+        index = ContainerPidIndex()
+        index.add('abc', 42, str(tmpdir))
+
+        # Another process got the same PID after the container exited
+        write_stat(tmpdir, 42, 5678)
+        assert index.get('abc', str(tmpdir)) is None
+        assert len(index) == 0
+
+    def test_invalidate(self, tmpdir):
+        write_stat(tmpdir, 42, 1234)
+        write_stat(tmpdir, 43, 1234)
+        index = ContainerPidIndex()
+        index.add('abc', 42, str(tmpdir))
+        index.add('def', 43, str(tmpdir))
+
+        index.invalidate([
+            {'status': 'restart', 'id': 'abc'},
+            {'status': 'exec_start', 'id': 'def'},
+        ])
+        assert index.get('abc', str(tmpdir)) is None
+        assert index.get('def', str(tmpdir)) == 43
+
+    def test_retain(self, tmpdir):
+        write_stat(tmpdir, 42, 1234)
+        write_stat(tmpdir, 43, 1234)
+        index = ContainerPidIndex()
+        index.add('abc', 42, str(tmpdir))
+        index.add('def', 43, str(tmpdir))
+
+        index.retain({'def': {}})
+        assert index.get('abc', str(tmpdir)) is None
+        assert index.get('def', str(tmpdir)) == 43
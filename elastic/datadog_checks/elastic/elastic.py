@@ -698,7 +698,7 @@ class ESCheck(AgentCheck):
 
         resp = None
         try:
-            resp = requests.get(
+            resp = self.http.get(
                 url,
                 timeout=config.timeout,
                 headers=headers(self.agentConfig),
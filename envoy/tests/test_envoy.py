@@ -34,7 +34,7 @@ class TestEnvoy:
         instance = INSTANCES['main']
         c = Envoy(self.CHECK_NAME, None, {}, [instance])
 
-        with mock.patch('requests.get', return_value=response('multiple_services')):
+        with mock.patch('requests.Session.get', return_value=response('multiple_services')):
             c.check(instance)
 
         metrics_collected = 0
@@ -49,7 +49,7 @@ class TestEnvoy:
         instance = INSTANCES['main']
         c = Envoy(self.CHECK_NAME, None, {}, [instance])
 
-        with mock.patch('requests.get', return_value=response('multiple_services')):
+        with mock.patch('requests.Session.get', return_value=response('multiple_services')):
             c.check(instance)
 
         assert aggregator.service_checks(Envoy.SERVICE_CHECK_NAME)[0].status == Envoy.OK
@@ -58,7 +58,7 @@ class TestEnvoy:
         instance = INSTANCES['main']
         c = Envoy(self.CHECK_NAME, None, {}, [instance])
 
-        with mock.patch('requests.get', return_value=response('unknown_metrics')):
+        with mock.patch('requests.Session.get', return_value=response('unknown_metrics')):
             c.check(instance)
 
         assert sum(c.unknown_metrics.values()) == 5
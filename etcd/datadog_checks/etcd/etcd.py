@@ -10,6 +10,7 @@ import requests
 from checks import AgentCheck
 from config import _is_affirmative
 from util import headers
+from datadog_checks.utils.http import HTTPClient
 
 
 class Etcd(AgentCheck):
@@ -72,10 +73,25 @@ class Etcd(AgentCheck):
         'standardDeviation': 'etcd.leader.latency.stddev',
     }
 
+    def __init__(self, name, init_config, agentConfig, instances=None):
+        AgentCheck.__init__(self, name, init_config, agentConfig, instances)
+        # HTTP sessions keeping the connections to etcd alive across runs, by instance url
+        self.sessions = {}
+        # Session of the instance being checked
+        self.session = None
+
+    def _get_session(self, instance):
+        url = instance['url']
+        if url not in self.sessions:
+            self.sessions[url] = HTTPClient.from_config(instance, self.init_config).session
+        return self.sessions[url]
+
     def check(self, instance):
         if 'url' not in instance:
             raise Exception('etcd instance missing "url" value.')
 
+        self.session = self._get_session(instance)
+
         # Load values from the instance config
         url = instance['url']
         instance_tags = instance.get('tags', [])
@@ -196,7 +212,8 @@ class Etcd(AgentCheck):
         if 'ssl_certfile' in ssl_params and 'ssl_keyfile' in ssl_params:
             certificate = (ssl_params['ssl_certfile'], ssl_params['ssl_keyfile'])
         verify = ssl_params.get('ssl_ca_certs', True) if ssl_params['ssl_cert_validation'] else False
-        return requests.get(url + path, verify=verify, cert=certificate, timeout=timeout, headers=headers(self.agentConfig))
+        return self.session.get(url + path, verify=verify, cert=certificate, timeout=timeout,
+                                headers=headers(self.agentConfig))
 
     def _get_json(self, url, path, ssl_params, timeout, tags):
         try:
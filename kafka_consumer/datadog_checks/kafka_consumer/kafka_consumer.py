@@ -12,14 +12,15 @@ from kafka.client import KafkaClient
 import kafka.errors as KafkaErrors
 from kafka.protocol.commit import GroupCoordinatorRequest, OffsetFetchRequest
 from kafka.protocol.offset import OffsetRequest, OffsetResetStrategy
-from kafka.structs import TopicPartition
-from kazoo.client import KazooClient
-from kazoo.exceptions import NoNodeError
 
 # project
 from datadog_checks.checks import AgentCheck
 from datadog_checks.config import _is_affirmative
 
+from .metadata import MetadataCache
+from .pipeline import RequestPipeline
+from .zk import ZookeeperSession
+
 # Kafka Errors
 KAFKA_NO_ERROR = KafkaErrors.NoError.errno
 KAFKA_UNKNOWN_ERROR = KafkaErrors.UnknownError.errno
@@ -29,6 +30,7 @@ KAFKA_NOT_LEADER_FOR_PARTITION = KafkaErrors.NotLeaderForPartitionError.errno
 DEFAULT_KAFKA_TIMEOUT = 5
 DEFAULT_ZK_TIMEOUT = 5
 DEFAULT_KAFKA_RETRIES = 3
+DEFAULT_METADATA_REFRESH_INTERVAL = 300
 
 CONTEXT_UPPER_BOUND = 200
 
@@ -59,6 +61,8 @@ class KafkaCheck(AgentCheck):
         self._zk_last_ts = {}
 
         self.kafka_clients = {}
+        self.metadata_caches = {}
+        self.zk_sessions = {}
 
     def check(self, instance):
         # For calculating lag, we have to fetch offsets from both kafka and
@@ -77,6 +81,7 @@ class KafkaCheck(AgentCheck):
             instance.get('kafka_consumer_offsets', zk_hosts_ports is None))
 
         custom_tags = instance.get('tags', [])
+        pipeline_requests = _is_affirmative(instance.get('pipeline_requests', False))
 
         # If monitor_unlisted_consumer_groups is True, fetch all groups stored in ZK
         consumer_groups = None
@@ -96,7 +101,8 @@ class KafkaCheck(AgentCheck):
         kafka_consumer_offsets = None
 
         cli = self._get_kafka_client(instance)
-        cli._maybe_refresh_metadata()
+        if not self._get_metadata_cache(instance).refresh():
+            self.log.warning('Could not refresh the metadata of the Kafka cluster, using the previous one')
 
         if get_kafka_consumer_offsets:
             # For now, consumer groups are mandatory if not using ZK
@@ -110,7 +116,11 @@ class KafkaCheck(AgentCheck):
             #
             # Kafka 0.8.2 added support for storing consumer offsets in Kafka.
             if cli.config.get('api_version') >= (0, 8, 2):
-                kafka_consumer_offsets, topics = self._get_kafka_consumer_offsets(instance, consumer_groups)
+                if pipeline_requests:
+                    kafka_consumer_offsets, topics = self._get_kafka_consumer_offsets_pipelined(
+                        instance, consumer_groups)
+                else:
+                    kafka_consumer_offsets, topics = self._get_kafka_consumer_offsets(instance, consumer_groups)
 
         if not topics:
             # val = {'consumer_group': {'topic': [0, 1]}}
@@ -131,7 +141,8 @@ class KafkaCheck(AgentCheck):
 
         # Fetch the broker highwater offsets
         try:
-            highwater_offsets, topic_partitions_without_a_leader = self._get_broker_offsets(instance, topics)
+            highwater_offsets, topic_partitions_without_a_leader = self._get_broker_offsets(
+                instance, topics, pipeline_requests)
         except Exception:
             self.log.exception('There was a problem collecting the high watermark offsets')
             return
@@ -152,10 +163,12 @@ class KafkaCheck(AgentCheck):
     def stop(self):
         """
         cleanup kafka connections (to all brokers) to avoid leaving
-        stale connections in older kafkas.
+        stale connections in older kafkas, and close the zookeeper sessions.
         """
         for cli in self.kafka_clients.itervalues():
             cli.close()
+        for zk_session in self.zk_sessions.itervalues():
+            zk_session.close()
 
     def _get_kafka_client(self, instance):
         kafka_conn_str = instance.get('kafka_connect_str')
@@ -165,10 +178,13 @@ class KafkaCheck(AgentCheck):
 
         instance_key = tuple(kafka_conn_str)  # cast to tuple in case it's a list
         if instance_key not in self.kafka_clients:
+            metadata_refresh_interval = int(
+                instance.get('metadata_refresh_interval', DEFAULT_METADATA_REFRESH_INTERVAL))
             # While we check for SSL params, if not present they will default
             # to the kafka-python values for plaintext connections
             cli = KafkaClient(bootstrap_servers=kafka_conn_str,
                               client_id='dd-agent',
+                              metadata_max_age_ms=metadata_refresh_interval * 1000,
                               security_protocol=instance.get('security_protocol', 'PLAINTEXT'),
                               ssl_cafile=instance.get('ssl_cafile'),
                               ssl_check_hostname=instance.get('ssl_check_hostname', True),
@@ -176,9 +192,14 @@ class KafkaCheck(AgentCheck):
                               ssl_keyfile=instance.get('ssl_keyfile'),
                               ssl_password=instance.get('ssl_password'))
             self.kafka_clients[instance_key] = cli
+            self.metadata_caches[instance_key] = MetadataCache(cli, metadata_refresh_interval, self._kafka_timeout)
 
         return self.kafka_clients[instance_key]
 
+    def _get_metadata_cache(self, instance):
+        self._get_kafka_client(instance)
+        return self.metadata_caches[tuple(instance.get('kafka_connect_str'))]
+
     def _ensure_ready_node(self, client, node_id):
         if node_id is None:
             raise Exception("node_id is None")
@@ -258,16 +279,18 @@ class KafkaCheck(AgentCheck):
                                   "topic: %s, partition: %s. This should only happen if the topic is "
                                   "currently being deleted.",
                                   topic, partition)
+                    self._get_metadata_cache(instance).invalidate()
                 elif error_code == KAFKA_NOT_LEADER_FOR_PARTITION:
                     self.log.warn("Kafka broker returned NOT_LEADER_FOR_PARTITION (error_code 6) for "
                                   "topic: %s, partition: %s. This should only happen if the broker that "
                                   "was the partition leader when kafka_client.cluster last fetched metadata "
                                   "is no longer the leader.", topic, partition)
                     topic_partitions_without_a_leader.append((topic, partition))
+                    self._get_metadata_cache(instance).invalidate()
 
         return highwater_offsets, topic_partitions_without_a_leader
 
-    def _get_broker_offsets(self, instance, topics):
+    def _get_broker_offsets(self, instance, topics, pipeline_requests=False):
         """
         Fetch highwater offsets for each topic/partition from Kafka cluster.
 
@@ -280,6 +303,9 @@ class KafkaCheck(AgentCheck):
         where that broker is the leader:
         https://cwiki.apache.org/confluence/display/KAFKA/A+Guide+To+The+Kafka+Protocol#AGuideToTheKafkaProtocol-OffsetAPI(AKAListOffset)
 
+        If pipeline_requests is set, all the OffsetRequests are sent before waiting for
+        any response, a broker that doesn't respond in time is skipped.
+
         Can we cleanup connections on agent restart?
         Brokers before 0.9 - accumulate stale connections on restarts.
         In 0.9 Kafka added connections.max.idle.ms
@@ -289,24 +315,14 @@ class KafkaCheck(AgentCheck):
         # Connect to Kafka
         highwater_offsets = {}
         topic_partitions_without_a_leader = []
-        topics_to_fetch = defaultdict(set)
         cli = self._get_kafka_client(instance)
 
-        for topic, partitions in topics.iteritems():
-            # if no partitions are provided
-            # we're falling back to all available partitions (?)
-            if len(partitions) == 0:
-                partitions = cli.cluster.available_partitions_for_topic(topic)
-            topics_to_fetch[topic].update(partitions)
-
-        leader_tp = defaultdict(lambda: defaultdict(set))
-        for topic, partitions in topics_to_fetch.iteritems():
-            for partition in partitions:
-                partition_leader = cli.cluster.leader_for_partition(TopicPartition(topic, partition))
-                if partition_leader is not None and partition_leader >= 0:
-                    leader_tp[partition_leader][topic].update([partition])
+        # if no partitions are provided
+        # we're falling back to all available partitions (?)
+        leader_tp = self._get_metadata_cache(instance).leaders(topics)
 
         max_offsets = 1
+        requests = []
         for node_id, tps in leader_tp.iteritems():
             # Construct the OffsetRequest
             request = OffsetRequest[0](
@@ -315,8 +331,17 @@ class KafkaCheck(AgentCheck):
                     (topic, [
                         (partition, OffsetResetStrategy.LATEST, max_offsets) for partition in partitions])
                     for topic, partitions in tps.iteritems()])
+            requests.append((node_id, request))
 
-            response = self._make_blocking_req(cli, request, node_id=node_id)
+        if pipeline_requests:
+            responses = RequestPipeline(cli, self._kafka_timeout).gather(requests)
+        else:
+            responses = (self._make_blocking_req(cli, request, node_id=node_id) for node_id, request in requests)
+
+        for (node_id, request), response in zip(requests, responses):
+            if isinstance(response, Exception):
+                self.log.error("Could not fetch the highwater offsets from broker id: %s: %s", node_id, response)
+                continue
             offsets, unled = self._process_highwater_offsets(request, instance, node_id, response)
             highwater_offsets.update(offsets)
             topic_partitions_without_a_leader.extend(unled)
@@ -360,16 +385,11 @@ class KafkaCheck(AgentCheck):
 
             self.gauge('kafka.consumer_lag', consumer_lag, tags=consumer_group_tags)
 
-    def _get_zk_path_children(self, zk_conn, zk_path, name_for_error):
-        """Fetch child nodes for a given Zookeeper path."""
-        children = []
-        try:
-            children = zk_conn.get_children(zk_path)
-        except NoNodeError:
-            self.log.info('No zookeeper node at %s', zk_path)
-        except Exception:
-            self.log.exception('Could not read %s from %s', name_for_error, zk_path)
-        return children
+    def _get_zk_session(self, zk_hosts_ports):
+        key = tuple(zk_hosts_ports) if isinstance(zk_hosts_ports, list) else zk_hosts_ports
+        if key not in self.zk_sessions:
+            self.zk_sessions[key] = ZookeeperSession(zk_hosts_ports, self._zk_timeout, self.log)
+        return self.zk_sessions[key]
 
     def _get_zk_consumer_offsets(self, zk_hosts_ports, consumer_groups=None, zk_prefix=''):
         """
@@ -378,6 +398,10 @@ class KafkaCheck(AgentCheck):
         Also fetch consumer_groups, topics, and partitions if not
         already specified in consumer_groups.
 
+        The session to Zookeeper is kept open across runs, the consumer groups, topics and partitions
+        are served from its cache until they change. The nodes of each level of the tree, then the
+        offsets, are read all at once.
+
         :param dict consumer_groups: The consumer groups, topics, and partitions
             that you want to fetch offsets for. If consumer_groups is None, will
             fetch offsets for all consumer_groups. For examples of what this
@@ -391,53 +415,52 @@ class KafkaCheck(AgentCheck):
         zk_path_topic_tmpl = zk_path_consumer + '{group}/offsets/'
         zk_path_partition_tmpl = zk_path_topic_tmpl + '{topic}/'
 
-        zk_conn = KazooClient(zk_hosts_ports, timeout=self._zk_timeout)
-        zk_conn.start()
-        try:
-            if consumer_groups is None:
-                # If consumer groups aren't specified, fetch them from ZK
-                consumer_groups = {consumer_group: None for consumer_group in
-                                   self._get_zk_path_children(zk_conn, zk_path_consumer, 'consumer groups')}
-
-            for consumer_group, topics in consumer_groups.iteritems():
-                if topics is None:
-                    # If topics are't specified, fetch them from ZK
-                    zk_path_topics = zk_path_topic_tmpl.format(group=consumer_group)
-                    topics = {topic: None for topic in
-                              self._get_zk_path_children(zk_conn, zk_path_topics, 'topics')}
-                    consumer_groups[consumer_group] = topics
+        zk_session = self._get_zk_session(zk_hosts_ports)
 
-                for topic, partitions in topics.iteritems():
-                    if partitions is not None:
-                        partitions = set(partitions)  # defend against bad user input
-                    else:
-                        # If partitions aren't specified, fetch them from ZK
-                        zk_path_partitions = zk_path_partition_tmpl.format(
-                            group=consumer_group, topic=topic)
-                        # Zookeeper returns the partition IDs as strings because
-                        # they are extracted from the node path
-                        partitions = [int(x) for x in self._get_zk_path_children(
-                            zk_conn, zk_path_partitions, 'partitions')]
-                        consumer_groups[consumer_group][topic] = partitions
-
-                    # Fetch consumer offsets for each partition from ZK
-                    for partition in partitions:
-                        zk_path = (zk_path_partition_tmpl + '{partition}/').format(
-                            group=consumer_group, topic=topic, partition=partition)
-                        try:
-                            consumer_offset = int(zk_conn.get(zk_path)[0])
-                            key = (consumer_group, topic, partition)
-                            zk_consumer_offsets[key] = consumer_offset
-                        except NoNodeError:
-                            self.log.info('No zookeeper node at %s', zk_path)
-                        except Exception:
-                            self.log.exception('Could not read consumer offset from %s', zk_path)
-        finally:
+        if consumer_groups is None:
+            # If consumer groups aren't specified, fetch them from ZK
+            children = zk_session.get_children([zk_path_consumer], 'consumer groups')
+            consumer_groups = {consumer_group: None for consumer_group in children[zk_path_consumer] or []}
+
+        # If topics are't specified, fetch them from ZK
+        zk_paths_topics = {
+            consumer_group: zk_path_topic_tmpl.format(group=consumer_group)
+            for consumer_group, topics in consumer_groups.iteritems() if topics is None
+        }
+        children = zk_session.get_children(zk_paths_topics.values(), 'topics')
+        for consumer_group, zk_path_topics in zk_paths_topics.iteritems():
+            consumer_groups[consumer_group] = {topic: None for topic in children[zk_path_topics] or []}
+
+        # If partitions aren't specified, fetch them from ZK
+        zk_paths_partitions = {
+            (consumer_group, topic): zk_path_partition_tmpl.format(group=consumer_group, topic=topic)
+            for consumer_group, topics in consumer_groups.iteritems()
+            for topic, partitions in topics.iteritems() if partitions is None
+        }
+        children = zk_session.get_children(zk_paths_partitions.values(), 'partitions')
+        for (consumer_group, topic), zk_path_partitions in zk_paths_partitions.iteritems():
+            # Zookeeper returns the partition IDs as strings because
+            # they are extracted from the node path
+            consumer_groups[consumer_group][topic] = [int(x) for x in children[zk_path_partitions] or []]
+
+        # Fetch consumer offsets for each partition from ZK
+        zk_paths = {}
+        for consumer_group, topics in consumer_groups.iteritems():
+            for topic, partitions in topics.iteritems():
+                for partition in set(partitions):  # defend against bad user input
+                    zk_path = (zk_path_partition_tmpl + '{partition}/').format(
+                        group=consumer_group, topic=topic, partition=partition)
+                    zk_paths[(consumer_group, topic, partition)] = zk_path
+
+        values = zk_session.get_values(zk_paths.values(), 'consumer offset')
+        for key, zk_path in zk_paths.iteritems():
+            if values[zk_path] is None:
+                continue
             try:
-                zk_conn.stop()
-                zk_conn.close()
-            except Exception:
-                self.log.exception('Error cleaning up Zookeeper connection')
+                zk_consumer_offsets[key] = int(values[zk_path])
+            except ValueError:
+                self.log.exception('Could not read consumer offset from %s', zk_path)
+
         return zk_consumer_offsets, consumer_groups
 
     def _get_kafka_consumer_offsets(self, instance, consumer_groups):
@@ -468,13 +491,80 @@ class KafkaCheck(AgentCheck):
 
         return consumer_offsets, topics
 
-    def _get_consumer_offsets(self, client, consumer_group, topic_partitions, coord_id=None):
+    def _get_kafka_consumer_offsets_pipelined(self, instance, consumer_groups):
+        """
+        Same as _get_kafka_consumer_offsets, but the GroupCoordinatorRequests of all the groups are
+        sent at once, spread over the brokers, and then all the OffsetFetchRequests are sent at once.
+
+        OffsetFetchRequests only accept a single group, the requests of the groups sharing a coordinator
+        are pipelined on its connection instead.
+        """
+        consumer_offsets = {}
+        topics = defaultdict(set)
+
+        cli = self._get_kafka_client(instance)
+        pipeline = RequestPipeline(cli, self._kafka_timeout)
+        broker_ids = [b.nodeId for b in cli.cluster.brokers()]
+        if not broker_ids:
+            self.log.error('No broker available to fetch the consumer offsets from.')
+            return consumer_offsets, topics
+
+        groups = list(consumer_groups)
+        coordinator_requests = [(broker_ids[i % len(broker_ids)], GroupCoordinatorRequest[0](group))
+                                for i, group in enumerate(groups)]
+        coordinators = {}
+        for group, coord_resp in zip(groups, pipeline.gather(coordinator_requests)):
+            # 0 means that there is no error
+            if not isinstance(coord_resp, Exception) and coord_resp.error_code == 0:
+                cli.cluster.add_group_coordinator(group, coord_resp)
+                coord_id = cli.cluster.coordinator_for_group(group)
+                if coord_id is not None and coord_id >= 0:
+                    coordinators[group] = coord_id
+                    continue
+            self.log.info("unable to find group coordinator for %s", group)
+
+        fetch_requests = []
+        fetch_groups = []
+        for group in groups:
+            request = self._get_offset_fetch_request(cli, group, consumer_groups[group])
+            for node_id in [coordinators[group]] if group in coordinators else broker_ids:
+                fetch_requests.append((node_id, request))
+                fetch_groups.append(group)
+
+        for group, response in zip(fetch_groups, pipeline.gather(fetch_requests)):
+            if isinstance(response, Exception):
+                self.log.error('Could not read consumer offsets of %s from kafka: %s', group, response)
+                continue
+            for (topic, partition), offset in self._process_consumer_offsets(response).iteritems():
+                topics[topic].update([partition])
+                consumer_offsets[(group, topic, partition)] = offset
+
+        return consumer_offsets, topics
+
+    def _get_offset_fetch_request(self, client, consumer_group, topic_partitions):
         tps = defaultdict(set)
         for topic, partitions in topic_partitions.iteritems():
             if len(partitions) == 0:
                 partitions = client.cluster.available_partitions_for_topic(topic)
             tps[topic] = tps[unicode(topic)].union(set(partitions))
 
+        # Kafka protocol uses OffsetFetchRequests to retrieve consumer offsets:
+        # https://kafka.apache.org/protocol#The_Messages_OffsetFetch
+        # https://cwiki.apache.org/confluence/display/KAFKA/A+Guide+To+The+Kafka+Protocol#AGuideToTheKafkaProtocol-OffsetFetchRequest
+        return OffsetFetchRequest[1](consumer_group, list(tps.iteritems()))
+
+    def _process_consumer_offsets(self, response):
+        consumer_offsets = {}
+        for (topic, partition_offsets) in response.topics:
+            for partition, offset, _, error_code in partition_offsets:
+                if error_code is not 0:
+                    continue
+                consumer_offsets[(topic, partition)] = offset
+        return consumer_offsets
+
+    def _get_consumer_offsets(self, client, consumer_group, topic_partitions, coord_id=None):
+        request = self._get_offset_fetch_request(client, consumer_group, topic_partitions)
+
         consumer_offsets = {}
         if coord_id is not None and coord_id >= 0:
             broker_ids = [coord_id]
@@ -482,16 +572,8 @@ class KafkaCheck(AgentCheck):
             broker_ids = [b.nodeId for b in client.cluster.brokers()]
 
         for broker_id in broker_ids:
-            # Kafka protocol uses OffsetFetchRequests to retrieve consumer offsets:
-            # https://kafka.apache.org/protocol#The_Messages_OffsetFetch
-            # https://cwiki.apache.org/confluence/display/KAFKA/A+Guide+To+The+Kafka+Protocol#AGuideToTheKafkaProtocol-OffsetFetchRequest
-            request = OffsetFetchRequest[1](consumer_group, list(tps.iteritems()))
             response = self._make_blocking_req(client, request, node_id=broker_id)
-            for (topic, partition_offsets) in response.topics:
-                for partition, offset, _, error_code in partition_offsets:
-                    if error_code is not 0:
-                        continue
-                    consumer_offsets[(topic, partition)] = offset
+            consumer_offsets.update(self._process_consumer_offsets(response))
 
         return consumer_offsets
 
@@ -0,0 +1,94 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+from collections import defaultdict
+from time import time
+
+from kafka.structs import TopicPartition
+
+from .pipeline import MAX_POLL_TIMEOUT_MS
+
+
+class MetadataCache(object):
+    """
+    Partition leaders of a Kafka cluster, indexed by topic and leader.
+
+    The metadata of the cluster is refreshed every `ttl` seconds, or on the next run after `invalidate`,
+    e.g. when a broker answered that it isn't the leader of a partition anymore. The index is rebuilt
+    once per metadata update, instead of looking the leader of every partition up on each run.
+    """
+    def __init__(self, client, ttl, timeout):
+        self.client = client
+        self.ttl = ttl
+        self.timeout = timeout
+        self.last_refresh = None
+        self._need_refresh = True
+        # topic -> {leader: set of partitions}, partition leaders by (topic, partition)
+        self._topic_leaders = None
+        self._partition_leaders = None
+        client.cluster.add_listener(self._on_update)
+
+    def invalidate(self):
+        self._need_refresh = True
+
+    def refresh(self, now=None):
+        """
+        Fetch the metadata if it's older than `ttl` or was invalidated, waiting at most `timeout`.
+        Return False if the update failed, the index of the previous one is kept and the next run tries again.
+        """
+        now = time() if now is None else now
+        if not self._need_refresh and now - self.last_refresh < self.ttl:
+            return True
+
+        future = self.client.cluster.request_update()
+        deadline = time() + self.timeout
+        while not future.is_done and time() < deadline:
+            self.client.poll(timeout_ms=MAX_POLL_TIMEOUT_MS)
+
+        if not future.is_done or future.failed():
+            return False
+
+        self._need_refresh = False
+        self.last_refresh = now
+        return True
+
+    def leaders(self, topics):
+        """
+        Return the partitions of `topics`, a dict of topic -> set of partitions, by leader and topic.
+        All the available partitions of a topic are returned if its set is empty.
+        """
+        if self._topic_leaders is None:
+            self._build_index()
+
+        leader_tp = defaultdict(lambda: defaultdict(set))
+        for topic, partitions in topics.iteritems():
+            if not partitions:
+                for leader, led in self._topic_leaders.get(topic, {}).iteritems():
+                    leader_tp[leader][topic].update(led)
+                continue
+
+            for partition in partitions:
+                leader = self._partition_leaders.get((topic, partition))
+                if leader is not None:
+                    leader_tp[leader][topic].add(partition)
+
+        return leader_tp
+
+    def _build_index(self):
+        cluster = self.client.cluster
+        topic_leaders = defaultdict(lambda: defaultdict(set))
+        partition_leaders = {}
+        for topic in cluster.topics(exclude_internal_topics=False):
+            for partition in cluster.partitions_for_topic(topic) or ():
+                leader = cluster.leader_for_partition(TopicPartition(topic, partition))
+                if leader is not None and leader >= 0:
+                    topic_leaders[topic][leader].add(partition)
+                    partition_leaders[(topic, partition)] = leader
+
+        self._topic_leaders = topic_leaders
+        self._partition_leaders = partition_leaders
+
+    def _on_update(self, cluster):
+        # Called on every metadata update of the client, including the ones it makes on its own
+        self._topic_leaders = None
+        self._partition_leaders = None
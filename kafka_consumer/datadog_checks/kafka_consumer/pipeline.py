@@ -0,0 +1,65 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from collections import defaultdict, deque
+from time import time
+
+import kafka.errors as KafkaErrors
+
+# Maximum time to wait in a single poll of the client, so that the requests
+# waiting for a connection are sent as soon as it's ready
+MAX_POLL_TIMEOUT_MS = 100
+
+
+class RequestPipeline(object):
+    """
+    Sends requests to the brokers without waiting for the responses of the previous ones,
+    and gathers all the responses within a single deadline.
+
+    Requests to the same broker are sent as long as its connection allows more requests in flight,
+    see `max_in_flight_requests_per_connection` of the client. The others are sent as responses come back.
+    """
+    def __init__(self, client, timeout):
+        self.client = client
+        self.timeout = timeout
+
+    def gather(self, requests):
+        """
+        Send the (node_id, request) `requests` and return their results in the same order:
+        the response of a request, or the exception it failed with.
+        """
+        results = [None] * len(requests)
+        queues = defaultdict(deque)
+        for idx, (node_id, _) in enumerate(requests):
+            queues[node_id].append(idx)
+
+        futures = {}
+        deadline = time() + self.timeout
+        while queues or futures:
+            for node_id in list(queues):
+                queue = queues[node_id]
+                # `ready` also initiates the connection to the node
+                while queue and self.client.ready(node_id):
+                    idx = queue.popleft()
+                    futures[idx] = self.client.send(node_id, requests[idx][1])
+                if not queue:
+                    del queues[node_id]
+
+            for idx, future in futures.items():
+                if future.is_done:
+                    results[idx] = future.value if future.succeeded() else future.exception
+                    del futures[idx]
+
+            if not queues and not futures:
+                break
+
+            remaining = deadline - time()
+            if remaining <= 0:
+                for idx in futures.keys() + [i for node_queue in queues.itervalues() for i in node_queue]:
+                    results[idx] = KafkaErrors.RequestTimedOutError(
+                        'No response from broker {} within {} seconds'.format(requests[idx][0], self.timeout))
+                break
+
+            self.client.poll(timeout_ms=min(remaining * 1000, MAX_POLL_TIMEOUT_MS))
+
+        return results
@@ -0,0 +1,118 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+import threading
+from time import time
+
+from kazoo.client import KazooClient, KazooState
+from kazoo.exceptions import NoNodeError
+from kazoo.protocol.paths import normpath
+
+
+class ZookeeperSession(object):
+    """
+    Long-lived session to a Zookeeper ensemble, kept open across the runs of the check.
+
+    The children of the nodes are cached, with a child watch on each node read: the entry of a node
+    is dropped as soon as its children change, and the whole cache when the session expires since
+    its watches are gone with it. All the reads are issued with the async API and gathered together
+    within a single `timeout`.
+    """
+    def __init__(self, hosts, timeout, log):
+        self.hosts = hosts
+        self.timeout = timeout
+        self.log = log
+        self._client = None
+        # path -> list of children
+        self._children = {}
+        # Incremented by every invalidation, children read while it changed aren't cached
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_children(self, paths, name_for_error):
+        """Return a dict of the children of the nodes of `paths`, None for the nodes that couldn't be read."""
+        results = {}
+        pending = []
+        with self._lock:
+            generation = self._generation
+            for path in paths:
+                children = self._children.get(normpath(path))
+                if children is not None:
+                    results[path] = children
+                else:
+                    pending.append(path)
+
+        client = self._get_client()
+        read = self._gather(
+            [(path, client.get_children_async(normpath(path), watch=self._on_children_change)) for path in pending],
+            name_for_error
+        )
+
+        with self._lock:
+            if generation == self._generation:
+                for path, children in read.iteritems():
+                    if children is not None:
+                        self._children[normpath(path)] = children
+        results.update(read)
+        return results
+
+    def get_values(self, paths, name_for_error):
+        """Return a dict of the data of the nodes of `paths`, None for the nodes that couldn't be read."""
+        client = self._get_client()
+        read = self._gather([(path, client.get_async(normpath(path))) for path in paths], name_for_error)
+        return {path: data[0] if data is not None else None for path, data in read.iteritems()}
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+            self._children.clear()
+        if client is not None:
+            try:
+                client.stop()
+                client.close()
+            except Exception:
+                self.log.exception('Error cleaning up Zookeeper connection')
+
+    def _get_client(self):
+        if self._client is None:
+            client = KazooClient(self.hosts, timeout=self.timeout)
+            client.add_listener(self._on_state_change)
+            try:
+                client.start(timeout=self.timeout)
+            except Exception:
+                # The client keeps trying to connect in the background until stopped
+                client.stop()
+                client.close()
+                raise
+            self._client = client
+        return self._client
+
+    def _gather(self, results, name_for_error):
+        values = {}
+        deadline = time() + self.timeout
+        for path, result in results:
+            try:
+                values[path] = result.get(timeout=max(deadline - time(), 0))
+            except NoNodeError:
+                self.log.info('No zookeeper node at %s', path)
+                values[path] = None
+            except Exception:
+                self.log.exception('Could not read %s from %s', name_for_error, path)
+                values[path] = None
+        return values
+
+    def _invalidate(self, path=None):
+        with self._lock:
+            self._generation += 1
+            if path is None:
+                self._children.clear()
+            else:
+                self._children.pop(path, None)
+
+    def _on_children_change(self, event):
+        # Called from the event thread of the client, watches are only triggered once
+        self._invalidate(event.path)
+
+    def _on_state_change(self, state):
+        if state == KazooState.LOST:
+            self._invalidate()
@@ -0,0 +1,89 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+import pytest
+from kafka.cluster import ClusterMetadata
+from kafka.protocol.metadata import MetadataResponse
+
+from datadog_checks.kafka_consumer.metadata import MetadataCache
+
+
+def metadata_response(leaders):
+    """Build a MetadataResponse out of a dict of topic -> list of partition leaders."""
+    return MetadataResponse[0](
+        [(0, 'broker0', 9092), (1, 'broker1', 9092)],
+        [(0, topic, [(0, partition, leader, [], []) for partition, leader in enumerate(partition_leaders)])
+         for topic, partition_leaders in leaders.iteritems()]
+    )
+
+
+class FakeClient(object):
+    """Stand-in for a KafkaClient whose metadata requests are answered by the next poll."""
+
+    def __init__(self, leaders):
+        self.cluster = ClusterMetadata()
+        self.response = metadata_response(leaders)
+        self.error = None
+        self.metadata_requests = 0
+
+    def poll(self, timeout_ms=None, future=None):
+        self.metadata_requests += 1
+        if self.error is not None:
+            self.cluster.failed_update(self.error)
+        else:
+            self.cluster.update_metadata(self.response)
+
+
+@pytest.mark.unit
+def test_leaders():
+    client = FakeClient({'marvel': [0, 1, -1], 'dc': [1]})
+    metadata = MetadataCache(client, 300, 5)
+    assert metadata.refresh()
+
+    assert metadata.leaders({'marvel': set(), 'dc': {0}}) == {
+        0: {'marvel': {0}},
+        1: {'marvel': {1}, 'dc': {0}},
+    }
+    # Partitions without a leader and unknown partitions are left out
+    assert metadata.leaders({'marvel': {2, 3}, 'unknown': set()}) == {}
+
+
+@pytest.mark.unit
+def test_refresh():
+    client = FakeClient({'marvel': [0, 1]})
+    metadata = MetadataCache(client, 300, 5)
+    assert metadata.refresh(now=1000)
+    assert client.metadata_requests == 1
+    assert metadata.leaders({'marvel': {1}}) == {1: {'marvel': {1}}}
+
+    # The metadata is reused until it expires
+    client.response = metadata_response({'marvel': [0, 0]})
+    assert metadata.refresh(now=1200)
+    assert client.metadata_requests == 1
+    assert metadata.leaders({'marvel': {1}}) == {1: {'marvel': {1}}}
+
+    # Or until a broker tells it's stale
+    metadata.invalidate()
+    assert metadata.refresh(now=1250)
+    assert client.metadata_requests == 2
+    assert metadata.leaders({'marvel': {1}}) == {0: {'marvel': {1}}}
+
+    assert metadata.refresh(now=1500)
+    assert client.metadata_requests == 2
+    assert metadata.refresh(now=1550)
+    assert client.metadata_requests == 3
+
+
+@pytest.mark.unit
+def test_refresh_failed():
+    client = FakeClient({'marvel': [0]})
+    metadata = MetadataCache(client, 300, 5)
+    assert metadata.refresh(now=1000)
+
+    # The previous index is kept and the next run tries again
+    client.error = Exception('No broker available')
+    metadata.invalidate()
+    assert not metadata.refresh(now=1100)
+    assert metadata.leaders({'marvel': set()}) == {0: {'marvel': {0}}}
+    assert not metadata.refresh(now=1200)
+    assert client.metadata_requests == 3
@@ -0,0 +1,167 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+import time
+
+import pytest
+import kafka.errors as KafkaErrors
+from kafka.cluster import ClusterMetadata
+from kafka.future import Future
+from kafka.protocol.commit import GroupCoordinatorRequest, GroupCoordinatorResponse, OffsetFetchResponse
+from kafka.protocol.offset import OffsetRequest, OffsetResponse
+
+from datadog_checks.kafka_consumer import KafkaCheck
+from datadog_checks.kafka_consumer.metadata import MetadataCache
+from datadog_checks.kafka_consumer.pipeline import RequestPipeline
+
+from .test_metadata import metadata_response
+
+KAFKA_CONNECT_STR = ['broker0:9092', 'broker1:9092']
+
+
+class FakeClient(object):
+    """
+    Stand-in for a KafkaClient connected to brokers 0 and 1, whose requests are answered
+    by `respond(node_id, request)` on the next poll, most recent request first.
+    A broker that doesn't respond is stood in for by a `respond` returning None.
+    """
+
+    def __init__(self, respond, max_in_flight=5):
+        self.cluster = ClusterMetadata()
+        self.cluster.update_metadata(metadata_response({'marvel': [0, 1], 'dc': [1]}))
+        self.respond = respond
+        self.max_in_flight = max_in_flight
+        self.sent = []
+        self._in_flight = []
+
+    def ready(self, node_id):
+        return len([n for n, _, _ in self._in_flight if n == node_id]) < self.max_in_flight
+
+    def send(self, node_id, request):
+        future = Future()
+        self.sent.append((node_id, request))
+        self._in_flight.append((node_id, request, future))
+        return future
+
+    def poll(self, timeout_ms=None, future=None):
+        in_flight, self._in_flight = self._in_flight, []
+        for node_id, request, future in reversed(in_flight):
+            response = self.respond(node_id, request)
+            if response is None:
+                self._in_flight.append((node_id, request, future))
+            elif isinstance(response, Exception):
+                future.failure(response)
+            else:
+                future.success(response)
+
+        if self._in_flight:
+            time.sleep(timeout_ms / 1000.0)
+
+
+def get_check(client):
+    check = KafkaCheck('kafka_consumer', {'kafka_timeout': 1}, {})
+    key = tuple(KAFKA_CONNECT_STR)
+    check.kafka_clients[key] = client
+    check.metadata_caches[key] = MetadataCache(client, 300, 1)
+    return check
+
+
+def offset_response(node_id, request):
+    """OffsetResponse of broker `node_id`, the offset of each partition is 100 * broker + partition."""
+    return OffsetResponse[0]([
+        (topic, [(partition, 0, [100 * node_id + partition]) for partition, _, _ in partitions])
+        for topic, partitions in request.topics
+    ])
+
+
+@pytest.mark.unit
+def test_gather_order():
+    # Only one request in flight per broker, the others wait for its response
+    client = FakeClient(lambda node_id, request: '{}-{}'.format(node_id, request), max_in_flight=1)
+    requests = [(0, 'a'), (1, 'b'), (0, 'c'), (0, 'd'), (1, 'e')]
+
+    assert RequestPipeline(client, 1).gather(requests) == ['0-a', '1-b', '0-c', '0-d', '1-e']
+    assert [r for _, r in client.sent] == ['a', 'b', 'c', 'e', 'd']
+
+
+@pytest.mark.unit
+def test_gather_timeout():
+    client = FakeClient(lambda node_id, request: request if node_id == 0 else None, max_in_flight=1)
+    requests = [(0, 'a'), (1, 'b'), (1, 'c'), (0, 'd')]
+
+    start = time.time()
+    results = RequestPipeline(client, 0.3).gather(requests)
+    assert 0.3 <= time.time() - start < 1
+
+    assert results[0] == 'a' and results[3] == 'd'
+    # Both the request in flight and the one still waiting to be sent time out
+    for result in results[1:3]:
+        assert isinstance(result, KafkaErrors.RequestTimedOutError)
+    assert client.sent == [(0, 'a'), (1, 'b'), (0, 'd')]
+
+
+@pytest.mark.unit
+def test_gather_broker_failure():
+    error = KafkaErrors.KafkaConnectionError('Connection reset by peer')
+    client = FakeClient(lambda node_id, request: error if node_id == 1 else request)
+
+    assert RequestPipeline(client, 1).gather([(0, 'a'), (1, 'b'), (0, 'c')]) == ['a', error, 'c']
+
+
+@pytest.mark.unit
+def test_broker_offsets_pipelined():
+    def respond(node_id, request):
+        if node_id == 1:
+            return KafkaErrors.KafkaConnectionError('Connection reset by peer')
+        return offset_response(node_id, request)
+
+    client = FakeClient(respond)
+    check = get_check(client)
+
+    highwater_offsets, unled = check._get_broker_offsets(
+        {'kafka_connect_str': KAFKA_CONNECT_STR}, {'marvel': set(), 'dc': set()}, pipeline_requests=True)
+
+    # The offsets of the partitions led by the broker that failed are missing
+    assert highwater_offsets == {('marvel', 0): 0}
+    assert unled == []
+    assert sorted(node_id for node_id, request in client.sent if isinstance(request, OffsetRequest[0])) == [0, 1]
+
+
+@pytest.mark.unit
+def test_consumer_offsets_pipelined():
+    coordinators = {'avengers': 0, 'justice_league': 1}
+
+    def respond(node_id, request):
+        if isinstance(request, GroupCoordinatorRequest[0]):
+            coordinator_id = coordinators.get(request.consumer_group)
+            if coordinator_id is None:
+                # GROUP_COORDINATOR_NOT_AVAILABLE
+                return GroupCoordinatorResponse[0](15, -1, '', -1)
+            return GroupCoordinatorResponse[0](0, coordinator_id, 'broker{}'.format(coordinator_id), 9092)
+        if node_id == 1:
+            return KafkaErrors.KafkaConnectionError('Connection reset by peer')
+        return OffsetFetchResponse[1]([(topic, [(p, 10 + p, '', 0) for p in partitions])
+                                       for topic, partitions in request.topics])
+
+    client = FakeClient(respond)
+    check = get_check(client)
+    consumer_groups = {
+        'avengers': {'marvel': [0, 1]},
+        'justice_league': {'dc': [0]},
+        'x_men': {'marvel': [1]},
+    }
+
+    consumer_offsets, topics = check._get_kafka_consumer_offsets_pipelined(
+        {'kafka_connect_str': KAFKA_CONNECT_STR}, consumer_groups)
+
+    # The offsets of justice_league are missing as its coordinator failed, the ones of x_men,
+    # without a coordinator, are fetched from all the brokers
+    assert consumer_offsets == {
+        ('avengers', 'marvel', 0): 10,
+        ('avengers', 'marvel', 1): 11,
+        ('x_men', 'marvel', 1): 11,
+    }
+    assert topics == {'marvel': {0, 1}}
+    fetches = sorted((node_id, request.consumer_group) for node_id, request in client.sent
+                     if not isinstance(request, GroupCoordinatorRequest[0]))
+    assert fetches == [(0, 'avengers'), (0, 'x_men'), (1, 'justice_league'), (1, 'x_men')]
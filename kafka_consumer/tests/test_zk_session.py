@@ -0,0 +1,145 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+from collections import defaultdict
+import posixpath
+
+import mock
+import pytest
+from kazoo.client import KazooState
+from kazoo.exceptions import NoNodeError
+from kazoo.protocol.states import EventType, WatchedEvent
+
+from datadog_checks.kafka_consumer import KafkaCheck
+
+
+class FakeAsyncResult(object):
+
+    def __init__(self, value=None, exception=None):
+        self.value = value
+        self.exception = exception
+
+    def get(self, block=True, timeout=None):
+        if self.exception is not None:
+            raise self.exception
+        return self.value
+
+
+class FakeZookeeper(object):
+    """
+    Stand-in for a Zookeeper ensemble and the KazooClient connected to it, holding
+    the data of the nodes by path and triggering the child watches set on them.
+    """
+
+    def __init__(self, nodes):
+        self.nodes = {}
+        self.watches = defaultdict(set)
+        self.listeners = []
+        self.starts = 0
+        self.stopped = False
+        self.children_reads = []
+        self.data_reads = []
+        for path, data in nodes.iteritems():
+            self.create(path, data)
+
+    def __call__(self, hosts, timeout=None):
+        return self
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def start(self, timeout=None):
+        self.starts += 1
+
+    def stop(self):
+        self.stopped = True
+
+    def close(self):
+        pass
+
+    def get_children_async(self, path, watch=None):
+        self.children_reads.append(path)
+        if path not in self.nodes:
+            return FakeAsyncResult(exception=NoNodeError())
+        if watch is not None:
+            self.watches[path].add(watch)
+        return FakeAsyncResult(sorted(posixpath.basename(p) for p in self.nodes if posixpath.dirname(p) == path))
+
+    def get_async(self, path, watch=None):
+        self.data_reads.append(path)
+        if path not in self.nodes:
+            return FakeAsyncResult(exception=NoNodeError())
+        return FakeAsyncResult((self.nodes[path], None))
+
+    def create(self, path, data=''):
+        parent = posixpath.dirname(path)
+        if parent != '/' and parent not in self.nodes:
+            self.create(parent)
+        self.nodes[path] = data
+        for watch in self.watches.pop(parent, ()):
+            watch(WatchedEvent(EventType.CHILD, KazooState.CONNECTED, parent))
+
+    def expire_session(self):
+        self.watches.clear()
+        for listener in self.listeners:
+            listener(KazooState.LOST)
+
+
+@pytest.fixture
+def zookeeper():
+    zookeeper = FakeZookeeper({
+        '/consumers/group1/offsets/marvel/0': '10',
+        '/consumers/group1/offsets/marvel/1': '20',
+        '/consumers/group2/offsets/dc/0': '30',
+    })
+    with mock.patch('datadog_checks.kafka_consumer.zk.KazooClient', zookeeper):
+        yield zookeeper
+
+
+@pytest.mark.unit
+def test_zk_consumer_offsets(zookeeper):
+    check = KafkaCheck('kafka_consumer', {}, {})
+
+    offsets, consumer_groups = check._get_zk_consumer_offsets('localhost:2181')
+    assert offsets == {
+        ('group1', 'marvel', 0): 10,
+        ('group1', 'marvel', 1): 20,
+        ('group2', 'dc', 0): 30,
+    }
+    assert consumer_groups == {'group1': {'marvel': [0, 1]}, 'group2': {'dc': [0]}}
+
+    offsets, _ = check._get_zk_consumer_offsets('localhost:2181', {'group1': {'marvel': [1, 2]}})
+    assert offsets == {('group1', 'marvel', 1): 20}
+
+
+@pytest.mark.unit
+def test_zk_session_cache(zookeeper):
+    check = KafkaCheck('kafka_consumer', {}, {})
+    check._get_zk_consumer_offsets('localhost:2181')
+    children_reads = len(zookeeper.children_reads)
+    data_reads = len(zookeeper.data_reads)
+
+    # The tree is served from the cache, the offsets are read again
+    zookeeper.nodes['/consumers/group1/offsets/marvel/0'] = '15'
+    offsets, _ = check._get_zk_consumer_offsets('localhost:2181')
+    assert offsets[('group1', 'marvel', 0)] == 15
+    assert len(zookeeper.children_reads) == children_reads
+    assert len(zookeeper.data_reads) == 2 * data_reads
+    assert zookeeper.starts == 1
+
+    # Only the node whose children changed is read again
+    del zookeeper.children_reads[:]
+    zookeeper.create('/consumers/group2/offsets/dc/1', '40')
+    offsets, consumer_groups = check._get_zk_consumer_offsets('localhost:2181')
+    assert zookeeper.children_reads == ['/consumers/group2/offsets/dc']
+    assert offsets[('group2', 'dc', 1)] == 40
+    assert consumer_groups['group2'] == {'dc': [0, 1]}
+
+    # The watches are gone with the session
+    del zookeeper.children_reads[:]
+    zookeeper.expire_session()
+    check._get_zk_consumer_offsets('localhost:2181')
+    assert len(zookeeper.children_reads) == children_reads
+
+    check.stop()
+    assert zookeeper.stopped
@@ -41,23 +41,25 @@ mapreduce.job.reduce.task.progress      The distribution of all reduce task prog
 """
 
 # stdlib
+from itertools import izip
 from urlparse import urljoin
 from urlparse import urlsplit
 from urlparse import urlunsplit
 
 # 3rd party
-import requests
 from requests.exceptions import Timeout, HTTPError, InvalidURL, ConnectionError
 from simplejson import JSONDecodeError
 
 # Project
 from datadog_checks.checks import AgentCheck
 from datadog_checks.config import _is_affirmative
+from datadog_checks.utils.executor import BoundedExecutor
 
 
 class MapReduceCheck(AgentCheck):
     # Default Settings
     DEFAULT_CLUSTER_NAME = 'default_cluster'
+    DEFAULT_MAX_CONCURRENT_REQUESTS = 10
 
     # Service Check Names
     YARN_SERVICE_CHECK = 'mapreduce.resource_manager.can_connect'
@@ -160,15 +162,17 @@ class MapReduceCheck(AgentCheck):
             message='Connection to ResourceManager "{}" was successful'.format(rm_address),
         )
 
+        executor = BoundedExecutor.from_config(instance, self.DEFAULT_MAX_CONCURRENT_REQUESTS, name='mapreduce')
+
         # Get the applications from the application master
-        running_jobs = self._mapreduce_job_metrics(running_apps, auth, ssl_verify, tags)
+        running_jobs = self._mapreduce_job_metrics(running_apps, auth, ssl_verify, tags, executor)
 
         # # Get job counter metrics
-        self._mapreduce_job_counters_metrics(running_jobs, auth, ssl_verify, tags)
+        self._mapreduce_job_counters_metrics(running_jobs, auth, ssl_verify, tags, executor)
 
         # Get task metrics
         if collect_task_metrics:
-            self._mapreduce_task_metrics(running_jobs, auth, ssl_verify, tags)
+            self._mapreduce_task_metrics(running_jobs, auth, ssl_verify, tags, executor)
 
         # Report success after gathering all metrics from Application Master
         if running_jobs:
@@ -182,6 +186,10 @@ class MapReduceCheck(AgentCheck):
                 message='Connection to ApplicationManager "{}" was successful'.format(am_address),
             )
 
+    def get_http_min_pool_size(self, instance):
+        # Keep a connection to the application masters for each of the concurrent requests
+        return int(instance.get('max_concurrent_requests', self.DEFAULT_MAX_CONCURRENT_REQUESTS))
+
     def _parse_general_counters(self, init_config):
         """
         Return a dictionary for each job counter
@@ -305,7 +313,7 @@ class MapReduceCheck(AgentCheck):
 
         return running_apps
 
-    def _mapreduce_job_metrics(self, running_apps, auth, ssl_verify, addl_tags):
+    def _mapreduce_job_metrics(self, running_apps, auth, ssl_verify, addl_tags, executor):
         """
         Get metrics for each MapReduce job.
         Return a dictionary for each MapReduce job
@@ -319,11 +327,13 @@ class MapReduceCheck(AgentCheck):
         """
         running_jobs = {}
 
-        for app_id, (app_name, tracking_url) in running_apps.iteritems():
+        apps = running_apps.values()
+        addresses = [tracking_url for app_name, tracking_url in apps]
+        responses = self._rest_requests_to_json(
+            executor, addresses, auth, ssl_verify, self.MAPREDUCE_JOBS_PATH, self.MAPREDUCE_SERVICE_CHECK
+        )
 
-            metrics_json = self._rest_request_to_json(
-                tracking_url, auth, ssl_verify, self.MAPREDUCE_JOBS_PATH, self.MAPREDUCE_SERVICE_CHECK
-            )
+        for (app_name, tracking_url), metrics_json in izip(apps, responses):
 
             if metrics_json.get('jobs'):
                 if metrics_json['jobs'].get('job'):
@@ -355,75 +365,76 @@ class MapReduceCheck(AgentCheck):
 
         return running_jobs
 
-    def _mapreduce_job_counters_metrics(self, running_jobs, auth, ssl_verify, addl_tags):
+    def _mapreduce_job_counters_metrics(self, running_jobs, auth, ssl_verify, addl_tags, executor):
         """
         Get custom metrics specified for each counter
         """
-        for job_id, job_metrics in running_jobs.iteritems():
+        # Only query the jobs which name exist in the custom metrics
+        jobs = [
+            job_metrics
+            for job_metrics in running_jobs.itervalues()
+            if self.general_counters or (job_metrics['job_name'] in self.job_specific_counters)
+        ]
+        addresses = [job_metrics['tracking_url'] for job_metrics in jobs]
+        responses = self._rest_requests_to_json(
+            executor, addresses, auth, ssl_verify, 'counters', self.MAPREDUCE_SERVICE_CHECK, addl_tags
+        )
+
+        for job_metrics, metrics_json in izip(jobs, responses):
             job_name = job_metrics['job_name']
+            job_specific_metrics = self.job_specific_counters.get(job_name)
+
+            if metrics_json.get('jobCounters'):
+                if metrics_json['jobCounters'].get('counterGroup'):
+
+                    # Cycle through all the counter groups for this job
+                    for counter_group in metrics_json['jobCounters']['counterGroup']:
+                        group_name = counter_group.get('counterGroupName')
+
+                        if group_name:
+                            counter_metrics = set([])
+
+                            # Add any counters in the job specific metrics
+                            if job_specific_metrics and group_name in job_specific_metrics:
+                                counter_metrics = counter_metrics.union(job_specific_metrics[group_name])
+
+                            # Add any counters in the general metrics
+                            if group_name in self.general_counters:
+                                counter_metrics = counter_metrics.union(self.general_counters[group_name])
+
+                            if counter_metrics:
+                                # Cycle through all the counters in this counter group
+                                if counter_group.get('counter'):
+                                    for counter in counter_group['counter']:
+                                        counter_name = counter.get('name')
+
+                                        # Check if the counter name is in the custom metrics for this group name
+                                        if counter_name and counter_name in counter_metrics:
+                                            tags = [
+                                                'app_name:' + job_metrics.get('app_name'),
+                                                'user_name:' + job_metrics.get('user_name'),
+                                                'job_name:' + job_name,
+                                                'counter_name:' + str(counter_name).lower(),
+                                            ]
 
-            # Check if the job_name exist in the custom metrics
-            if self.general_counters or (job_name in self.job_specific_counters):
-                job_specific_metrics = self.job_specific_counters.get(job_name)
-
-                metrics_json = self._rest_request_to_json(
-                    job_metrics['tracking_url'],
-                    auth,
-                    ssl_verify,
-                    'counters',
-                    self.MAPREDUCE_SERVICE_CHECK,
-                    tags=addl_tags,
-                )
-
-                if metrics_json.get('jobCounters'):
-                    if metrics_json['jobCounters'].get('counterGroup'):
-
-                        # Cycle through all the counter groups for this job
-                        for counter_group in metrics_json['jobCounters']['counterGroup']:
-                            group_name = counter_group.get('counterGroupName')
-
-                            if group_name:
-                                counter_metrics = set([])
-
-                                # Add any counters in the job specific metrics
-                                if job_specific_metrics and group_name in job_specific_metrics:
-                                    counter_metrics = counter_metrics.union(job_specific_metrics[group_name])
-
-                                # Add any counters in the general metrics
-                                if group_name in self.general_counters:
-                                    counter_metrics = counter_metrics.union(self.general_counters[group_name])
-
-                                if counter_metrics:
-                                    # Cycle through all the counters in this counter group
-                                    if counter_group.get('counter'):
-                                        for counter in counter_group['counter']:
-                                            counter_name = counter.get('name')
-
-                                            # Check if the counter name is in the custom metrics for this group name
-                                            if counter_name and counter_name in counter_metrics:
-                                                tags = [
-                                                    'app_name:' + job_metrics.get('app_name'),
-                                                    'user_name:' + job_metrics.get('user_name'),
-                                                    'job_name:' + job_name,
-                                                    'counter_name:' + str(counter_name).lower(),
-                                                ]
-
-                                                tags.extend(addl_tags)
-
-                                                self._set_metrics_from_json(
-                                                    counter, self.MAPREDUCE_JOB_COUNTER_METRICS, tags
-                                                )
-
-    def _mapreduce_task_metrics(self, running_jobs, auth, ssl_verify, addl_tags):
+                                            tags.extend(addl_tags)
+
+                                            self._set_metrics_from_json(
+                                                counter, self.MAPREDUCE_JOB_COUNTER_METRICS, tags
+                                            )
+
+    def _mapreduce_task_metrics(self, running_jobs, auth, ssl_verify, addl_tags, executor):
         """
         Get metrics for each MapReduce task
         Return a dictionary of {task_id: 'tracking_url'} for each MapReduce task
         """
-        for job_id, job_stats in running_jobs.iteritems():
+        jobs = running_jobs.values()
+        addresses = [job_stats['tracking_url'] for job_stats in jobs]
+        responses = self._rest_requests_to_json(
+            executor, addresses, auth, ssl_verify, 'tasks', self.MAPREDUCE_SERVICE_CHECK, addl_tags
+        )
 
-            metrics_json = self._rest_request_to_json(
-                job_stats['tracking_url'], auth, ssl_verify, 'tasks', self.MAPREDUCE_SERVICE_CHECK, tags=addl_tags
-            )
+        for job_stats, metrics_json in izip(jobs, responses):
 
             if metrics_json.get('tasks'):
                 if metrics_json['tasks'].get('task'):
@@ -472,11 +483,37 @@ class MapReduceCheck(AgentCheck):
         """
         Query the given URL and return the JSON response
         """
-        response_json = None
-        tags = [] if tags is None else tags
+        url = self._build_url(address, object_path, *args, **kwargs)
 
-        service_check_tags = ['url:{}'.format(self._get_url_base(address))] + tags
+        try:
+            return self._get_json(url, auth, ssl_verify)
+        except Exception as e:
+            self._report_request_error(service_name, address, url, tags, e)
+            raise
+
+    def _rest_requests_to_json(self, executor, addresses, auth, ssl_verify, object_path, service_name, tags=None):
+        """
+        Query the given path of each address concurrently, and return an iterator of the JSON responses
+        in the order of `addresses`.
+        The requests run on the threads of the executor, and only return their response or raise:
+        a failed request is reported from the check thread, when its response is reached, and stops the iteration.
+        """
+        urls = [self._build_url(address, object_path) for address in addresses]
+        responses = executor.map(self._get_json, [(url, auth, ssl_verify) for url in urls])
+
+        for address, url in izip(addresses, urls):
+            try:
+                response_json = next(responses)
+            except Exception as e:
+                self._report_request_error(service_name, address, url, tags, e)
+                raise
+
+            yield response_json
 
+    def _build_url(self, address, object_path, *args, **kwargs):
+        """
+        Return the URL of the object path, directories `args` and query arguments `kwargs` on `address`
+        """
         url = address
 
         if object_path:
@@ -487,50 +524,42 @@ class MapReduceCheck(AgentCheck):
             for directory in args:
                 url = self._join_url_dir(url, directory)
 
-        self.log.debug('Attempting to connect to "{}"'.format(url))
-
         # Add kwargs as arguments
         if kwargs:
             query = '&'.join(['{}={}'.format(key, value) for key, value in kwargs.iteritems()])
             url = urljoin(url, '?' + query)
 
-        try:
-            response = requests.get(url, auth=auth, verify=ssl_verify, timeout=self.default_integration_http_timeout)
-            response.raise_for_status()
-            response_json = response.json()
-
-        except Timeout as e:
-            self.service_check(
-                service_name,
-                AgentCheck.CRITICAL,
-                tags=service_check_tags,
-                message="Request timeout: {}, {}".format(url, e),
-            )
-            raise
+        return url
 
-        except (HTTPError, InvalidURL, ConnectionError) as e:
-            self.service_check(
-                service_name,
-                AgentCheck.CRITICAL,
-                tags=service_check_tags,
-                message="Request failed: {}, {}".format(url, e),
-            )
-            raise
+    def _get_json(self, url, auth, ssl_verify):
+        """
+        Query the given URL and return the JSON response, raise if the request failed.
+        It can run on the threads of an executor, so it doesn't submit anything.
+        """
+        self.log.debug('Attempting to connect to "{}"'.format(url))
 
-        except JSONDecodeError as e:
-            self.service_check(
-                service_name,
-                AgentCheck.CRITICAL,
-                tags=service_check_tags,
-                message="JSON Parse failed: {}, {}".format(url, e),
-            )
-            raise
+        response = self.http.get(url, auth=auth, verify=ssl_verify, timeout=self.default_integration_http_timeout)
+        response.raise_for_status()
+        return response.json()
 
-        except ValueError as e:
-            self.service_check(service_name, AgentCheck.CRITICAL, tags=service_check_tags, message=str(e))
-            raise
+    def _report_request_error(self, service_name, address, url, tags, error):
+        """
+        Report the service check of a request to `address` that failed with `error`
+        """
+        if isinstance(error, Timeout):
+            message = "Request timeout: {}, {}".format(url, error)
+        elif isinstance(error, (HTTPError, InvalidURL, ConnectionError)):
+            message = "Request failed: {}, {}".format(url, error)
+        elif isinstance(error, JSONDecodeError):
+            message = "JSON Parse failed: {}, {}".format(url, error)
+        elif isinstance(error, ValueError):
+            message = str(error)
+        else:
+            return
 
-        return response_json
+        tags = [] if tags is None else tags
+        service_check_tags = ['url:{}'.format(self._get_url_base(address))] + tags
+        self.service_check(service_name, AgentCheck.CRITICAL, tags=service_check_tags, message=message)
 
     def _join_url_dir(self, url, *args):
         """
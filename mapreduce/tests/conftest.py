@@ -25,13 +25,13 @@ def aggregator():
 
 @pytest.fixture
 def mocked_request():
-    with patch("requests.get", new=requests_get_mock):
+    with patch("requests.Session.get", side_effect=requests_get_mock):
         yield
 
 
 @pytest.fixture
 def mocked_auth_request():
-    with patch("requests.get", new=requests_auth_mock):
+    with patch("requests.Session.get", side_effect=requests_auth_mock):
         yield
 
 
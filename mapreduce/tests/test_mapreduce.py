@@ -1,8 +1,17 @@
 # (C) Datadog, Inc. 2018
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+from mock import patch
+from requests.exceptions import HTTPError
 
 from datadog_checks.mapreduce import MapReduceCheck
+from datadog_checks.utils.executor import BoundedExecutor
+from datadog_checks.utils.timeout import TimeoutException
 from .common import (
     INIT_CONFIG,
     MR_CONFIG,
@@ -103,3 +112,94 @@ def test_auth(aggregator, mocked_auth_request):
     aggregator.assert_service_check(
         MapReduceCheck.MAPREDUCE_SERVICE_CHECK, status=MapReduceCheck.OK, tags=service_check_tags, count=1
     )
+
+
+class MockJobsResponse(object):
+    def __init__(self, app_id, status_code=200):
+        self.app_id = app_id
+        self.status_code = status_code
+
+    def json(self):
+        return {'jobs': {'job': [{'id': 'job_' + self.app_id, 'name': 'job', 'user': 'user', 'elapsedTime': 1}]}}
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise HTTPError('{} Server Error'.format(self.status_code))
+
+
+def concurrent_requests_get_mock(delays, failing=()):
+    """
+    Answer the jobs requests of the applications `app_<i>` after `delays[i]` seconds,
+    with an error for the applications of `failing`
+    """
+    def get(url, *args, **kwargs):
+        app_id = url[len(RM_URI + '/proxy/'):].split('/')[0]
+        time.sleep(delays[int(app_id.split('_')[1])])
+        return MockJobsResponse(app_id, 500 if app_id in failing else 200)
+
+    return get
+
+
+def running_apps(count):
+    return OrderedDict(
+        ('app_{}'.format(i), ('app{}'.format(i), '{}/proxy/app_{}'.format(RM_URI, i))) for i in range(count)
+    )
+
+
+def test_concurrent_requests(aggregator):
+    mapreduce = MapReduceCheck("mapreduce", INIT_CONFIG, {})
+    apps = running_apps(4)
+
+    # Responses complete in the reverse order of the requests
+    with patch("requests.Session.get", side_effect=concurrent_requests_get_mock([0.3, 0.2, 0.1, 0])):
+        running_jobs = mapreduce._mapreduce_job_metrics(apps, None, True, CUSTOM_TAGS, BoundedExecutor(4))
+
+    assert sorted(running_jobs) == ['job_app_{}'.format(i) for i in range(4)]
+    # Metrics are submitted in the order of the applications
+    assert [m.tags[0] for m in aggregator.metrics('mapreduce.job.elapsed_time')] == [
+        'app_name:app{}'.format(i) for i in range(4)
+    ]
+
+
+def test_concurrent_request_failure(aggregator):
+    mapreduce = MapReduceCheck("mapreduce", INIT_CONFIG, {})
+    apps = running_apps(4)
+    submitting_threads = set()
+    service_check = mapreduce.service_check
+
+    def record_service_check(*args, **kwargs):
+        submitting_threads.add(threading.current_thread())
+        service_check(*args, **kwargs)
+
+    get = concurrent_requests_get_mock([0.1, 0, 0, 0], failing=('app_1', 'app_2'))
+    with patch("requests.Session.get", side_effect=get), patch.object(mapreduce, 'service_check', record_service_check):
+        with pytest.raises(HTTPError):
+            mapreduce._mapreduce_job_metrics(apps, None, True, CUSTOM_TAGS, BoundedExecutor(4))
+
+    # The metrics of the application before the failing one are submitted,
+    # and only the first failure is reported, from the check thread
+    aggregator.assert_metric('mapreduce.job.elapsed_time', count=1)
+    aggregator.assert_service_check(
+        MapReduceCheck.MAPREDUCE_SERVICE_CHECK,
+        status=MapReduceCheck.CRITICAL,
+        tags=['url:{}'.format(RM_URI)],
+        count=1,
+    )
+    assert len(aggregator.service_checks(MapReduceCheck.MAPREDUCE_SERVICE_CHECK)) == 1
+    assert submitting_threads == {threading.current_thread()}
+
+
+def test_concurrent_requests_timeout(aggregator):
+    mapreduce = MapReduceCheck("mapreduce", INIT_CONFIG, {})
+    apps = running_apps(3)
+
+    get = concurrent_requests_get_mock([0, 0.5, 0], failing=('app_1',))
+    with patch("requests.Session.get", side_effect=get):
+        with pytest.raises(TimeoutException):
+            mapreduce._mapreduce_job_metrics(apps, None, True, CUSTOM_TAGS, BoundedExecutor(3, timeout=0.2))
+
+        # The request still in flight fails after the check run, without submitting anything
+        time.sleep(0.5)
+
+    aggregator.assert_metric('mapreduce.job.elapsed_time', count=1)
+    assert not aggregator.service_checks(MapReduceCheck.MAPREDUCE_SERVICE_CHECK)
@@ -64,7 +64,7 @@ class Marathon(AgentCheck):
                 'uid': auth[0],
                 'password': auth[1]
             }
-            r = requests.post(urljoin(acs_url, "acs/api/v1/auth/login"), json=auth_body, verify=False)
+            r = self.http.post(urljoin(acs_url, "acs/api/v1/auth/login"), json=auth_body, verify=False)
             r.raise_for_status()
             token = r.json()['token']
             self.ACS_TOKEN = token
@@ -93,11 +93,11 @@ class Marathon(AgentCheck):
             del params['auth']
 
         try:
-            r = requests.get(url, **params)
+            r = self.http.get(url, **params)
             # If got unauthorized and using acs auth, refresh the token and try again
             if r.status_code == 401 and acs_url:
                 self.refresh_acs_token(auth, acs_url, tags)
-                r = requests.get(url, **params)
+                r = self.http.get(url, **params)
             r.raise_for_status()
         except requests.exceptions.Timeout:
             # If there's a timeout
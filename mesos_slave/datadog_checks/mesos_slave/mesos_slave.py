@@ -15,6 +15,7 @@ import requests
 # project
 from checks import AgentCheck, CheckException
 from config import _is_affirmative
+from datadog_checks.utils.http import HTTPClient
 
 DEFAULT_MASTER_PORT = 5050
 
@@ -96,6 +97,10 @@ class MesosSlave(AgentCheck):
     def __init__(self, name, init_config, agentConfig, instances=None):
         AgentCheck.__init__(self, name, init_config, agentConfig, instances)
         self.cluster_name = None
+        # HTTP sessions keeping the connections to mesos alive across runs, by instance url
+        self.sessions = {}
+        # Session of the instance being checked
+        self.session = None
         for instance in instances or []:
             url = instance.get('url', '')
             parsed_url = urlparse(url)
@@ -103,12 +108,18 @@ class MesosSlave(AgentCheck):
             if not ssl_verify and parsed_url.scheme == 'https':
                 self.log.warning('Skipping SSL cert validation for %s based on configuration.' % url)
 
+    def _get_session(self, instance):
+        url = instance['url']
+        if url not in self.sessions:
+            self.sessions[url] = HTTPClient.from_config(instance, self.init_config).session
+        return self.sessions[url]
+
     def _get_json(self, url, timeout, verify, tags=None):
         tags = tags + ["url:%s" % url] if tags else ["url:%s" % url]
         msg = None
         status = None
         try:
-            r = requests.get(url, timeout=timeout, verify=verify)
+            r = self.session.get(url, timeout=timeout, verify=verify)
             if r.status_code != 200:
                 status = AgentCheck.CRITICAL
                 msg = "Got %s when hitting %s" % (r.status_code, url)
@@ -171,6 +182,7 @@ class MesosSlave(AgentCheck):
         if 'url' not in instance:
             raise Exception('Mesos instance missing "url" value.')
 
+        self.session = self._get_session(instance)
         url = instance['url']
         instance_tags = instance.get('tags', [])
         if instance_tags is None:
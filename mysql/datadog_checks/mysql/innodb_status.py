@@ -0,0 +1,444 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from collections import defaultdict
+
+# The list of transactions is the bulk of the output on busy servers, it runs from
+# this line to the FILE I/O section
+TRANSACTIONS_LIST_START = 'LIST OF TRANSACTIONS FOR EACH SESSION:'
+TRANSACTIONS_LIST_END = '\nFILE I/O\n'
+
+
+def tokenize(line):
+    return [item.strip(',').strip(';').strip('[').strip(']') for item in line.split()]
+
+
+def are_values_numeric(array):
+    return all([v.isdigit() for v in array])
+
+
+class InnoDBStatusParser(object):
+    """
+    Parses the output of `SHOW ENGINE INNODB STATUS`, heavily inspired by the Percona monitoring plugins work.
+
+    Lines are dispatched on their first word to the handlers of the lines starting with it, lines starting
+    with a number are matched on a substring instead. Only the lines that have a handler are tokenized.
+    The list of transactions is skipped altogether unless `collect_transactions` is set.
+    """
+    def __init__(self, log, collect_transactions=True):
+        self.log = log
+        self.collect_transactions = collect_transactions
+
+    def parse(self, innodb_status_text):
+        """Return the metrics of the InnoDB status, as strings like the values of SHOW GLOBAL STATUS."""
+        if not self.collect_transactions:
+            start = innodb_status_text.find(TRANSACTIONS_LIST_START)
+            end = innodb_status_text.find(TRANSACTIONS_LIST_END, start)
+            if start != -1 and end != -1:
+                innodb_status_text = innodb_status_text[:start] + innodb_status_text[end:]
+
+        self.results = defaultdict(int)
+        self.txn_seen = False
+        # Only return aggregated buffer pool metrics
+        self.buffer_id = -1
+        self.prev_line = ''
+
+        for line in innodb_status_text.splitlines():
+            line = line.strip()
+            if not line:
+                self.prev_line = line
+                continue
+
+            if line[0].isdigit():
+                for substring, handler in self.SUBSTRING_HANDLERS:
+                    if substring in line:
+                        handler(self, line, tokenize(line))
+                        break
+            else:
+                space = line.find(' ')
+                for prefix, handler in self.PREFIX_HANDLERS.get(line[:space] if space > 0 else line, ()):
+                    if line.startswith(prefix):
+                        if handler is not None:
+                            handler(self, line, tokenize(line))
+                        break
+
+            self.prev_line = line
+
+        results = self.results
+
+        # We need to calculate this metric separately
+        try:
+            results['Innodb_checkpoint_age'] = results[
+                'Innodb_lsn_current'] - results['Innodb_lsn_last_checkpoint']
+        except KeyError as e:
+            self.log.error("Not all InnoDB LSN metrics available, unable to compute: {0}".format(e))
+
+        # Finally we change back the metrics values to string to make the values
+        # consistent with how they are reported by SHOW GLOBAL STATUS
+        for metric, value in results.iteritems():
+            results[metric] = str(value)
+
+        return results
+
+    def _buffer_pool(self, line, row):
+        # ---BUFFER POOL 0
+        self.buffer_id = long(row[2])
+
+    # SEMAPHORES
+    def _mutex_spin_waits(self, line, row):
+        # Mutex spin waits 79626940, rounds 157459864, OS waits 698719
+        # Mutex spin waits 0, rounds 247280272495, OS waits 316513438
+        self.results['Innodb_mutex_spin_waits'] = long(row[3])
+        self.results['Innodb_mutex_spin_rounds'] = long(row[5])
+        self.results['Innodb_mutex_os_waits'] = long(row[8])
+
+    def _rw_shared_spins(self, line, row):
+        if line.find(';') > 0:
+            # RW-shared spins 3859028, OS waits 2100750; RW-excl spins
+            # 4641946, OS waits 1530310
+            self.results['Innodb_s_lock_spin_waits'] = long(row[2])
+            self.results['Innodb_x_lock_spin_waits'] = long(row[8])
+            self.results['Innodb_s_lock_os_waits'] = long(row[5])
+            self.results['Innodb_x_lock_os_waits'] = long(row[11])
+        elif line.find('; RW-excl spins') == -1:
+            # Post 5.5.17 SHOW ENGINE INNODB STATUS syntax
+            # RW-shared spins 604733, rounds 8107431, OS waits 241268
+            self.results['Innodb_s_lock_spin_waits'] = long(row[2])
+            self.results['Innodb_s_lock_spin_rounds'] = long(row[4])
+            self.results['Innodb_s_lock_os_waits'] = long(row[7])
+
+    def _rw_excl_spins(self, line, row):
+        # Post 5.5.17 SHOW ENGINE INNODB STATUS syntax
+        # RW-excl spins 604733, rounds 8107431, OS waits 241268
+        self.results['Innodb_x_lock_spin_waits'] = long(row[2])
+        self.results['Innodb_x_lock_spin_rounds'] = long(row[4])
+        self.results['Innodb_x_lock_os_waits'] = long(row[7])
+
+    def _semaphore_wait(self, line, row):
+        # --Thread 907205 has waited at handler/ha_innodb.cc line 7156 for 1.00 seconds the semaphore:
+        if line.find('seconds the semaphore:') > 0:
+            self.results['Innodb_semaphore_waits'] += 1
+            self.results['Innodb_semaphore_wait_time'] += long(float(row[9])) * 1000
+
+    # TRANSACTIONS
+    def _trx_id_counter(self, line, row):
+        # The beginning of the TRANSACTIONS section: start counting
+        # transactions
+        # Trx id counter 0 1170664159
+        # Trx id counter 861B144C
+        self.txn_seen = True
+
+    def _history_list_length(self, line, row):
+        # History list length 132
+        self.results['Innodb_history_list_length'] = long(row[3])
+
+    def _transaction(self, line, row):
+        # ---TRANSACTION 0, not started, process no 13510, OS thread id 1170446656
+        if self.txn_seen:
+            self.results['Innodb_current_transactions'] += 1
+            if line.find('ACTIVE') > 0:
+                self.results['Innodb_active_transactions'] += 1
+
+    def _trx_lock_wait(self, line, row):
+        # ------- TRX HAS BEEN WAITING 32 SEC FOR THIS LOCK TO BE GRANTED:
+        if self.txn_seen:
+            self.results['Innodb_row_lock_time'] += long(row[5]) * 1000
+
+    def _read_views(self, line, row):
+        # 1 read views open inside InnoDB
+        self.results['Innodb_read_views'] = long(row[0])
+
+    def _tables_in_use(self, line, row):
+        # mysql tables in use 2, locked 2
+        self.results['Innodb_tables_in_use'] += long(row[4])
+        self.results['Innodb_locked_tables'] += long(row[6])
+
+    def _lock_structs(self, line, row):
+        # 23 lock struct(s), heap size 3024, undo log entries 27
+        # LOCK WAIT 12 lock struct(s), heap size 3024, undo log entries 5
+        # LOCK WAIT 2 lock struct(s), heap size 368
+        if not self.txn_seen or line.find('lock struct(s)') <= 0:
+            return
+        if line.find('LOCK WAIT') == 0:
+            self.results['Innodb_lock_structs'] += long(row[2])
+            self.results['Innodb_locked_transactions'] += 1
+        elif line.find('ROLLING BACK') == 0:
+            # ROLLING BACK 127539 lock struct(s), heap size 15201832,
+            # 4411492 row lock(s), undo log entries 1042488
+            self.results['Innodb_lock_structs'] += long(row[2])
+        else:
+            self.results['Innodb_lock_structs'] += long(row[0])
+
+    # FILE I/O
+    def _os_file_reads(self, line, row):
+        # 8782182 OS file reads, 15635445 OS file writes, 947800 OS
+        # fsyncs
+        self.results['Innodb_os_file_reads'] = long(row[0])
+        self.results['Innodb_os_file_writes'] = long(row[4])
+        self.results['Innodb_os_file_fsyncs'] = long(row[8])
+
+    def _pending_normal_aio_reads(self, line, row):
+        results = self.results
+        try:
+            if len(row) == 8:
+                # (len(row) == 8)  Pending normal aio reads: 0, aio writes: 0,
+                results['Innodb_pending_normal_aio_reads'] = long(row[4])
+                results['Innodb_pending_normal_aio_writes'] = long(row[7])
+            elif len(row) == 14:
+                # (len(row) == 14) Pending normal aio reads: 0 [0, 0] , aio writes: 0 [0, 0] ,
+                results['Innodb_pending_normal_aio_reads'] = long(row[4])
+                results['Innodb_pending_normal_aio_writes'] = long(row[10])
+            elif len(row) == 16:
+                # (len(row) == 16) Pending normal aio reads: [0, 0, 0, 0] , aio writes: [0, 0, 0, 0] ,
+                if are_values_numeric(row[4:8]) and are_values_numeric(row[11:15]):
+                    results['Innodb_pending_normal_aio_reads'] = (long(row[4]) + long(row[5]) +
+                                                                  long(row[6]) + long(row[7]))
+                    results['Innodb_pending_normal_aio_writes'] = (long(row[11]) + long(row[12]) +
+                                                                   long(row[13]) + long(row[14]))
+
+                # (len(row) == 16) Pending normal aio reads: 0 [0, 0, 0, 0] , aio writes: 0 [0, 0] ,
+                elif are_values_numeric(row[4:9]) and are_values_numeric(row[12:15]):
+                    results['Innodb_pending_normal_aio_reads'] = long(row[4])
+                    results['Innodb_pending_normal_aio_writes'] = long(row[12])
+                else:
+                    self.log.warning("Can't parse result line %s" % line)
+            elif len(row) == 18:
+                # (len(row) == 18) Pending normal aio reads: 0 [0, 0, 0, 0] , aio writes: 0 [0, 0, 0, 0] ,
+                results['Innodb_pending_normal_aio_reads'] = long(row[4])
+                results['Innodb_pending_normal_aio_writes'] = long(row[12])
+            elif len(row) == 22:
+                # (len(row) == 22)
+                # Pending normal aio reads: 0 [0, 0, 0, 0, 0, 0, 0, 0] , aio writes: 0 [0, 0, 0, 0] ,
+                results['Innodb_pending_normal_aio_reads'] = long(row[4])
+                results['Innodb_pending_normal_aio_writes'] = long(row[16])
+        except ValueError as e:
+            self.log.warning("Can't parse result line %s: %s", line, e)
+
+    def _ibuf_aio_reads(self, line, row):
+        #  ibuf aio reads: 0, log i/o's: 0, sync i/o's: 0
+        #  or ibuf aio reads:, log i/o's:, sync i/o's:
+        if len(row) == 10:
+            self.results['Innodb_pending_ibuf_aio_reads'] = long(row[3])
+            self.results['Innodb_pending_aio_log_ios'] = long(row[6])
+            self.results['Innodb_pending_aio_sync_ios'] = long(row[9])
+        elif len(row) == 7:
+            self.results['Innodb_pending_ibuf_aio_reads'] = 0
+            self.results['Innodb_pending_aio_log_ios'] = 0
+            self.results['Innodb_pending_aio_sync_ios'] = 0
+
+    def _pending_flushes(self, line, row):
+        # Pending flushes (fsync) log: 0; buffer pool: 0
+        self.results['Innodb_pending_log_flushes'] = long(row[4])
+        self.results['Innodb_pending_buffer_pool_flushes'] = long(row[7])
+
+    # INSERT BUFFER AND ADAPTIVE HASH INDEX
+    def _ibuf_for_space(self, line, row):
+        # Older InnoDB code seemed to be ready for an ibuf per tablespace.  It
+        # had two lines in the output.  Newer has just one line, see below.
+        # Ibuf for space 0: size 1, free list len 887, seg size 889, is not empty
+        # Ibuf for space 0: size 1, free list len 887, seg size 889,
+        self.results['Innodb_ibuf_size'] = long(row[5])
+        self.results['Innodb_ibuf_free_list'] = long(row[9])
+        self.results['Innodb_ibuf_segment_size'] = long(row[12])
+
+    def _ibuf_size(self, line, row):
+        # Ibuf: size 1, free list len 4634, seg size 4636,
+        self.results['Innodb_ibuf_size'] = long(row[2])
+        self.results['Innodb_ibuf_free_list'] = long(row[6])
+        self.results['Innodb_ibuf_segment_size'] = long(row[9])
+
+        if line.find('merges') > -1:
+            self.results['Innodb_ibuf_merges'] = long(row[10])
+
+    def _merged_operations(self, line, row):
+        # Output of show engine innodb status has changed in 5.5
+        # merged operations:
+        # insert 593983, delete mark 387006, delete 73092
+        if line.find(', delete mark ') > 0 and self.prev_line.find('merged operations:') == 0:
+            results = self.results
+            results['Innodb_ibuf_merged_inserts'] = long(row[1])
+            results['Innodb_ibuf_merged_delete_marks'] = long(row[4])
+            results['Innodb_ibuf_merged_deletes'] = long(row[6])
+            results['Innodb_ibuf_merged'] = results['Innodb_ibuf_merged_inserts'] + results[
+                'Innodb_ibuf_merged_delete_marks'] + results['Innodb_ibuf_merged_deletes']
+
+    def _merged_recs(self, line, row):
+        # 19817685 inserts, 19817684 merged recs, 3552620 merges
+        self.results['Innodb_ibuf_merged_inserts'] = long(row[0])
+        self.results['Innodb_ibuf_merged'] = long(row[2])
+        self.results['Innodb_ibuf_merges'] = long(row[5])
+
+    def _hash_table_size(self, line, row):
+        # In some versions of InnoDB, the used cells is omitted.
+        # Hash table size 4425293, used cells 4229064, ....
+        # Hash table size 57374437, node heap has 72964 buffer(s) <--
+        # no used cells
+        self.results['Innodb_hash_index_cells_total'] = long(row[3])
+        self.results['Innodb_hash_index_cells_used'] = long(row[6]) if line.find('used cells') > 0 else 0
+
+    # LOG
+    def _log_ios_done(self, line, row):
+        # 3430041 log i/o's done, 17.44 log i/o's/second
+        # 520835887 log i/o's done, 17.28 log i/o's/second, 518724686
+        # syncs, 2980893 checkpoints
+        self.results['Innodb_log_writes'] = long(row[0])
+
+    def _pending_log_writes(self, line, row):
+        # 0 pending log writes, 0 pending chkp writes
+        self.results['Innodb_pending_log_writes'] = long(row[0])
+        self.results['Innodb_pending_checkpoint_writes'] = long(row[4])
+
+    def _log_sequence_number(self, line, row):
+        # This number is NOT printed in hex in InnoDB plugin.
+        # Log sequence number 272588624
+        self.results['Innodb_lsn_current'] = long(row[3])
+
+    def _log_flushed_up_to(self, line, row):
+        # This number is NOT printed in hex in InnoDB plugin.
+        # Log flushed up to   272588624
+        self.results['Innodb_lsn_flushed'] = long(row[4])
+
+    def _last_checkpoint_at(self, line, row):
+        # Last checkpoint at  272588624
+        self.results['Innodb_lsn_last_checkpoint'] = long(row[3])
+
+    # BUFFER POOL AND MEMORY
+    def _total_memory_allocated(self, line, row):
+        # Total memory allocated 29642194944; in additional pool allocated 0
+        # Total memory allocated by read views 96
+        if line.find("in additional pool allocated") > 0:
+            self.results['Innodb_mem_total'] = long(row[3])
+            self.results['Innodb_mem_additional_pool'] = long(row[8])
+
+    def _adaptive_hash_index(self, line, row):
+        #   Adaptive hash index 1538240664     (186998824 + 1351241840)
+        self.results['Innodb_mem_adaptive_hash'] = long(row[3])
+
+    def _page_hash(self, line, row):
+        #   Page hash           11688584
+        self.results['Innodb_mem_page_hash'] = long(row[2])
+
+    def _dictionary_cache(self, line, row):
+        #   Dictionary cache    145525560      (140250984 + 5274576)
+        self.results['Innodb_mem_dictionary'] = long(row[2])
+
+    def _file_system(self, line, row):
+        #   File system         313848         (82672 + 231176)
+        self.results['Innodb_mem_file_system'] = long(row[2])
+
+    def _lock_system(self, line, row):
+        #   Lock system         29232616       (29219368 + 13248)
+        self.results['Innodb_mem_lock_system'] = long(row[2])
+
+    def _recovery_system(self, line, row):
+        #   Recovery system     0      (0 + 0)
+        self.results['Innodb_mem_recovery_system'] = long(row[2])
+
+    def _threads(self, line, row):
+        #   Threads             409336         (406936 + 2400)
+        self.results['Innodb_mem_thread_hash'] = long(row[1])
+
+    def _buffer_pool_size(self, line, row):
+        # The " " after size is necessary to avoid matching the wrong line:
+        # Buffer pool size        1769471
+        # Buffer pool size, bytes 28991012864
+        if self.buffer_id == -1:
+            self.results['Innodb_buffer_pool_pages_total'] = long(row[3])
+
+    def _free_buffers(self, line, row):
+        # Free buffers            0
+        if self.buffer_id == -1:
+            self.results['Innodb_buffer_pool_pages_free'] = long(row[2])
+
+    def _database_pages(self, line, row):
+        # Database pages          1696503
+        if self.buffer_id == -1:
+            self.results['Innodb_buffer_pool_pages_data'] = long(row[2])
+
+    def _modified_db_pages(self, line, row):
+        # Modified db pages       160602
+        if self.buffer_id == -1:
+            self.results['Innodb_buffer_pool_pages_dirty'] = long(row[3])
+
+    def _pages_read(self, line, row):
+        # Pages read 15240822, created 1770238, written 21705836
+        if self.buffer_id == -1:
+            self.results['Innodb_pages_read'] = long(row[2])
+            self.results['Innodb_pages_created'] = long(row[4])
+            self.results['Innodb_pages_written'] = long(row[6])
+
+    # ROW OPERATIONS
+    def _rows_inserted(self, line, row):
+        # Number of rows inserted 50678311, updated 66425915, deleted
+        # 20605903, read 454561562
+        self.results['Innodb_rows_inserted'] = long(row[4])
+        self.results['Innodb_rows_updated'] = long(row[6])
+        self.results['Innodb_rows_deleted'] = long(row[8])
+        self.results['Innodb_rows_read'] = long(row[10])
+
+    def _queries_inside(self, line, row):
+        # 0 queries inside InnoDB, 0 queries in queue
+        self.results['Innodb_queries_inside'] = long(row[0])
+        self.results['Innodb_queries_queued'] = long(row[4])
+
+    # First word of a line -> (prefix of the line, handler) pairs, in the order they are tried.
+    # A None handler marks lines that must not be matched by a shorter prefix.
+    PREFIX_HANDLERS = {
+        '---BUFFER': (('---BUFFER POOL', _buffer_pool),),
+        'Mutex': (('Mutex spin waits', _mutex_spin_waits),),
+        'RW-shared': (('RW-shared spins', _rw_shared_spins),),
+        'RW-excl': (('RW-excl spins', _rw_excl_spins),),
+        '--Thread': (('--Thread', _semaphore_wait),),
+        'Trx': (('Trx id counter', _trx_id_counter),),
+        'History': (('History list length', _history_list_length),),
+        '---TRANSACTION': (('---TRANSACTION', _transaction),),
+        '-------': (('------- TRX HAS BEEN', _trx_lock_wait),),
+        'mysql': (('mysql tables in use', _tables_in_use),),
+        'LOCK': (('LOCK WAIT', _lock_structs),),
+        'ROLLING': (('ROLLING BACK', _lock_structs),),
+        'Pending': (
+            ('Pending normal aio reads:', _pending_normal_aio_reads),
+            ('Pending flushes (fsync)', _pending_flushes),
+        ),
+        'ibuf': (('ibuf aio reads', _ibuf_aio_reads),),
+        'Ibuf': (('Ibuf for space 0: size ', _ibuf_for_space),),
+        'Ibuf:': (('Ibuf: size ', _ibuf_size),),
+        'insert': (('insert', _merged_operations),),
+        'Hash': (('Hash table size ', _hash_table_size),),
+        'Log': (
+            ('Log sequence number', _log_sequence_number),
+            ('Log flushed up to', _log_flushed_up_to),
+        ),
+        'Last': (('Last checkpoint at', _last_checkpoint_at),),
+        'Total': (('Total memory allocated', _total_memory_allocated),),
+        'Adaptive': (('Adaptive hash index ', _adaptive_hash_index),),
+        'Page': (('Page hash           ', _page_hash),),
+        'Dictionary': (('Dictionary cache    ', _dictionary_cache),),
+        'File': (('File system         ', _file_system),),
+        'Lock': (('Lock system         ', _lock_system),),
+        'Recovery': (('Recovery system     ', _recovery_system),),
+        'Threads': (('Threads             ', _threads),),
+        'Buffer': (('Buffer pool size ', _buffer_pool_size),),
+        'Free': (('Free buffers', _free_buffers),),
+        'Database': (('Database pages', _database_pages),),
+        'Modified': (('Modified db pages', _modified_db_pages),),
+        'Pages': (
+            # Must be tried BEFORE the next prefix, otherwise it'll get fooled by this
+            # line from the new plugin:
+            # Pages read ahead 0.00/s, evicted without access 0.06/s
+            ('Pages read ahead', None),
+            ('Pages read', _pages_read),
+        ),
+        'Number': (('Number of rows inserted', _rows_inserted),),
+    }
+
+    # Substring of a line starting with a number -> handler, in the order they are tried
+    SUBSTRING_HANDLERS = (
+        ('read views open inside InnoDB', _read_views),
+        ('lock struct(s)', _lock_structs),
+        (' OS file reads, ', _os_file_reads),
+        (' merged recs, ', _merged_recs),
+        (" log i/o's done, ", _log_ios_done),
+        (" pending log writes, ", _pending_log_writes),
+        (" queries inside InnoDB, ", _queries_inside),
+    )
@@ -9,6 +9,7 @@ from datadog_checks.utils.common import get_docker_hostname
 HERE = os.path.dirname(os.path.abspath(__file__))
 ROOT = os.path.dirname(os.path.dirname(HERE))
 TESTS_HELPER_DIR = os.path.join(ROOT, 'datadog_checks_tests_helper')
+FIXTURES_DIR = os.path.join(HERE, 'fixtures')
 
 CHECK_NAME = 'mysql'
 
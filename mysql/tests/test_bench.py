@@ -0,0 +1,34 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import logging
+import os
+
+import pytest
+from datadog_checks.mysql.innodb_status import InnoDBStatusParser, TRANSACTIONS_LIST_START
+
+from . import common
+
+log = logging.getLogger('test_mysql')
+
+# Sessions of the list of transactions, as on a busy server
+SESSIONS_COUNT = 2000
+
+
+@pytest.fixture(scope='module')
+def busy_innodb_status():
+    """The MySQL 5.7 status, with its list of transactions repeated `SESSIONS_COUNT` times."""
+    with open(os.path.join(common.FIXTURES_DIR, 'innodb_status_mysql57.txt')) as f:
+        innodb_status_text = f.read()
+
+    head, tail = innodb_status_text.split(TRANSACTIONS_LIST_START)
+    transactions, tail = tail.split('--------\nFILE I/O\n')
+    return '{}{}{}--------\nFILE I/O\n{}'.format(head, TRANSACTIONS_LIST_START, transactions * SESSIONS_COUNT, tail)
+
+
+def test_parse_innodb_status(benchmark, busy_innodb_status):
+    benchmark(InnoDBStatusParser(log).parse, busy_innodb_status)
+
+
+def test_parse_innodb_status_without_transactions(benchmark, busy_innodb_status):
+    benchmark(InnoDBStatusParser(log, collect_transactions=False).parse, busy_innodb_status)
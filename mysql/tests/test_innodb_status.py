@@ -0,0 +1,102 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import logging
+import os
+
+import pytest
+from datadog_checks.mysql.innodb_status import InnoDBStatusParser
+
+from . import common
+
+log = logging.getLogger('test_mysql')
+
+TRANSACTIONS_METRICS = [
+    'Innodb_active_transactions',
+    'Innodb_current_transactions',
+    'Innodb_lock_structs',
+    'Innodb_locked_tables',
+    'Innodb_locked_transactions',
+    'Innodb_row_lock_time',
+    'Innodb_tables_in_use',
+]
+
+
+def read_fixture(name):
+    with open(os.path.join(common.FIXTURES_DIR, name)) as f:
+        return f.read()
+
+
+@pytest.mark.unit
+def test_parse_mysql55():
+    results = InnoDBStatusParser(log).parse(read_fixture('innodb_status_mysql55.txt'))
+
+    assert results['Innodb_mutex_spin_waits'] == '79626940'
+    assert results['Innodb_mutex_os_waits'] == '698719'
+    assert results['Innodb_s_lock_spin_rounds'] == '114958'
+    assert results['Innodb_x_lock_os_waits'] == '1530310'
+    assert results['Innodb_semaphore_waits'] == '1'
+    assert results['Innodb_semaphore_wait_time'] == '1000'
+    assert results['Innodb_history_list_length'] == '537'
+    assert results['Innodb_current_transactions'] == '3'
+    assert results['Innodb_active_transactions'] == '2'
+    assert results['Innodb_lock_structs'] == '13'
+    assert results['Innodb_locked_transactions'] == '1'
+    assert results['Innodb_row_lock_time'] == '4000'
+    assert results['Innodb_locked_tables'] == '2'
+    assert results['Innodb_pending_normal_aio_reads'] == '0'
+    assert results['Innodb_pending_ibuf_aio_reads'] == '0'
+    assert results['Innodb_os_file_reads'] == '8782182'
+    assert results['Innodb_ibuf_merges'] == '3552620'
+    assert results['Innodb_ibuf_merged'] == '1054081'
+    assert results['Innodb_hash_index_cells_total'] == '4425293'
+    assert results['Innodb_log_writes'] == '3430041'
+    assert results['Innodb_pending_log_writes'] == '0'
+    assert results['Innodb_checkpoint_age'] == '624'
+    assert results['Innodb_mem_total'] == '29642194944'
+    assert results['Innodb_buffer_pool_pages_total'] == '1769471'
+    assert results['Innodb_buffer_pool_pages_dirty'] == '160602'
+    assert results['Innodb_pages_written'] == '21705836'
+    assert results['Innodb_read_views'] == '1'
+    assert results['Innodb_rows_read'] == '454561562'
+
+
+@pytest.mark.unit
+def test_parse_mysql57():
+    results = InnoDBStatusParser(log).parse(read_fixture('innodb_status_mysql57.txt'))
+
+    assert results['Innodb_s_lock_spin_rounds'] == '139566'
+    assert results['Innodb_x_lock_spin_rounds'] == '1066012'
+    assert results['Innodb_history_list_length'] == '1284'
+    assert results['Innodb_current_transactions'] == '4'
+    assert results['Innodb_active_transactions'] == '2'
+    assert results['Innodb_lock_structs'] == '4'
+    assert results['Innodb_row_lock_time'] == '3000'
+    assert results['Innodb_os_file_fsyncs'] == '12938283'
+    assert results['Innodb_ibuf_free_list'] == '2387'
+    assert results['Innodb_ibuf_merged_delete_marks'] == '224851'
+    assert results['Innodb_hash_index_cells_used'] == '0'
+    assert results['Innodb_lsn_flushed'] == '473294771321'
+    assert results['Innodb_checkpoint_age'] == '56201'
+    # Only the aggregated buffer pool metrics are reported
+    assert results['Innodb_buffer_pool_pages_total'] == '524256'
+    assert results['Innodb_buffer_pool_pages_free'] == '8192'
+    assert results['Innodb_buffer_pool_pages_data'] == '507309'
+    assert results['Innodb_pages_read'] == '1038591'
+    assert results['Innodb_queries_inside'] == '0'
+    assert results['Innodb_rows_inserted'] == '84828373'
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('fixture', ['innodb_status_mysql55.txt', 'innodb_status_mysql57.txt'])
+def test_skip_transactions(fixture):
+    innodb_status_text = read_fixture(fixture)
+    results = InnoDBStatusParser(log).parse(innodb_status_text)
+    without_transactions = InnoDBStatusParser(log, collect_transactions=False).parse(innodb_status_text)
+
+    for metric in TRANSACTIONS_METRICS:
+        assert metric in results
+        assert metric not in without_transactions
+        del results[metric]
+
+    assert without_transactions == results
@@ -19,6 +19,8 @@ from datadog_checks.utils.subprocess_output import (
 )
 import psutil
 
+from . import procfs
+
 BSD_TCP_METRICS = [
     (re.compile(
         "^\s*(\d+) data packets \(\d+ bytes\) retransmitted\s*$"
@@ -43,6 +45,29 @@ SOLARIS_TCP_METRICS = [
     ), 'system.net.tcp.out_segs')
 ]
 
+# TCP states of the `st` column of /proc/net/tcp and /proc/net/tcp6, by their `ss` name
+# https://github.com/torvalds/linux/blob/v4.15/include/net/tcp_states.h
+PROCFS_TCP_STATES = {
+    '01': 'ESTAB',
+    '02': 'SYN-SENT',
+    '03': 'SYN-RECV',
+    '04': 'FIN-WAIT-1',
+    '05': 'FIN-WAIT-2',
+    '06': 'TIME-WAIT',
+    '07': 'UNCONN',
+    '08': 'CLOSE-WAIT',
+    '09': 'LAST-ACK',
+    '0A': 'LISTEN',
+    '0B': 'CLOSING',
+}
+
+# Offset of the `st` column from the `:` ending the `sl` column of the /proc/net/{tcp,udp}{,6} lines,
+# whose addresses are fixed width hex: `   0: 0100007F:0019 00000000:0000 0A ...`
+PROCFS_STATE_OFFSET = {
+    '4': len(': 0100007F:0019 00000000:0000 '),
+    '6': len(': 00000000000000000000000001000000:0019 00000000000000000000000000000000:0000 '),
+}
+
 
 class Network(AgentCheck):
 
@@ -62,8 +87,6 @@ class Network(AgentCheck):
         AgentCheck.__init__(
             self, name, init_config,
             agentConfig, instances=instances)
-        if instances is not None and len(instances) > 1:
-            raise Exception("Network check only supports one configured instance.")
 
     def check(self, instance):
         if instance is None:
@@ -72,6 +95,8 @@ class Network(AgentCheck):
         self._excluded_ifaces = instance.get('excluded_interfaces', [])
         self._collect_cx_state = instance.get(
             'collect_connection_state', False)
+        self._collect_cx_state_from_procfs = instance.get(
+            'collect_connection_state_from_procfs', False)
         self._collect_rate_metrics = instance.get(
             'collect_rate_metrics', True)
         self._collect_count_metrics = instance.get(
@@ -232,6 +257,11 @@ class Network(AgentCheck):
                 }
             }
 
+        # Sockets read from procfs are counted in the same states as the ones listed by `ss`
+        self.tcp_states["procfs"] = {
+            st: self.tcp_states["ss"][state] for st, state in PROCFS_TCP_STATES.iteritems()
+        }
+
     def _submit_netmetric(self, metric, value, tags=None):
         if self._collect_rate_metrics:
             self.rate(metric, value, tags=tags)
@@ -279,14 +309,14 @@ class Network(AgentCheck):
         """
         Determine if collect_connection_state is set and can effectively run.
         If self._collect_cx_state is True and a custom proc_location is provided, the system cannot
-         run `ss` or `netstat` over a custom proc_location
+         run `ss` or `netstat` over a custom proc_location, connection states can only be read from it
         :param proc_location: str
         :return: bool
         """
         if self._collect_cx_state is False:
             return False
 
-        if proc_location != "/proc":
+        if proc_location != "/proc" and not self._collect_cx_state_from_procfs:
             self.warning("Cannot collect connection state: currently with a custom /proc path: %s" % proc_location)
             return False
 
@@ -296,7 +326,8 @@ class Network(AgentCheck):
         """
         _check_linux can be run inside a container and still collects the network metrics from the host
         For that procfs_path can be set to something like "/host/proc"
-        When a custom procfs_path is set, the collect_connection_state option is ignored
+        When a custom procfs_path is set, the collect_connection_state option is ignored,
+        unless collect_connection_state_from_procfs is set
         """
         proc_location = self.agentConfig.get('procfs_path', '/proc').rstrip('/')
         custom_tags = instance.get('tags', [])
@@ -304,7 +335,14 @@ class Network(AgentCheck):
         if Platform.is_containerized() and proc_location != "/proc":
             proc_location = "%s/1" % proc_location
 
-        if self._is_collect_cx_state_runnable(proc_location):
+        collect_cx_state = self._is_collect_cx_state_runnable(proc_location)
+        if collect_cx_state and self._collect_cx_state_from_procfs:
+            self.log.debug("Reading %s/net to collect connection state", proc_location)
+            metrics = self._parse_procfs_cx_state(proc_location)
+            for metric in self.cx_state_gauge.itervalues():
+                self.gauge(metric, metrics.get(metric), tags=custom_tags)
+
+        elif collect_cx_state:
             try:
                 self.log.debug("Using `ss` to collect connection state")
                 # Try using `ss` for increased performance over `netstat`
@@ -353,81 +391,18 @@ class Network(AgentCheck):
             except SubprocessOutputEmptyError:
                 self.log.exception("Error collecting connection stats.")
 
-        proc_dev_path = "{}/net/dev".format(proc_location)
-        with open(proc_dev_path, 'r') as proc:
-            lines = proc.readlines()
-        # Inter-|   Receive                                                 |  Transmit
-        #  face |bytes     packets errs drop fifo frame compressed multicast|bytes       packets errs drop fifo colls carrier compressed # noqa: E501
-        #     lo:45890956   112797   0    0    0     0          0         0    45890956   112797    0    0    0     0       0          0 # noqa: E501
-        #   eth0:631947052 1042233   0   19    0   184          0      1206  1208625538  1320529    0    0    0     0       0          0 # noqa: E501
-        #   eth1:       0        0   0    0    0     0          0         0           0        0    0    0    0     0       0          0 # noqa: E501
-        for l in lines[2:]:
-            cols = l.split(':', 1)
-            x = cols[1].split()
+        # The /proc/net counters are read once per run and shared by all the instances
+        snapshot = procfs.get_reader(proc_location).get_snapshot()
+        for path in snapshot.unreadable:
+            self.log.debug("Unable to read %s.", path)
+
+        for iface, metrics in snapshot.devices:
             # Filter inactive interfaces
-            if self._parse_value(x[0]) or self._parse_value(x[8]):
-                iface = cols[0].strip()
-                metrics = {
-                    'bytes_rcvd': self._parse_value(x[0]),
-                    'bytes_sent': self._parse_value(x[8]),
-                    'packets_in.count': self._parse_value(x[1]),
-                    'packets_in.error': self._parse_value(x[2]) + self._parse_value(x[3]),
-                    'packets_out.count': self._parse_value(x[9]),
-                    'packets_out.error': self._parse_value(x[10]) + self._parse_value(x[11]),
-                }
+            if metrics['bytes_rcvd'] or metrics['bytes_sent']:
                 self._submit_devicemetrics(iface, metrics, custom_tags)
 
-        netstat_data = {}
-        for f in ['netstat', 'snmp']:
-            proc_data_path = "{}/net/{}".format(proc_location, f)
-            try:
-                with open(proc_data_path, 'r') as netstat:
-                    while True:
-                        n_header = netstat.readline()
-                        if not n_header:
-                            break  # No more? Abort!
-                        n_data = netstat.readline()
-
-                        h_parts = n_header.strip().split(' ')
-                        h_values = n_data.strip().split(' ')
-                        ns_category = h_parts[0][:-1]
-                        netstat_data[ns_category] = {}
-                        # Turn the data into a dictionary
-                        for idx, hpart in enumerate(h_parts[1:]):
-                            netstat_data[ns_category][hpart] = h_values[idx + 1]
-            except IOError:
-                # On Openshift, /proc/net/snmp is only readable by root
-                self.log.debug("Unable to read %s.", proc_data_path)
-
-        nstat_metrics_names = {
-            'Tcp': {
-                'RetransSegs': 'system.net.tcp.retrans_segs',
-                'InSegs': 'system.net.tcp.in_segs',
-                'OutSegs': 'system.net.tcp.out_segs',
-            },
-            'TcpExt': {
-                'ListenOverflows': 'system.net.tcp.listen_overflows',
-                'ListenDrops': 'system.net.tcp.listen_drops',
-                'TCPBacklogDrop': 'system.net.tcp.backlog_drops',
-                'TCPRetransFail': 'system.net.tcp.failed_retransmits',
-            },
-            'Udp': {
-                'InDatagrams': 'system.net.udp.in_datagrams',
-                'NoPorts': 'system.net.udp.no_ports',
-                'InErrors': 'system.net.udp.in_errors',
-                'OutDatagrams': 'system.net.udp.out_datagrams',
-                'RcvbufErrors': 'system.net.udp.rcv_buf_errors',
-                'SndbufErrors': 'system.net.udp.snd_buf_errors',
-                'InCsumErrors': 'system.net.udp.in_csum_errors'
-            }
-        }
-
-        # Skip the first line, as it's junk
-        for k in nstat_metrics_names:
-            for met in nstat_metrics_names[k]:
-                if met in netstat_data.get(k, {}):
-                    self._submit_netmetric(nstat_metrics_names[k][met], self._parse_value(netstat_data[k][met]),
-                                           tags=custom_tags)
+        for metric, value in snapshot.counters.iteritems():
+            self._submit_netmetric(metric, value, tags=custom_tags)
 
     def _parse_linux_cx_state(self, lines, tcp_states, state_col, protocol=None, ip_version=None):
         """
@@ -449,6 +424,49 @@ class Network(AgentCheck):
 
         return metrics
 
+    def _parse_procfs_cx_state(self, proc_location):
+        """
+        Count the sockets of /proc/net/{tcp,tcp6,udp,udp6} by state, in the states `ss` would report them in,
+        without forking `ss` or `netstat` which is expensive on hosts with many sockets.
+        Returns a dict metric_name -> value
+        """
+        metrics = dict.fromkeys(self.cx_state_gauge.values(), 0)
+        tcp_states = self.tcp_states['procfs']
+        for ip_version in ['4', '6']:
+            for protocol in ['tcp', 'udp']:
+                proc_net_path = "{}/net/{}{}".format(proc_location, protocol, '6' if ip_version == '6' else '')
+                try:
+                    counts = self._count_procfs_states(proc_net_path, PROCFS_STATE_OFFSET[ip_version])
+                except IOError:
+                    # IPv6 can be disabled
+                    self.log.debug("Unable to read %s.", proc_net_path)
+                    continue
+
+                if protocol == 'tcp':
+                    for st, count in counts.iteritems():
+                        if st in tcp_states:
+                            metrics[self.cx_state_gauge['tcp' + ip_version, tcp_states[st]]] += count
+                else:
+                    metrics[self.cx_state_gauge['udp' + ip_version, 'connections']] += sum(counts.itervalues())
+
+        return metrics
+
+    def _count_procfs_states(self, proc_net_path, state_offset):
+        """
+        Count the lines of a /proc/net/{tcp,udp}{,6} file by the hex value of their `st` column,
+        in a single pass over the file, slicing the state at its fixed offset from the `sl` column.
+        """
+        counts = {}
+        with open(proc_net_path, 'r') as f:
+            # Skip the header
+            next(f, None)
+            for line in f:
+                start = line.find(':') + state_offset
+                st = line[start:start + 2]
+                counts[st] = counts.get(st, 0) + 1
+
+        return counts
+
     def _check_bsd(self, instance):
         netstat_flags = ['-i', '-b']
 
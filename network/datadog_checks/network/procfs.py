@@ -0,0 +1,191 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+"""
+Snapshots of the /proc/net counters, shared by the instances of the network check.
+"""
+import codecs
+import io
+from itertools import islice, izip
+import threading
+import time
+
+# Snapshots are shared by the instances running within the same check run,
+# this must stay below the collection interval
+SNAPSHOT_MAX_AGE = 1
+
+DEFAULT_BUFFER_SIZE = 16384
+
+# Counters of /proc/net/netstat and /proc/net/snmp, by category
+NSTAT_METRICS_NAMES = {
+    'Tcp': {
+        'RetransSegs': 'system.net.tcp.retrans_segs',
+        'InSegs': 'system.net.tcp.in_segs',
+        'OutSegs': 'system.net.tcp.out_segs',
+    },
+    'TcpExt': {
+        'ListenOverflows': 'system.net.tcp.listen_overflows',
+        'ListenDrops': 'system.net.tcp.listen_drops',
+        'TCPBacklogDrop': 'system.net.tcp.backlog_drops',
+        'TCPRetransFail': 'system.net.tcp.failed_retransmits',
+    },
+    'Udp': {
+        'InDatagrams': 'system.net.udp.in_datagrams',
+        'NoPorts': 'system.net.udp.no_ports',
+        'InErrors': 'system.net.udp.in_errors',
+        'OutDatagrams': 'system.net.udp.out_datagrams',
+        'RcvbufErrors': 'system.net.udp.rcv_buf_errors',
+        'SndbufErrors': 'system.net.udp.snd_buf_errors',
+        'InCsumErrors': 'system.net.udp.in_csum_errors'
+    }
+}
+
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+def get_reader(proc_location):
+    """Return the reader of the /proc/net files of `proc_location`, shared by all the instances."""
+    with _readers_lock:
+        reader = _readers.get(proc_location)
+        if reader is None:
+            reader = _readers[proc_location] = ProcNetReader(proc_location)
+        return reader
+
+
+def iter_lines(content):
+    """Yield the lines of `content` one at a time, without building the list of all of them."""
+    start = 0
+    end = content.find('\n')
+    while end != -1:
+        yield content[start:end]
+        start = end + 1
+        end = content.find('\n', start)
+    if start < len(content):
+        yield content[start:]
+
+
+def parse_value(v):
+    try:
+        return long(v)
+    except ValueError:
+        return 0
+
+
+class ProcNetSnapshot(object):
+    """
+    Counters read from /proc/net at `timestamp`:
+    - `devices`: list of (interface, metrics) tuples of /proc/net/dev
+    - `counters`: values of the `NSTAT_METRICS_NAMES` counters, by metric name
+    - `unreadable`: paths of the files that couldn't be read
+    """
+    def __init__(self, devices, counters, unreadable, timestamp):
+        self.devices = devices
+        self.counters = counters
+        self.unreadable = unreadable
+        self.timestamp = timestamp
+
+
+class ProcNetReader(object):
+    """
+    Reads /proc/net/dev, /proc/net/netstat and /proc/net/snmp into a buffer reused across runs,
+    and extracts only the counters the check submits.
+
+    The columns of the netstat and snmp counters are looked up once per header line, the values lines
+    are then only split to pick the values at these indexes.
+    """
+    def __init__(self, proc_location, counters=NSTAT_METRICS_NAMES):
+        self.proc_location = proc_location
+        self.counters = counters
+        self._buffer = bytearray(DEFAULT_BUFFER_SIZE)
+        # header line -> list of (column index, metric name)
+        self._columns = {}
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def get_snapshot(self, max_age=SNAPSHOT_MAX_AGE):
+        """
+        Return the latest snapshot if it was taken less than `max_age` seconds ago, a new one otherwise.
+        Raise IOError if /proc/net/dev can't be read.
+        """
+        with self._lock:
+            if self._snapshot is None or time.time() - self._snapshot.timestamp > max_age:
+                self._snapshot = self._read_snapshot()
+            return self._snapshot
+
+    def _read_snapshot(self):
+        timestamp = time.time()
+        devices = self._parse_dev(self._read('dev'))
+
+        counters = {}
+        unreadable = []
+        for f in ['netstat', 'snmp']:
+            try:
+                content = self._read(f)
+            except IOError:
+                # On Openshift, /proc/net/snmp is only readable by root
+                unreadable.append(self._path(f))
+            else:
+                counters.update(self._parse_counters(content))
+
+        return ProcNetSnapshot(devices, counters, unreadable, timestamp)
+
+    def _path(self, filename):
+        return "{}/net/{}".format(self.proc_location, filename)
+
+    def _read(self, filename):
+        size = 0
+        with io.FileIO(self._path(filename), 'r') as f:
+            while True:
+                if size == len(self._buffer):
+                    self._buffer.extend(bytearray(len(self._buffer)))
+                view = memoryview(self._buffer)[size:]
+                read = f.readinto(view)
+                # Release the view before the buffer can be resized
+                del view
+                if not read:
+                    break
+                size += read
+
+        # Decode straight from the buffer, without copying its content first
+        return codecs.decode(memoryview(self._buffer)[:size], 'ascii')
+
+    def _parse_dev(self, content):
+        # Inter-|   Receive                                                 |  Transmit
+        #  face |bytes     packets errs drop fifo frame compressed multicast|bytes       packets errs drop fifo colls carrier compressed # noqa: E501
+        #     lo:45890956   112797   0    0    0     0          0         0    45890956   112797    0    0    0     0       0          0 # noqa: E501
+        #   eth0:631947052 1042233   0   19    0   184          0      1206  1208625538  1320529    0    0    0     0       0          0 # noqa: E501
+        devices = []
+        for line in islice(iter_lines(content), 2, None):
+            iface, _, values = line.partition(':')
+            x = values.split()
+            devices.append((iface.strip(), {
+                'bytes_rcvd': parse_value(x[0]),
+                'bytes_sent': parse_value(x[8]),
+                'packets_in.count': parse_value(x[1]),
+                'packets_in.error': parse_value(x[2]) + parse_value(x[3]),
+                'packets_out.count': parse_value(x[9]),
+                'packets_out.error': parse_value(x[10]) + parse_value(x[11]),
+            }))
+        return devices
+
+    def _parse_counters(self, content):
+        # Lines go by pairs of a header and values line of the same category:
+        # Tcp: RtoAlgorithm RtoMin RtoMax MaxConn ActiveOpens ...
+        # Tcp: 1 200 120000 -1 1133 ...
+        counters = {}
+        lines = iter_lines(content)
+        for header, values in izip(lines, lines):
+            columns = self._columns.get(header)
+            if columns is None:
+                columns = self._columns[header] = self._get_columns(header)
+            if columns:
+                values = values.split()
+                for idx, metric in columns:
+                    counters[metric] = parse_value(values[idx])
+        return counters
+
+    def _get_columns(self, header):
+        h_parts = header.split()
+        metrics = self.counters.get(h_parts[0][:-1], {})
+        return [(idx, metrics[name]) for idx, name in enumerate(h_parts) if name in metrics]
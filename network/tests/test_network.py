@@ -10,6 +10,7 @@ import platform
 
 # project
 from datadog_checks.network import Network
+from datadog_checks.network import procfs
 
 import mock
 import pytest
@@ -31,6 +32,23 @@ CX_STATE_GAUGES_VALUES = {
     'system.net.tcp6.time_wait': 1,
 }
 
+PROC_NET_COUNTERS_VALUES = {
+    'system.net.tcp.retrans_segs': 5,
+    'system.net.tcp.in_segs': 11817,
+    'system.net.tcp.out_segs': 11104,
+    'system.net.tcp.listen_overflows': 6,
+    'system.net.tcp.listen_drops': 7,
+    'system.net.tcp.backlog_drops': 8,
+    'system.net.tcp.failed_retransmits': 9,
+    'system.net.udp.in_datagrams': 118,
+    'system.net.udp.no_ports': 1,
+    'system.net.udp.in_errors': 2,
+    'system.net.udp.out_datagrams': 117,
+    'system.net.udp.rcv_buf_errors': 3,
+    'system.net.udp.snd_buf_errors': 4,
+    'system.net.udp.in_csum_errors': 5,
+}
+
 network_check = Network('network', {}, {})
 
 
@@ -93,6 +111,54 @@ def test_cx_state_linux_netstat(mock_is_linux, mock_get_subprocess_output, aggre
         aggregator.assert_metric(metric, value=value, tags=['optional:tag1'])
 
 
+@mock.patch('datadog_checks.network.network.Platform.is_linux', return_value=True)
+@mock.patch('datadog_checks.network.network.Platform.is_containerized', return_value=False)
+def test_cx_state_linux_procfs(mock_is_containerized, mock_is_linux, aggregator):
+    check = Network('network', {}, {'procfs_path': os.path.join(FIXTURE_DIR, 'fixtures', 'proc')})
+    instance = {
+        'collect_connection_state': True,
+        'collect_connection_state_from_procfs': True,
+        'tags': ['optional:tag1'],
+    }
+    check.check(instance)
+
+    # Same values as the ones read from the `ss` fixtures
+    for metric, value in CX_STATE_GAUGES_VALUES.iteritems():
+        aggregator.assert_metric(metric, value=value, tags=['optional:tag1'])
+
+
+@mock.patch('datadog_checks.network.network.Platform.is_linux', return_value=True)
+@mock.patch('datadog_checks.network.network.Platform.is_containerized', return_value=False)
+def test_proc_net_counters_linux(mock_is_containerized, mock_is_linux, aggregator):
+    proc_location = os.path.join(FIXTURE_DIR, 'fixtures', 'proc')
+    check = Network('network', {}, {'procfs_path': proc_location})
+    instances = [
+        {'tags': ['instance:1']},
+        {'tags': ['instance:2'], 'excluded_interfaces': ['lo'], 'collect_count_metrics': True},
+    ]
+
+    # Forget the snapshots taken by the other tests
+    procfs._readers.clear()
+    read_proc_net = procfs.ProcNetReader._read
+    with mock.patch.object(procfs.ProcNetReader, '_read', autospec=True, side_effect=read_proc_net) as read:
+        for instance in instances:
+            check.check(instance)
+
+        # Both instances use the same snapshot
+        assert read.call_count == 3
+
+    for metric, value in PROC_NET_COUNTERS_VALUES.iteritems():
+        aggregator.assert_metric(metric, value=value, tags=['instance:1'])
+        aggregator.assert_metric(metric, value=value, tags=['instance:2'])
+        aggregator.assert_metric('{}.count'.format(metric), value=value, tags=['instance:2'])
+
+    aggregator.assert_metric('system.net.bytes_rcvd', value=631947052, tags=['instance:1', 'device:eth0'])
+    aggregator.assert_metric('system.net.bytes_rcvd', value=45890956, tags=['instance:1', 'device:lo'])
+    aggregator.assert_metric('system.net.bytes_rcvd', value=631947052, tags=['instance:2', 'device:eth0'])
+    aggregator.assert_metric('system.net.bytes_rcvd', count=0, tags=['instance:2', 'device:lo'])
+    aggregator.assert_metric('system.net.packets_in.error', value=19, tags=['instance:2', 'device:eth0'])
+
+
 @mock.patch('datadog_checks.network.network.Platform.is_linux', return_value=False)
 @mock.patch('datadog_checks.network.network.Platform.is_bsd', return_value=False)
 @mock.patch('datadog_checks.network.network.Platform.is_solaris', return_value=False)
@@ -4,8 +4,6 @@
 import random
 import time
 
-import requests
-
 from datadog_checks.checks import AgentCheck
 from datadog_checks.utils.headers import headers
 from datadog_checks.config import _is_affirmative
@@ -78,9 +76,9 @@ class PHPFPMCheck(AgentCheck):
             # informations, which could be nice to parse and output as metrics
             max_attempts = 3
             for i in range(max_attempts):
-                resp = requests.get(status_url, auth=auth, timeout=timeout,
-                                    headers=headers(self.agentConfig, http_host=http_host),
-                                    verify=not disable_ssl_validation, params={'json': True})
+                resp = self.http.get(status_url, auth=auth, timeout=timeout,
+                                     headers=headers(self.agentConfig, http_host=http_host),
+                                     verify=not disable_ssl_validation, params={'json': True})
 
                 # Exponential backoff, wait at most (max_attempts - 1) times in case we get a 503.
                 # Delay in seconds is (2^i + random amount of seconds between 0 and 1)
@@ -130,9 +128,9 @@ class PHPFPMCheck(AgentCheck):
         try:
             # TODO: adding the 'full' parameter gets you per-process detailed
             # informations, which could be nice to parse and output as metrics
-            resp = requests.get(ping_url, auth=auth, timeout=timeout,
-                                headers=headers(self.agentConfig, http_host=http_host),
-                                verify=not disable_ssl_validation)
+            resp = self.http.get(ping_url, auth=auth, timeout=timeout,
+                                 headers=headers(self.agentConfig, http_host=http_host),
+                                 verify=not disable_ssl_validation)
             resp.raise_for_status()
 
             if ping_reply not in resp.text:
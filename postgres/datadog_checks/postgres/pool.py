@@ -0,0 +1,61 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+from collections import OrderedDict
+import threading
+
+
+class ConnectionPool(object):
+    """
+    Connections to the databases of a server, opened by `connect(dbname)`.
+
+    A connection is used by one thread at a time: it's taken out of the pool by `acquire` and
+    given back by `release`. At most `max_size` idle connections are kept open, the least
+    recently used ones are closed first.
+    """
+    def __init__(self, connect, max_size):
+        self.connect = connect
+        self.max_size = max_size
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, dbname):
+        with self._lock:
+            conn = self._idle.pop(dbname, None)
+        if conn is None:
+            conn = self.connect(dbname)
+        return conn
+
+    def release(self, dbname, conn):
+        with self._lock:
+            evicted = self._idle.pop(dbname, None)
+            self._idle[dbname] = conn
+            if len(self._idle) > self.max_size:
+                _, evicted = self._idle.popitem(last=False)
+        if evicted is not None:
+            _close(evicted)
+
+    def discard(self, conn):
+        """Close a connection that can't be reused, e.g. after a connection error."""
+        _close(conn)
+
+    def retain(self, dbnames):
+        """Close the idle connections to the databases that aren't part of `dbnames`."""
+        with self._lock:
+            evicted = [self._idle.pop(dbname) for dbname in list(self._idle) if dbname not in dbnames]
+        for conn in evicted:
+            _close(conn)
+
+    def close(self):
+        with self._lock:
+            evicted = self._idle.values()
+            self._idle.clear()
+        for conn in evicted:
+            _close(conn)
+
+
+def _close(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
@@ -1,7 +1,9 @@
 # (C) Datadog, Inc. 2018
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
+import json
 import socket
+import time
 
 try:
     import psycopg2
@@ -17,10 +19,17 @@ except ImportError:
 from datadog_checks.checks import AgentCheck
 from datadog_checks.errors import CheckException
 from datadog_checks.config import _is_affirmative
+from datadog_checks.utils.executor import BoundedExecutor
 
+from .pool import ConnectionPool
+from .relations import RelationsRefresh
 
 MAX_CUSTOM_RESULTS = 100
 TABLE_COUNT_LIMIT = 200
+DEFAULT_MAX_CONCURRENT_DATABASES = 4
+DEFAULT_CONNECTION_POOL_SIZE = 10
+# Seconds during which the queries of an instance are run one at a time after they failed as a batch
+BATCH_RETRY_INTERVAL = 600
 
 
 def psycopg2_connect(*args, **kwargs):
@@ -36,6 +45,11 @@ def add_instance_tags_to_server_metrics():
     return datadog_agent is None
 
 
+def _row_values(pairs):
+    # Keeps the values of the columns with duplicated names, unlike a dict
+    return [v for _, v in pairs]
+
+
 class ShouldRestartException(Exception):
     pass
 
@@ -309,6 +323,13 @@ SELECT s.schemaname,
         'relation': False
     }
 
+    DATABASES_QUERY = """
+SELECT datname
+  FROM pg_database
+ WHERE datallowconn
+   AND NOT datistemplate
+   AND datname not ilike 'rdsadmin'"""
+
     def __init__(self, name, init_config, agentConfig, instances=None):
         AgentCheck.__init__(self, name, init_config, agentConfig, instances)
         self.dbs = {}
@@ -321,6 +342,12 @@ SELECT s.schemaname,
         self.db_archiver_metrics = []
         self.replication_metrics = {}
         self.custom_metrics = {}
+        # time after which the queries are batched again, by key of the instances whose batch failed
+        self.unbatchable_keys = {}
+        # connections to the discovered databases, by instance key
+        self.pools = {}
+        # refresh state of the relation metrics, by (host, port, dbname)
+        self.relations_refreshes = {}
 
     def _get_pg_attrs(self, instance):
         if _is_affirmative(instance.get('use_psycopg2', False)):
@@ -359,6 +386,9 @@ SELECT s.schemaname,
     def _is_9_2_or_above(self, key, db):
         return self._is_above(key, db, [9, 2, 0])
 
+    def _is_9_3_or_above(self, key, db):
+        return self._is_above(key, db, [9, 3, 0])
+
     def _is_9_4_or_above(self, key, db):
         return self._is_above(key, db, [9, 4, 0])
 
@@ -519,6 +549,18 @@ SELECT s.schemaname,
                 self.log.warn('Failed to parse config element=%s, check syntax' % str(element))
         return config
 
+    def _build_query(self, scope, cols, relations, relations_config):
+        # if this is a relation-specific query, we need to list all relations last
+        if scope['relation'] and len(relations) > 0:
+            relnames = ', '.join("'{0}'".format(w) for w in relations_config.iterkeys())
+            query = scope['query'] % (", ".join(cols), "%s")  # Keep the last %s intact
+            self.log.debug("Running query: %s with relations: %s" % (query, relnames))
+            return query % (relnames)
+
+        query = scope['query'] % (", ".join(cols))
+        self.log.debug("Running query: %s" % query)
+        return query.replace(r'%', r'%%')
+
     def _query_scope(self, cursor, scope, key, db, instance_tags, relations, is_custom_metrics, programming_error,
                      relations_config):
         if scope is None:
@@ -534,23 +576,68 @@ SELECT s.schemaname,
         # we must remember that order to parse results
 
         try:
-            # if this is a relation-specific query, we need to list all relations last
-            if scope['relation'] and len(relations) > 0:
-                relnames = ', '.join("'{0}'".format(w) for w in relations_config.iterkeys())
-                query = scope['query'] % (", ".join(cols), "%s")  # Keep the last %s intact
-                self.log.debug("Running query: %s with relations: %s" % (query, relnames))
-                cursor.execute(query % (relnames))
-            else:
-                query = scope['query'] % (", ".join(cols))
-                self.log.debug("Running query: %s" % query)
-                cursor.execute(query.replace(r'%', r'%%'))
-
+            query = self._build_query(scope, cols, relations, relations_config)
+            cursor.execute(query)
             results = cursor.fetchall()
         except programming_error as e:
             log_func("Not all metrics may be available: %s" % str(e))
             db.rollback()
             return None
 
+        return self._submit_results(scope, cols, results, query, instance_tags, relations, is_custom_metrics,
+                                    relations_config)
+
+    def _query_scopes_batch(self, cursor, scopes, key, db, relations, programming_error, relations_config):
+        """Run the queries of the (scope, tags) `scopes` in a single round trip.
+        The rows of each query are aggregated into a JSON array by the server,
+        which is parsed back and submitted with the tags of its scope.
+        Returns the number of rows of each scope, or None if the queries couldn't be batched.
+        """
+        if time.time() < self.unbatchable_keys.get(key, 0) or not self._is_9_3_or_above(key, db):
+            return None
+
+        batch = []
+        for idx, (scope, _) in enumerate(scopes):
+            if scope is None:
+                continue
+            cols = scope['metrics'].keys()
+            query = self._build_query(scope, cols, relations, relations_config)
+            batch.append((idx, cols, query))
+
+        results_lens = [None] * len(scopes)
+        if not batch:
+            return results_lens
+
+        # json_agg returns a single row, NULL if the query didn't return any row
+        query = "\nUNION ALL\n".join(
+            "SELECT {0}, json_agg(t)::text FROM ({1}\n) AS t".format(idx, q.strip().rstrip(';'))
+            for idx, _, q in batch
+        )
+        try:
+            cursor.execute(query)
+            results = dict(cursor.fetchall())
+        except programming_error as e:
+            # The queries that fail are logged when they're run one at a time
+            self.log.warning("Unable to batch the queries, running them one at a time for the next %d seconds "
+                             "instead: %s" % (BATCH_RETRY_INTERVAL, str(e)))
+            db.rollback()
+            self.unbatchable_keys[key] = time.time() + BATCH_RETRY_INTERVAL
+            return None
+
+        self.unbatchable_keys.pop(key, None)
+
+        for idx, cols, query in batch:
+            scope, tags = scopes[idx]
+            rows = results.get(idx)
+            # Rows are loaded as lists of values, in the order of the columns of the query
+            rows = json.loads(rows, object_pairs_hook=_row_values) if rows else []
+            results_lens[idx] = self._submit_results(scope, cols, rows, query, tags, relations, False,
+                                                     relations_config)
+
+        return results_lens
+
+    def _submit_results(self, scope, cols, results, query, instance_tags, relations, is_custom_metrics,
+                        relations_config):
         if not results:
             return None
 
@@ -609,11 +696,14 @@ SELECT s.schemaname,
         return len(results)
 
     def _collect_stats(self, key, db, instance_tags, relations, custom_metrics, function_metrics, count_metrics,
-                       database_size_metrics, collect_default_db, interface_error, programming_error):
+                       database_size_metrics, collect_default_db, batch_queries, relations_refresh, interface_error,
+                       programming_error):
         """Query pg_stat_* for various metrics
         If relations is not an empty list, gather per-relation metrics
         on top of that.
         If custom_metrics is not an empty list, gather custom metrics defined in postgres.yaml
+        If batch_queries is set, all the queries but the custom ones are sent in a single round trip
+        If relations_refresh is set, the relation metrics are refreshed following its tiers
         """
 
         db_instance_metrics = self._get_instance_metrics(key, db, database_size_metrics, collect_default_db)
@@ -632,12 +722,13 @@ SELECT s.schemaname,
         # Do we need relation-specific metrics?
         relations_config = {}
         if relations:
-            metric_scope += [
-                self.REL_METRICS,
-                self.IDX_METRICS,
-                self.SIZE_METRICS,
-                self.STATIO_METRICS
-            ]
+            if relations_refresh is None:
+                metric_scope += [
+                    self.REL_METRICS,
+                    self.IDX_METRICS,
+                    self.SIZE_METRICS,
+                    self.STATIO_METRICS
+                ]
             relations_config = self._build_relations_config(relations)
 
         replication_metrics = self._get_replication_metrics(key, db)
@@ -655,20 +746,37 @@ SELECT s.schemaname,
             else:
                 server_metric_tags = []
 
-            results_len = self._query_scope(cursor, db_instance_metrics, key, db, server_metric_tags, relations,
-                                            False, programming_error, relations_config)
-            if results_len is not None:
-                self.gauge("postgresql.db.count", results_len,
+            scopes = [
+                (db_instance_metrics, server_metric_tags),
+                (bgw_instance_metrics, server_metric_tags),
+                (archiver_instance_metrics, server_metric_tags),
+            ]
+            scopes += [(scope, instance_tags) for scope in metric_scope]
+
+            results_lens = None
+            if batch_queries:
+                results_lens = self._query_scopes_batch(cursor, scopes, key, db, relations, programming_error,
+                                                        relations_config)
+            if results_lens is None:
+                results_lens = [
+                    self._query_scope(cursor, scope, key, db, tags, relations, False, programming_error,
+                                      relations_config)
+                    for scope, tags in scopes
+                ]
+
+            if results_lens[0] is not None:
+                self.gauge("postgresql.db.count", results_lens[0],
                            tags=[t for t in server_metric_tags if not t.startswith("db:")])
 
-            self._query_scope(cursor, bgw_instance_metrics, key, db, server_metric_tags, relations,
-                              False, programming_error, relations_config)
-            self._query_scope(cursor, archiver_instance_metrics, key, db, server_metric_tags, relations,
-                              False, programming_error, relations_config)
+            if relations and relations_refresh is not None:
+                relations_results = self._fetch_relations(db, cursor, relations_refresh, relations, relations_config,
+                                                          programming_error)
+                for scope, cols, rows, query in relations_results:
+                    self._submit_results(scope, cols, rows, query, instance_tags, relations, False, relations_config)
 
-            for scope in list(metric_scope) + custom_metrics:
+            for scope in custom_metrics:
                 self._query_scope(cursor, scope, key, db, instance_tags, relations,
-                                  scope in custom_metrics, programming_error, relations_config)
+                                  True, programming_error, relations_config)
 
             cursor.close()
         except interface_error as e:
@@ -687,27 +795,40 @@ SELECT s.schemaname,
         service_check_tags = list(set(service_check_tags))
         return service_check_tags
 
-    def get_connection(self, key, host, port, user, password, dbname, ssl, connect_fct, tags, use_cached=True):
+    def _connect(self, host, port, user, password, dbname, ssl, connect_fct, query_timeout=None):
+        if host == 'localhost' and password == '':
+            # Use ident method
+            connection = connect_fct("user=%s dbname=%s" % (user, dbname))
+        elif port != '':
+            connection = connect_fct(host=host, port=port, user=user,
+                                     password=password, database=dbname, ssl=ssl)
+        elif host.startswith('/'):
+            # If the hostname starts with /, it's probably a path
+            # to a UNIX socket. This is similar behaviour to psql
+            connection = connect_fct(unix_sock=host, user=user,
+                                     password=password, database=dbname)
+        else:
+            connection = connect_fct(host=host, user=user, password=password,
+                                     database=dbname, ssl=ssl)
+
+        if query_timeout:
+            # Committed right away, a rollback would revert it
+            cursor = connection.cursor()
+            cursor.execute("SET statement_timeout = %d" % query_timeout)
+            cursor.close()
+            connection.commit()
+
+        return connection
+
+    def get_connection(self, key, host, port, user, password, dbname, ssl, connect_fct, tags, use_cached=True,
+                       query_timeout=None):
         "Get and memoize connections to instances"
         if key in self.dbs and use_cached:
             return self.dbs[key]
 
         elif host != "" and user != "":
             try:
-                if host == 'localhost' and password == '':
-                    # Use ident method
-                    connection = connect_fct("user=%s dbname=%s" % (user, dbname))
-                elif port != '':
-                    connection = connect_fct(host=host, port=port, user=user,
-                                             password=password, database=dbname, ssl=ssl)
-                elif host.startswith('/'):
-                    # If the hostname starts with /, it's probably a path
-                    # to a UNIX socket. This is similar behaviour to psql
-                    connection = connect_fct(unix_sock=host, user=user,
-                                             password=password, database=dbname)
-                else:
-                    connection = connect_fct(host=host, user=user, password=password,
-                                             database=dbname, ssl=ssl)
+                connection = self._connect(host, port, user, password, dbname, ssl, connect_fct, query_timeout)
             except Exception as e:
                 message = u'Error establishing postgres connection: %s' % (str(e))
                 service_check_tags = self._get_service_check_tags(host, port, tags)
@@ -723,6 +844,142 @@ SELECT s.schemaname,
         self.dbs[key] = connection
         return connection
 
+    def _get_pool(self, key, host, port, user, password, ssl, connect_fct, pool_size, query_timeout):
+        pool = self.pools.get(key)
+        if pool is None:
+            def connect(dbname):
+                return self._connect(host, port, user, password, dbname, ssl, connect_fct, query_timeout)
+
+            pool = self.pools[key] = ConnectionPool(connect, pool_size)
+        return pool
+
+    def _discover_databases(self, db, collect_default_db):
+        query = self.DATABASES_QUERY
+        if not collect_default_db:
+            query += "\n   AND datname not ilike 'postgres'"
+        cursor = db.cursor()
+        cursor.execute(query)
+        dbnames = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        return dbnames
+
+    def _get_relations_refresh(self, key, refresh_interval, max_relations):
+        if not refresh_interval and max_relations is None:
+            return None
+
+        refresh = self.relations_refreshes.get(key)
+        if refresh is None:
+            refresh = self.relations_refreshes[key] = RelationsRefresh(refresh_interval, max_relations)
+        return refresh
+
+    def _fetch_relations(self, db, cursor, refresh, relations, relations_config, programming_error):
+        """Run the queries of the relation metrics, only the ones due if `refresh` is set.
+        Returns a list of (scope, cols, rows, query) tuples, with the rows served from the
+        cache of `refresh` for the relations that weren't queried.
+        """
+        def run(scope, config):
+            cols = scope['metrics'].keys()
+            try:
+                query = self._build_query(scope, cols, relations, config)
+                cursor.execute(query)
+                return cols, cursor.fetchall(), query
+            except programming_error as e:
+                self.log.warning("Not all metrics may be available: %s" % str(e))
+                db.rollback()
+                return cols, None, None
+
+        if refresh is None:
+            results = []
+            for scope in [self.REL_METRICS, self.IDX_METRICS, self.SIZE_METRICS, self.STATIO_METRICS]:
+                cols, rows, query = run(scope, relations_config)
+                if rows is not None:
+                    results.append((scope, cols, rows, query))
+            return results
+
+        full_refresh = refresh.is_full_refresh()
+        results = []
+
+        # pg_stat_user_tables is queried on every run to find the relations that changed
+        cols, rows, query = run(self.REL_METRICS, relations_config)
+        changed = None
+        if rows is not None:
+            changed = refresh.update_counters(cols, rows)
+            results.append((self.REL_METRICS, cols, refresh.busiest(rows), query))
+
+        # Rates are queried for the relations that changed. The other relations are submitted with their
+        # cached counters, so that their rate is 0 instead of a gap in the metrics
+        for scope_name, scope in [('idx', self.IDX_METRICS), ('statio', self.STATIO_METRICS)]:
+            if full_refresh or changed is None:
+                cols, rows, query = run(scope, relations_config)
+                queried = None
+            else:
+                config = dict((n, c) for n, c in relations_config.iteritems() if n in changed)
+                cols, rows, query = scope['metrics'].keys(), [], None
+                if config:
+                    cols, rows, query = run(scope, config)
+                queried = changed
+
+            if rows is not None:
+                rows = refresh.update_rows(scope_name, rows, queried)
+                results.append((scope, cols, refresh.busiest(rows), query))
+
+        # Sizes are gauges, served from the cache between full refreshes
+        cols, rows, query = self.SIZE_METRICS['metrics'].keys(), None, None
+        if full_refresh:
+            cols, rows, query = run(self.SIZE_METRICS, relations_config)
+        if rows is not None:
+            refresh.update_rows('size', rows)
+        results.append((self.SIZE_METRICS, cols, refresh.busiest(refresh.cached_rows('size')), query))
+
+        return results
+
+    def _fetch_database_relations(self, pool, dbname, refresh, relations, relations_config, programming_error):
+        """Run the relation queries against the `dbname` database, from a thread of the executor.
+        Returns a list of (scope, cols, rows, query) tuples and the error that stopped the
+        collection, if any. Metrics are submitted from the thread running the check.
+        """
+        try:
+            db = pool.acquire(dbname)
+        except Exception as e:
+            return [], e
+
+        try:
+            cursor = db.cursor()
+            results = self._fetch_relations(db, cursor, refresh, relations, relations_config, programming_error)
+            cursor.close()
+            # commit to close the current query transaction
+            db.commit()
+        except Exception as e:
+            pool.discard(db)
+            return [], e
+
+        pool.release(dbname, db)
+        return results, None
+
+    def _collect_databases_relations(self, key, db, pool, executor, instance_tags, relations, collect_default_db,
+                                     refresh_interval, max_relations, programming_error):
+        """Collect the relation metrics of all the databases of the server,
+        running the queries of up to `executor.max_workers` databases concurrently.
+        """
+        dbnames = self._discover_databases(db, collect_default_db)
+        pool.retain(dbnames)
+
+        relations_config = self._build_relations_config(relations)
+        server_tags = [t for t in instance_tags if not t.startswith("db:")]
+
+        args_list = [
+            (pool, dbname, self._get_relations_refresh(key[:2] + (dbname,), refresh_interval, max_relations),
+             relations, relations_config, programming_error)
+            for dbname in dbnames
+        ]
+        for dbname, (results, error) in zip(dbnames, executor.map(self._fetch_database_relations, args_list)):
+            if error is not None:
+                self.log.warning("Unable to collect the relation metrics of database %s: %s" % (dbname, str(error)))
+
+            tags = server_tags + ["db:%s" % dbname]
+            for scope, cols, rows, query in results:
+                self._submit_results(scope, cols, rows, query, tags, relations, False, relations_config)
+
     def _get_custom_metrics(self, custom_metrics, key):
         # Pre-processed cached custom_metrics
         if key in self.custom_metrics:
@@ -769,8 +1026,17 @@ SELECT s.schemaname,
         count_metrics = _is_affirmative(instance.get('collect_count_metrics', True))
         database_size_metrics = _is_affirmative(instance.get('collect_database_size_metrics', True))
         collect_default_db = _is_affirmative(instance.get('collect_default_database', False))
-
-        if relations and not dbname:
+        batch_queries = _is_affirmative(instance.get('batch_queries', False))
+        database_autodiscovery = _is_affirmative(instance.get('database_autodiscovery', False))
+        query_timeout = instance.get('query_timeout')
+        if query_timeout is not None:
+            query_timeout = int(query_timeout)
+        relations_refresh_interval = float(instance.get('relations_refresh_interval', 0))
+        max_relations = instance.get('max_relations')
+        if max_relations is not None:
+            max_relations = int(max_relations)
+
+        if relations and not dbname and not database_autodiscovery:
             self.warning('"dbname" parameter must be set when using the "relations" parameter.')
 
         if dbname is None:
@@ -792,6 +1058,10 @@ SELECT s.schemaname,
 
         self.log.debug("Custom metrics: %s" % custom_metrics)
 
+        # Relation metrics are collected from each of the databases of the server instead
+        db_relations = [] if database_autodiscovery else relations
+        relations_refresh = self._get_relations_refresh(key, relations_refresh_interval, max_relations)
+
         # preset tags to the database name
         db = None
 
@@ -800,16 +1070,36 @@ SELECT s.schemaname,
         # Collect metrics
         try:
             # Check version
-            db = self.get_connection(key, host, port, user, password, dbname, ssl, connect_fct, tags)
+            db = self.get_connection(key, host, port, user, password, dbname, ssl, connect_fct, tags,
+                                     query_timeout=query_timeout)
             version = self._get_version(key, db)
             self.log.debug("Running check against version %s" % version)
-            self._collect_stats(key, db, tags, relations, custom_metrics, function_metrics, count_metrics,
-                                database_size_metrics, collect_default_db, interface_error, programming_error)
+            self._collect_stats(key, db, tags, db_relations, custom_metrics, function_metrics, count_metrics,
+                                database_size_metrics, collect_default_db, batch_queries, relations_refresh,
+                                interface_error, programming_error)
         except ShouldRestartException:
             self.log.info("Resetting the connection")
-            db = self.get_connection(key, host, port, user, password, dbname, ssl, connect_fct, tags, use_cached=False)
-            self._collect_stats(key, db, tags, relations, custom_metrics, function_metrics, count_metrics,
-                                database_size_metrics, collect_default_db, interface_error, programming_error)
+            db = self.get_connection(key, host, port, user, password, dbname, ssl, connect_fct, tags, use_cached=False,
+                                     query_timeout=query_timeout)
+            self._collect_stats(key, db, tags, db_relations, custom_metrics, function_metrics, count_metrics,
+                                database_size_metrics, collect_default_db, batch_queries, relations_refresh,
+                                interface_error, programming_error)
+
+        if database_autodiscovery and relations:
+            max_concurrent_databases = int(instance.get('max_concurrent_databases',
+                                                        DEFAULT_MAX_CONCURRENT_DATABASES))
+            pool_size = int(instance.get('connection_pool_size', DEFAULT_CONNECTION_POOL_SIZE))
+            pool = self._get_pool(key, host, port, user, password, ssl, connect_fct, pool_size, query_timeout)
+            executor = BoundedExecutor(max_concurrent_databases, name='postgres')
+            try:
+                self._collect_databases_relations(key, db, pool, executor, tags, relations, collect_default_db,
+                                                  relations_refresh_interval, max_relations, programming_error)
+            except programming_error as e:
+                self.log.warning("Unable to discover the databases, relation metrics will be missing: %s" % str(e))
+                db.rollback()
+            except interface_error as e:
+                # The connection is reset on the next run
+                self.log.warning("Unable to discover the databases, relation metrics will be missing: %s" % str(e))
 
         if db is not None:
             service_check_tags = self._get_service_check_tags(host, port, tags)
@@ -0,0 +1,99 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+import time
+
+# Columns of pg_stat_user_tables counting the rows written to a relation
+WRITE_COUNTERS = ('n_tup_ins', 'n_tup_upd', 'n_tup_del')
+# Columns of pg_stat_user_tables counting the scans of a relation
+READ_COUNTERS = ('seq_scan', 'idx_scan')
+
+
+class RelationsRefresh(object):
+    """
+    State of the tiered refresh of the relation metrics of a database.
+
+    Every `refresh_interval` seconds, all the relation queries are run in full. In between,
+    the index and statio queries are only run for the relations whose `WRITE_COUNTERS` or
+    `READ_COUNTERS` changed since the previous run. Their metrics are rates: the other relations
+    are submitted again with their cached counters, so that their rate is 0.
+    The sizes are gauges: they're only queried once per interval and served from the cache in between.
+    Rows are cached by scope name.
+
+    If `max_relations` is set, only the rows of the `max_relations` busiest relations are
+    submitted, by number of rows written since the previous run.
+    """
+    def __init__(self, refresh_interval=0, max_relations=None):
+        self.refresh_interval = refresh_interval
+        self.max_relations = max_relations
+        self.last_full_refresh = None
+        # relation name -> (sum of its write counters, sum of its read counters)
+        self._counters = {}
+        # relation name -> rows written since the previous run
+        self._activity = {}
+        # scope name -> [row, ...]
+        self._rows = {}
+
+    def is_full_refresh(self, now=None):
+        """Return whether all the relation queries must run in full, starting a new refresh interval if so."""
+        now = time.time() if now is None else now
+        if self.last_full_refresh is None or now - self.last_full_refresh >= self.refresh_interval:
+            self.last_full_refresh = now
+            return True
+        return False
+
+    def update_counters(self, cols, rows):
+        """
+        Record the write and read counters of the rows of `pg_stat_user_tables`, with `cols` the metric
+        columns following the descriptors. Return the names of the relations whose counters changed.
+        """
+        writes_indexes = [i for i, col in enumerate(cols) if col in WRITE_COUNTERS]
+        reads_indexes = [i for i, col in enumerate(cols) if col in READ_COUNTERS]
+        counters = {}
+        for row in rows:
+            values = row[len(row) - len(cols):]
+            # A relation can be part of several schemas
+            writes, reads = counters.get(row[0], (0, 0))
+            counters[row[0]] = (
+                writes + sum(values[i] or 0 for i in writes_indexes),
+                reads + sum(values[i] or 0 for i in reads_indexes),
+            )
+
+        changed = set()
+        activity = {}
+        for relname, (writes, reads) in counters.iteritems():
+            previous = self._counters.get(relname)
+            if previous != (writes, reads):
+                changed.add(relname)
+            activity[relname] = writes - (previous[0] if previous else 0)
+
+        self._counters = counters
+        self._activity = activity
+        return changed
+
+    def update_rows(self, scope_name, rows, relations=None):
+        """
+        Cache the rows of the scope, in place of the cached rows of `relations`, or of all of them if None.
+        The rows of the relations that are no longer in `pg_stat_user_tables` are dropped.
+        Return the cached rows of the scope.
+        """
+        if relations is None:
+            cached = list(rows)
+        else:
+            cached = [row for row in self._rows.get(scope_name, [])
+                      if row[0] not in relations and row[0] in self._counters]
+            cached.extend(rows)
+
+        self._rows[scope_name] = cached
+        return cached
+
+    def cached_rows(self, scope_name):
+        return self._rows.get(scope_name, [])
+
+    def busiest(self, rows):
+        """Return the rows of the `max_relations` busiest relations."""
+        if self.max_relations is None or not self._activity:
+            return rows
+
+        busiest = set(sorted(self._activity, key=self._activity.get, reverse=True)[:self.max_relations])
+        return [row for row in rows if row[0] in busiest]
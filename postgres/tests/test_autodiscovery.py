@@ -0,0 +1,119 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+import mock
+import pytest
+from pg8000 import InterfaceError, ProgrammingError
+
+from datadog_checks.postgres import PostgreSql
+from datadog_checks.postgres.pool import ConnectionPool
+from datadog_checks.utils.executor import BoundedExecutor
+
+KEY = ('localhost', 5432, 'postgres')
+TAGS = ['foo:bar', 'db:postgres']
+
+
+def database_connection(rows):
+    """Connection returning `rows` for the query of the relation metrics, no rows otherwise."""
+    conn = mock.MagicMock()
+    cursor = conn.cursor.return_value
+
+    def execute(query):
+        cursor.fetchall.return_value = rows if 'pg_stat_user_tables' in query else []
+
+    cursor.execute.side_effect = execute
+    return conn
+
+
+def rel_row(relname, value):
+    cols = PostgreSql.REL_METRICS['metrics'].keys()
+    return [relname, 'public'] + [value] * len(cols)
+
+
+@pytest.mark.unit
+def test_collect_databases_relations(aggregator):
+    check = PostgreSql('postgres', {}, {})
+    db = mock.MagicMock()
+    db.cursor.return_value.fetchall.return_value = [('datadog_test',), ('dogs',)]
+    conns = {
+        'datadog_test': database_connection([rel_row('persons', 1)]),
+        'dogs': database_connection([rel_row('breed', 2)]),
+    }
+    pool = ConnectionPool(conns.get, 10)
+
+    check._collect_databases_relations(KEY, db, pool, BoundedExecutor(2), TAGS, ['persons', 'breed'], False, 0, None,
+                                       ProgrammingError)
+
+    discovery_query = db.cursor.return_value.execute.call_args[0][0]
+    assert "datname not ilike 'postgres'" in discovery_query
+    aggregator.assert_metric('postgresql.live_rows', value=1, count=1,
+                             tags=['foo:bar', 'db:datadog_test', 'table:persons', 'schema:public'])
+    aggregator.assert_metric('postgresql.live_rows', value=2, count=1,
+                             tags=['foo:bar', 'db:dogs', 'table:breed', 'schema:public'])
+    for conn in conns.values():
+        conn.commit.assert_called_once_with()
+        assert not conn.close.called
+
+
+@pytest.mark.unit
+def test_collect_databases_relations_errors(aggregator):
+    check = PostgreSql('postgres', {}, {})
+    db = mock.MagicMock()
+    db.cursor.return_value.fetchall.return_value = [('datadog_test',), ('cats',), ('dogs',)]
+    broken = database_connection([])
+    broken.cursor.return_value.execute.side_effect = Exception('canceling statement due to statement timeout')
+    conns = {
+        'datadog_test': broken,
+        'dogs': database_connection([rel_row('breed', 2)]),
+    }
+
+    def connect(dbname):
+        if dbname not in conns:
+            raise Exception('database "{}" does not exist'.format(dbname))
+        return conns[dbname]
+
+    pool = ConnectionPool(connect, 10)
+    check._collect_databases_relations(KEY, db, pool, BoundedExecutor(2), TAGS, ['persons', 'breed'], False, 0, None,
+                                       ProgrammingError)
+
+    # The other databases are still collected
+    aggregator.assert_metric('postgresql.live_rows', value=2, count=1,
+                             tags=['foo:bar', 'db:dogs', 'table:breed', 'schema:public'])
+    broken.close.assert_called_once_with()
+    assert pool.acquire('dogs') is conns['dogs']
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize('error', [ProgrammingError, InterfaceError])
+def test_database_discovery_error(aggregator, pg_instance, error):
+    pg_instance['relations'] = ['persons']
+    pg_instance['database_autodiscovery'] = True
+    check = PostgreSql('postgres', {}, {})
+    db = mock.MagicMock()
+    db.cursor.return_value.execute.side_effect = error('permission denied for relation pg_database')
+
+    with mock.patch.object(check, 'get_connection', return_value=db), \
+            mock.patch.object(check, '_get_version', return_value=[10, 0, 0]), \
+            mock.patch.object(check, '_collect_stats'):
+        check.check(pg_instance)
+
+    assert db.rollback.called == (error is ProgrammingError)
+    aggregator.assert_service_check('postgres.can_connect', status=PostgreSql.OK)
+
+
+@pytest.mark.integration
+def test_database_autodiscovery(aggregator, postgres_standalone, pg_instance):
+    pg_instance['relations'] = ['persons', 'breed']
+    pg_instance['database_autodiscovery'] = True
+    pg_instance['query_timeout'] = 5000
+    del pg_instance['dbname']
+
+    posgres_check = PostgreSql('postgres', {}, {})
+    posgres_check.check(pg_instance)
+
+    aggregator.assert_metric('postgresql.live_rows', count=1,
+                             tags=pg_instance['tags'] + ['db:datadog_test', 'table:persons', 'schema:public'])
+    aggregator.assert_metric('postgresql.live_rows', count=1,
+                             tags=pg_instance['tags'] + ['db:dogs', 'table:breed', 'schema:public'])
+    aggregator.assert_metric('postgresql.table_size', count=1,
+                             tags=pg_instance['tags'] + ['db:dogs', 'table:breed'])
@@ -0,0 +1,138 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+import time
+
+import mock
+import pytest
+from pg8000 import InterfaceError, ProgrammingError
+
+from datadog_checks.postgres import PostgreSql
+from datadog_checks.postgres.postgres import BATCH_RETRY_INTERVAL
+
+KEY = ('localhost', 5432, 'datadog_test')
+TAGS = ['foo:bar', 'db:datadog_test']
+
+
+@pytest.fixture
+def check():
+    check = PostgreSql('postgres', {}, {})
+    check.versions[KEY] = [9, 6, 0]
+    check.instance_metrics[KEY] = {'numbackends': ('postgresql.connections', PostgreSql.GAUGE)}
+    check.bgw_metrics[KEY] = {'buffers_alloc': ('postgresql.bgwriter.buffers_alloc', PostgreSql.GAUGE)}
+    # Scopes that aren't collected are skipped
+    check.archiver_metrics[KEY] = {}
+    return check
+
+
+def collect_stats(check, db, batch_queries=True):
+    check._collect_stats(KEY, db, TAGS, [], [], False, False, True, False, batch_queries, None,
+                         InterfaceError, ProgrammingError)
+
+
+def batch_results():
+    # JSON arrays of the rows of the scopes, by position:
+    # instance, bgwriter, archiver (skipped), connections, locks, replication (no rows)
+    connection_values = {
+        'MAX(setting) AS max_connections': 100,
+        'SUM(numbackends)/MAX(setting) AS pct_connections': 0.05,
+    }
+    connection_row = ', '.join(
+        '"{0}": {1}'.format(col.split(' AS ')[-1], connection_values[col])
+        for col in PostgreSql.CONNECTION_METRICS['metrics']
+    )
+    return [
+        (0, '[{"datname": "datadog_test", "numbackends": 3}, {"datname": "postgres", "numbackends": 2}]'),
+        (1, '[{"buffers_alloc": 42}]'),
+        (3, '[{%s}]' % connection_row),
+        (4, '[{"mode": "AccessShareLock", "relname": "persons", "lock_count": 1}]'),
+        (5, None),
+    ]
+
+
+@pytest.mark.unit
+def test_batch_queries(aggregator, check):
+    db = mock.MagicMock()
+    cursor = db.cursor.return_value
+    cursor.fetchall.return_value = batch_results()
+
+    collect_stats(check, db)
+
+    assert cursor.execute.call_count == 1
+    query = cursor.execute.call_args[0][0]
+    assert query.count('UNION ALL') == 4
+    assert 'pg_stat_archiver' not in query
+
+    aggregator.assert_metric('postgresql.connections', value=3, count=1, tags=['foo:bar', 'db:datadog_test'])
+    aggregator.assert_metric('postgresql.connections', value=2, count=1, tags=['foo:bar', 'db:postgres'])
+    aggregator.assert_metric('postgresql.db.count', value=2, count=1, tags=['foo:bar'])
+    aggregator.assert_metric('postgresql.bgwriter.buffers_alloc', value=42, count=1, tags=['foo:bar'])
+    aggregator.assert_metric('postgresql.max_connections', value=100, count=1, tags=['foo:bar'])
+    aggregator.assert_metric('postgresql.percent_usage_connections', value=0.05, count=1, tags=['foo:bar'])
+    aggregator.assert_metric('postgresql.locks', value=1, count=1,
+                             tags=['foo:bar', 'lock_mode:AccessShareLock', 'table:persons'])
+    assert 'postgresql.replication_delay' not in aggregator.metric_names
+
+
+@pytest.mark.unit
+def test_batch_queries_fallback(aggregator, check):
+    db = mock.MagicMock()
+    cursor = db.cursor.return_value
+    error = ProgrammingError('permission denied for relation pg_stat_bgwriter')
+    cursor.execute.side_effect = [error] + [None] * 10
+    cursor.fetchall.return_value = []
+
+    collect_stats(check, db)
+
+    # The batch, then each of the 5 queries
+    assert cursor.execute.call_count == 6
+    db.rollback.assert_called_once_with()
+    assert KEY in check.unbatchable_keys
+
+    cursor.execute.reset_mock()
+    cursor.execute.side_effect = None
+    collect_stats(check, db)
+
+    # The queries aren't batched anymore
+    assert cursor.execute.call_count == 5
+    assert not any('UNION ALL' in c[0][0] for c in cursor.execute.call_args_list)
+
+    cursor.execute.reset_mock()
+    cursor.fetchall.return_value = batch_results()
+    with mock.patch('datadog_checks.postgres.postgres.time.time', return_value=time.time() + BATCH_RETRY_INTERVAL):
+        collect_stats(check, db)
+
+    # Until the batch is retried
+    assert cursor.execute.call_count == 1
+    assert KEY not in check.unbatchable_keys
+
+
+@pytest.mark.unit
+def test_batch_queries_before_9_3(aggregator, check):
+    check.versions[KEY] = [9, 2, 0]
+    db = mock.MagicMock()
+    cursor = db.cursor.return_value
+    cursor.fetchall.return_value = []
+
+    collect_stats(check, db)
+
+    assert cursor.execute.call_count == 5
+    assert not any('json_agg' in c[0][0] for c in cursor.execute.call_args_list)
+
+
+@pytest.mark.integration
+def test_batch_queries_metrics(aggregator, postgres_standalone, pg_instance):
+    pg_instance['relations'] = ['persons']
+    PostgreSql('postgres', {}, {}).check(pg_instance)
+    metrics = sorted((name, sorted(m.tags)) for name in aggregator.metric_names
+                     for m in aggregator.metrics(name))
+    aggregator.reset()
+
+    pg_instance['batch_queries'] = True
+    postgres_check = PostgreSql('postgres', {}, {})
+    postgres_check.check(pg_instance)
+    batch_metrics = sorted((name, sorted(m.tags)) for name in aggregator.metric_names
+                           for m in aggregator.metrics(name))
+
+    assert not postgres_check.unbatchable_keys
+    assert batch_metrics == metrics
@@ -0,0 +1,63 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+import time
+
+import pytest
+
+from datadog_checks.postgres import PostgreSql
+
+from .common import HOST, PORT, DB_NAME
+
+KEY = (HOST, int(PORT), DB_NAME)
+
+# Round trip time to a server in the same region, added to each query sent to the local server
+ROUND_TRIP_TIME = 0.002
+
+
+class RemoteCursor(object):
+    """Cursor of the local server, answering each query after `ROUND_TRIP_TIME`."""
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        time.sleep(ROUND_TRIP_TIME)
+        return self._cursor.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class RemoteConnection(object):
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, *args, **kwargs):
+        return RemoteCursor(self._connection.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def get_check(pg_instance):
+    check = PostgreSql('postgres', {}, {})
+    # Run once to connect and to load the metrics of the server version
+    check.check(pg_instance)
+    check.dbs[KEY] = RemoteConnection(check.dbs[KEY])
+    return check
+
+
+@pytest.mark.integration
+def test_check(benchmark, aggregator, postgres_standalone, pg_instance):
+    pg_instance['relations'] = ['persons']
+    benchmark(get_check(pg_instance).check, pg_instance)
+
+
+@pytest.mark.integration
+def test_check_batch(benchmark, aggregator, postgres_standalone, pg_instance):
+    pg_instance['relations'] = ['persons']
+    pg_instance['batch_queries'] = True
+    check = get_check(pg_instance)
+    benchmark(check.check, pg_instance)
+
+    assert not check.unbatchable_keys
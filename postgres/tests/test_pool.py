@@ -0,0 +1,50 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+import mock
+import pytest
+
+from datadog_checks.postgres.pool import ConnectionPool
+
+
+@pytest.fixture
+def pool():
+    return ConnectionPool(lambda dbname: mock.MagicMock(name=dbname), 2)
+
+
+@pytest.mark.unit
+def test_acquire_reuses_released_connection(pool):
+    conn = pool.acquire('dogs')
+    pool.release('dogs', conn)
+
+    assert pool.acquire('dogs') is conn
+    # The connection is out of the pool until it's released again
+    assert pool.acquire('dogs') is not conn
+
+
+@pytest.mark.unit
+def test_release_closes_least_recently_used(pool):
+    conns = {}
+    for dbname in ['dogs', 'cats', 'birds']:
+        conns[dbname] = pool.acquire(dbname)
+    for dbname in ['dogs', 'cats', 'birds']:
+        pool.release(dbname, conns[dbname])
+
+    conns['dogs'].close.assert_called_once_with()
+    assert not conns['cats'].close.called
+    assert pool.acquire('cats') is conns['cats']
+    assert pool.acquire('birds') is conns['birds']
+
+
+@pytest.mark.unit
+def test_retain(pool):
+    dogs = pool.acquire('dogs')
+    cats = pool.acquire('cats')
+    pool.release('dogs', dogs)
+    pool.release('cats', cats)
+
+    pool.retain(['cats'])
+
+    dogs.close.assert_called_once_with()
+    assert not cats.close.called
+    assert pool.acquire('cats') is cats
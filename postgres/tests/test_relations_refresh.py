@@ -0,0 +1,169 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+import mock
+import pytest
+from pg8000 import ProgrammingError
+
+from datadog_checks.postgres import PostgreSql
+from datadog_checks.postgres.relations import RelationsRefresh
+
+REL_COLS = PostgreSql.REL_METRICS['metrics'].keys()
+RELATIONS = ['persons', 'breed', 'kennel']
+
+
+def rel_row(relname, n_tup_ins, seq_scan=0):
+    values = {'n_tup_ins': n_tup_ins, 'seq_scan': seq_scan}
+    return [relname, 'public'] + [values.get(col, 0) for col in REL_COLS]
+
+
+def relation_rows(query, rows):
+    return [row for row in rows if "'{}'".format(row[0]) in query.split('ANY')[-1]]
+
+
+class FakeCursor(object):
+    """Cursor answering the relation queries with the rows of `tables`, for the relations they list."""
+    def __init__(self):
+        self.tables = {}
+        self.queries = []
+        self._rows = []
+
+    def execute(self, query):
+        self.queries.append(query)
+        for table, rows in self.tables.iteritems():
+            if table in query:
+                self._rows = relation_rows(query, rows)
+                return
+        self._rows = []
+
+    def fetchall(self):
+        return self._rows
+
+
+@pytest.fixture
+def cursor():
+    cursor = FakeCursor()
+    cursor.tables = {
+        'pg_stat_user_tables': [rel_row('persons', 10), rel_row('breed', 5), rel_row('kennel', 1)],
+        'pg_stat_user_indexes': [['breed', 'public', 'breed_names', 1, 2, 3]],
+        'pg_statio_user_tables': [[relname, 'public'] + [0] * 8 for relname in RELATIONS],
+        'pg_class': [[relname, 1, 2, 3] for relname in RELATIONS],
+    }
+    return cursor
+
+
+def fetch(check, cursor, refresh):
+    relations_config = check._build_relations_config(RELATIONS)
+    results = check._fetch_relations(mock.MagicMock(), cursor, refresh, RELATIONS, relations_config,
+                                     ProgrammingError)
+    return dict((scope['query'], [row[0] for row in rows]) for scope, _, rows, _ in results)
+
+
+def submit(check, cursor, refresh):
+    relations_config = check._build_relations_config(RELATIONS)
+    results = check._fetch_relations(mock.MagicMock(), cursor, refresh, RELATIONS, relations_config,
+                                     ProgrammingError)
+    for scope, cols, rows, query in results:
+        check._submit_results(scope, cols, rows, query, [], RELATIONS, False, relations_config)
+
+
+def queried_tables(cursor):
+    queries = cursor.queries
+    cursor.queries = []
+    return sorted(table for table in cursor.tables for q in queries if table in q)
+
+
+@pytest.mark.unit
+def test_update_counters():
+    refresh = RelationsRefresh()
+
+    assert refresh.update_counters(REL_COLS, [rel_row('persons', 1), rel_row('breed', 1)]) == {'persons', 'breed'}
+    assert refresh.update_counters(REL_COLS, [rel_row('persons', 1), rel_row('breed', 3)]) == {'breed'}
+    assert refresh.update_counters(REL_COLS, [rel_row('persons', 1), rel_row('breed', 3)]) == set()
+    # Relations that are only read from
+    assert refresh.update_counters(REL_COLS, [rel_row('persons', 1, 2), rel_row('breed', 3)]) == {'persons'}
+
+
+@pytest.mark.unit
+def test_is_full_refresh():
+    refresh = RelationsRefresh(refresh_interval=60)
+
+    assert refresh.is_full_refresh(now=1000)
+    assert not refresh.is_full_refresh(now=1059)
+    assert refresh.is_full_refresh(now=1060)
+
+
+@pytest.mark.unit
+def test_fetch_relations_tiers(cursor):
+    check = PostgreSql('postgres', {}, {})
+    refresh = RelationsRefresh(refresh_interval=3600)
+
+    fetch(check, cursor, refresh)
+    assert queried_tables(cursor) == ['pg_class', 'pg_stat_user_indexes', 'pg_stat_user_tables',
+                                      'pg_statio_user_tables']
+
+    # Nothing changed, only pg_stat_user_tables is queried, the other metrics are served from the cache
+    results = fetch(check, cursor, refresh)
+    assert queried_tables(cursor) == ['pg_stat_user_tables']
+    assert sorted(results[PostgreSql.SIZE_METRICS['query']]) == sorted(RELATIONS)
+    assert results[PostgreSql.IDX_METRICS['query']] == ['breed']
+    assert sorted(results[PostgreSql.STATIO_METRICS['query']]) == sorted(RELATIONS)
+
+    # Only the relation that changed is queried
+    cursor.tables['pg_stat_user_tables'][1] = rel_row('breed', 6)
+    results = fetch(check, cursor, refresh)
+    statio_query = [q for q in cursor.queries if 'pg_statio_user_tables' in q][0]
+    assert "'breed'" in statio_query and "'persons'" not in statio_query
+    assert queried_tables(cursor) == ['pg_stat_user_indexes', 'pg_stat_user_tables', 'pg_statio_user_tables']
+    assert sorted(results[PostgreSql.STATIO_METRICS['query']]) == sorted(RELATIONS)
+    assert sorted(results[PostgreSql.SIZE_METRICS['query']]) == sorted(RELATIONS)
+
+    # Relations that are only read from are queried too
+    cursor.tables['pg_stat_user_tables'][0] = rel_row('persons', 10, seq_scan=1)
+    fetch(check, cursor, refresh)
+    statio_query = [q for q in cursor.queries if 'pg_statio_user_tables' in q][0]
+    assert "'persons'" in statio_query and "'breed'" not in statio_query
+
+    # Relations that were dropped are no longer served from the cache
+    del cursor.tables['pg_stat_user_tables'][2]
+    results = fetch(check, cursor, refresh)
+    assert sorted(results[PostgreSql.STATIO_METRICS['query']]) == ['breed', 'persons']
+
+
+@pytest.mark.unit
+def test_fetch_relations_cached_rates(aggregator, cursor):
+    check = PostgreSql('postgres', {}, {})
+    refresh = RelationsRefresh(refresh_interval=3600)
+
+    submit(check, cursor, refresh)
+    aggregator.assert_metric('postgresql.heap_blocks_read', count=3)
+    aggregator.assert_metric('postgresql.table_size', count=3)
+    aggregator.reset()
+
+    # The relations that didn't change are submitted with their cached counters, for a rate of 0
+    cursor.tables['pg_stat_user_tables'][1] = rel_row('breed', 6)
+    cursor.tables['pg_statio_user_tables'][1] = ['breed', 'public'] + [7] * 8
+    submit(check, cursor, refresh)
+    aggregator.assert_metric('postgresql.heap_blocks_read', count=3)
+    aggregator.assert_metric('postgresql.heap_blocks_read', value=7, count=1, tags=['table:breed', 'schema:public'])
+    aggregator.assert_metric('postgresql.heap_blocks_read', value=0, count=1, tags=['table:persons', 'schema:public'])
+    aggregator.assert_metric('postgresql.index_scans', count=1,
+                             tags=['table:breed', 'schema:public', 'index:breed_names'])
+    aggregator.assert_metric('postgresql.table_size', count=3)
+
+
+@pytest.mark.unit
+def test_fetch_relations_busiest(cursor):
+    check = PostgreSql('postgres', {}, {})
+    refresh = RelationsRefresh(max_relations=2)
+
+    results = fetch(check, cursor, refresh)
+    for relnames in results.values():
+        assert 'kennel' not in relnames
+    assert sorted(results[PostgreSql.REL_METRICS['query']]) == ['breed', 'persons']
+
+    # The busiest relations are the ones with the most rows written since the previous run
+    cursor.tables['pg_stat_user_tables'] = [rel_row('persons', 10), rel_row('breed', 6), rel_row('kennel', 5)]
+    results = fetch(check, cursor, refresh)
+    assert sorted(results[PostgreSql.REL_METRICS['query']]) == ['breed', 'kennel']
+    assert sorted(results[PostgreSql.SIZE_METRICS['query']]) == ['breed', 'kennel']
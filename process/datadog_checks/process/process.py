@@ -7,6 +7,7 @@
 from collections import defaultdict
 import time
 import os
+import re
 import subprocess
 
 # 3p
@@ -15,12 +16,19 @@ import psutil
 # project
 from datadog_checks.checks import AgentCheck
 from datadog_checks.config import _is_affirmative
+from datadog_checks.utils.executor import BoundedExecutor
 from datadog_checks.utils.platform import Platform
 
+from .process_table import get_process_table
+from .procfs import read_process_stats
+
 
 DEFAULT_AD_CACHE_DURATION = 120
 DEFAULT_PID_CACHE_DURATION = 120
 
+# Below this number of processes, the stats of an instance are collected from a single thread
+SHARDING_MIN_PROCESSES = 500
+
 
 ATTR_TO_METRIC = {
     'thr':              'threads',
@@ -96,6 +104,11 @@ class ProcessCheck(AgentCheck):
 
         # Process cache, indexed by instance
         self.process_cache = defaultdict(dict)
+        # Timestamp and CPU time of the processes read from procfs at the previous run, indexed by instance
+        self.cpu_samples = defaultdict(dict)
+
+        # Regexes matching the command lines, by search strings
+        self.cmdline_patterns = {}
 
     def should_refresh_ad_cache(self, name):
         now = time.time()
@@ -121,50 +134,56 @@ class ProcessCheck(AgentCheck):
 
         matching_pids = set()
 
-        for proc in psutil.process_iter():
+        # The process table is shared by the instances, the processes are matched
+        # in a single pass over the table instead of once per search string
+        process_table = get_process_table()
+        ignore_case = os.name == 'nt'
+        # FIXME 6.x: All has been deprecated
+        # from the doc, should be removed
+        if 'All' in search_string:
+            entries = process_table.entries
+
+            def is_match(entry):
+                return True
+        elif exact_match:
+            # Only the processes with one of the names, or whose name couldn't be read, need to be looked at
+            by_name, unnamed = process_table.name_index(ignore_case)
+            names = set(s.lower() if ignore_case else s for s in search_string)
+            entries = [entry for n in names for entry in by_name.get(n, [])] + unnamed
+            if refresh_ad_cache:
+                self.ad_cache.intersection_update(entry.pid for entry in unnamed)
+
+            def is_match(entry):
+                entry_name = entry.name()
+                return (entry_name.lower() if ignore_case else entry_name) in names
+        else:
+            entries = process_table.entries
+            pattern = self._get_cmdline_pattern(search_string, ignore_case)
+
+            def is_match(entry):
+                return pattern.search(entry.cmdline()) is not None
+
+        for entry in entries:
             # Skip access denied processes
-            if not refresh_ad_cache and proc.pid in self.ad_cache:
+            if not refresh_ad_cache and entry.pid in self.ad_cache:
                 continue
 
-            found = False
-            for string in search_string:
-                try:
-                    # FIXME 6.x: All has been deprecated
-                    # from the doc, should be removed
-                    if string == 'All':
-                        found = True
-                    if exact_match:
-                        if os.name == 'nt':
-                            if proc.name().lower() == string.lower():
-                                found = True
-                        else:
-                            if proc.name() == string:
-                                found = True
-
-                    else:
-                        cmdline = proc.cmdline()
-                        if os.name == 'nt':
-                            lstring = string.lower()
-                            if lstring in ' '.join(cmdline).lower():
-                                found = True
-                        else:
-                            if string in ' '.join(cmdline):
-                                found = True
-                except psutil.NoSuchProcess:
-                    self.log.warning('Process disappeared while scanning')
-                except psutil.AccessDenied as e:
-                    ad_error_logger('Access denied to process with PID {}'.format(proc.pid))
-                    ad_error_logger('Error: {}'.format(e))
-                    if refresh_ad_cache:
-                        self.ad_cache.add(proc.pid)
-                    if not ignore_ad:
-                        raise
-                else:
-                    if refresh_ad_cache:
-                        self.ad_cache.discard(proc.pid)
-                    if found:
-                        matching_pids.add(proc.pid)
-                        break
+            try:
+                found = is_match(entry)
+            except psutil.NoSuchProcess:
+                self.log.warning('Process disappeared while scanning')
+            except psutil.AccessDenied as e:
+                ad_error_logger('Access denied to process with PID {}'.format(entry.pid))
+                ad_error_logger('Error: {}'.format(e))
+                if refresh_ad_cache:
+                    self.ad_cache.add(entry.pid)
+                if not ignore_ad:
+                    raise
+            else:
+                if refresh_ad_cache:
+                    self.ad_cache.discard(entry.pid)
+                if found:
+                    matching_pids.add(entry.pid)
 
         self.pid_cache[name] = matching_pids
         self.last_pid_cache_ts[name] = time.time()
@@ -172,6 +191,18 @@ class ProcessCheck(AgentCheck):
             self.last_ad_cache_ts[name] = time.time()
         return matching_pids
 
+    def _get_cmdline_pattern(self, search_string, ignore_case):
+        """Return a regex matching the command lines containing one of the search strings."""
+        key = (tuple(search_string), ignore_case)
+        pattern = self.cmdline_patterns.get(key)
+        if pattern is None:
+            pattern = re.compile(
+                '|'.join(re.escape(string) for string in search_string),
+                re.IGNORECASE if ignore_case else 0
+            )
+            self.cmdline_patterns[key] = pattern
+        return pattern
+
     def psutil_wrapper(self, process, method, accessors, try_sudo, *args, **kwargs):
         """
         A psutil wrapper that is calling
@@ -225,10 +256,12 @@ class ProcessCheck(AgentCheck):
                     self.log.exception("trying to retrieve {} with sudo also failed".format(method))
         except psutil.NoSuchProcess:
             self.warning("Process {} disappeared while scanning".format(process.pid))
+        except EnvironmentError as e:
+            self.log.debug("psutil method {} failed: {}".format(method, e))
 
         return result
 
-    def get_process_state(self, name, pids, try_sudo):
+    def get_process_state(self, name, pids, try_sudo, collection_workers=1):
         st = defaultdict(list)
 
         # Remove from cache the processes that are not in `pids`
@@ -236,7 +269,9 @@ class ProcessCheck(AgentCheck):
         pids_to_remove = cached_pids - pids
         for pid in pids_to_remove:
             del self.process_cache[name][pid]
+            self.cpu_samples[name].pop(pid, None)
 
+        processes = []
         for pid in pids:
             st['pids'].append(pid)
 
@@ -254,90 +289,130 @@ class ProcessCheck(AgentCheck):
                     self.last_pid_cache_ts[name] = 0
                     continue
 
-            p = self.process_cache[name][pid]
+            processes.append((self.process_cache[name][pid], new_process))
 
-            meminfo = self.psutil_wrapper(p, 'memory_info', ['rss', 'vms'], try_sudo)
-            st['rss'].append(meminfo.get('rss'))
-            st['vms'].append(meminfo.get('vms'))
+        # Shared by all the processes, None if they can't be read, e.g. from a relocated procfs
+        cpu_count = self.psutil_wrapper(psutil, 'cpu_count', None, try_sudo)
+        total_memory = self.psutil_wrapper(psutil, 'virtual_memory', ['total'], try_sudo).get('total')
 
-            mem_percent = self.psutil_wrapper(p, 'memory_percent', None, try_sudo)
-            st['mem_pct'].append(mem_percent)
+        if collection_workers > 1 and len(processes) >= SHARDING_MIN_PROCESSES:
+            # Each worker collects the stats of a shard of the processes,
+            # the /proc reads release the GIL
+            shards = [(processes[i::collection_workers], try_sudo, cpu_count, total_memory, self.cpu_samples[name])
+                      for i in range(collection_workers)]
+            executor = BoundedExecutor(collection_workers, name='process')
+            results = executor.map(self._get_processes_stats, shards)
+        else:
+            results = [self._get_processes_stats(processes, try_sudo, cpu_count, total_memory, self.cpu_samples[name])]
 
-            # will fail on win32 and solaris
-            shared_mem = self.psutil_wrapper(p, 'memory_info_ex', ['shared'], try_sudo).get('shared')
-            if shared_mem is not None and meminfo.get('rss') is not None:
-                st['real'].append(meminfo['rss'] - shared_mem)
-            else:
-                st['real'].append(None)
+        for shard_st in results:
+            for attr, values in shard_st.iteritems():
+                st[attr].extend(values)
 
-            ctxinfo = self.psutil_wrapper(p, 'num_ctx_switches', ['voluntary', 'involuntary'], try_sudo)
-            st['ctx_swtch_vol'].append(ctxinfo.get('voluntary'))
-            st['ctx_swtch_invol'].append(ctxinfo.get('involuntary'))
+        return st
 
-            st['thr'].append(self.psutil_wrapper(p, 'num_threads', None, try_sudo))
+    def _get_processes_stats(self, processes, try_sudo, cpu_count, total_memory, cpu_samples):
+        st = defaultdict(list)
+        for p, new_process in processes:
+            self._get_process_stats(st, p, new_process, try_sudo, cpu_count, total_memory, cpu_samples)
+        return st
 
-            cpu_percent = self.psutil_wrapper(p, 'cpu_percent', None, try_sudo)
-            cpu_count = psutil.cpu_count()
-            if not new_process:
-                # psutil returns `0.` for `cpu_percent` the
-                # first time it's sampled on a process,
-                # so save the value only on non-new processes
-                st['cpu'].append(cpu_percent)
-                if cpu_count > 0 and cpu_percent is not None:
-                    st['cpu_norm'].append(cpu_percent/cpu_count)
-                else:
-                    self.log.debug('could not calculate the normalized '
-                                   'cpu pct, cpu_count: {}'.format(cpu_count))
-            st['open_fd'].append(self.psutil_wrapper(p, 'num_fds', None, try_sudo))
-            st['open_handle'].append(self.psutil_wrapper(p, 'num_handles', None, try_sudo))
+    def _get_process_stats(self, st, p, new_process, try_sudo, cpu_count, total_memory, cpu_samples):
+        # `shared` is part of memory_info on Linux, memory_info_ex would read `/proc/<pid>/statm` again
+        meminfo = self.psutil_wrapper(p, 'memory_info', ['rss', 'vms', 'shared'], try_sudo)
+        rss = meminfo.get('rss')
+        st['rss'].append(rss)
+        st['vms'].append(meminfo.get('vms'))
+
+        # Same as `memory_percent`, without reading the memory info again
+        if rss is not None and total_memory:
+            st['mem_pct'].append(rss * 100.0 / total_memory)
+        else:
+            st['mem_pct'].append(None)
+
+        shared_mem = meminfo.get('shared')
+        if shared_mem is not None and rss is not None:
+            st['real'].append(rss - shared_mem)
+        else:
+            st['real'].append(None)
 
+        proc_stats = None
+        if Platform.is_linux():
+            # `/proc/<pid>/stat`, `status` and `io` are read and parsed once for all the stats below,
+            # instead of once per psutil method
+            proc_stats = read_process_stats(psutil.PROCFS_PATH, p.pid)
+
+        if proc_stats is not None:
+            ctxinfo = {'voluntary': proc_stats.ctx_switches_vol, 'involuntary': proc_stats.ctx_switches_invol}
+            num_threads = proc_stats.num_threads
+            cpu_percent = self._get_cpu_percent(cpu_samples, p.pid, proc_stats.cpu_time, new_process)
+            ioinfo = {
+                'read_count': proc_stats.read_count,
+                'write_count': proc_stats.write_count,
+                'read_bytes': proc_stats.read_bytes,
+                'write_bytes': proc_stats.write_bytes,
+            }
+            pagefault_stats = (proc_stats.minflt, proc_stats.cminflt, proc_stats.majflt, proc_stats.cmajflt)
+        else:
+            ctxinfo = self.psutil_wrapper(p, 'num_ctx_switches', ['voluntary', 'involuntary'], try_sudo)
+            num_threads = self.psutil_wrapper(p, 'num_threads', None, try_sudo)
+            cpu_percent = self.psutil_wrapper(p, 'cpu_percent', None, try_sudo)
             ioinfo = self.psutil_wrapper(p, 'io_counters',
                                          ['read_count', 'write_count', 'read_bytes', 'write_bytes'], try_sudo)
-            st['r_count'].append(ioinfo.get('read_count'))
-            st['w_count'].append(ioinfo.get('write_count'))
-            st['r_bytes'].append(ioinfo.get('read_bytes'))
-            st['w_bytes'].append(ioinfo.get('write_bytes'))
-
-            pagefault_stats = self.get_pagefault_stats(pid)
-            if pagefault_stats is not None:
-                (minflt, cminflt, majflt, cmajflt) = pagefault_stats
-                st['minflt'].append(minflt)
-                st['cminflt'].append(cminflt)
-                st['majflt'].append(majflt)
-                st['cmajflt'].append(cmajflt)
-            else:
-                st['minflt'].append(None)
-                st['cminflt'].append(None)
-                st['majflt'].append(None)
-                st['cmajflt'].append(None)
-
-            # calculate process run time
-            create_time = self.psutil_wrapper(p, 'create_time', None, try_sudo)
-            if create_time is not None:
-                now = time.time()
-                run_time = now - create_time
-                st['run_time'].append(run_time)
+            pagefault_stats = (None, None, None, None)
 
-        return st
+        st['ctx_swtch_vol'].append(ctxinfo.get('voluntary'))
+        st['ctx_swtch_invol'].append(ctxinfo.get('involuntary'))
 
-    def get_pagefault_stats(self, pid):
-        if not Platform.is_linux():
-            return None
+        st['thr'].append(num_threads)
 
-        def file_to_string(path):
-            with open(path, 'r') as f:
-                res = f.read()
-            return res
+        if not new_process:
+            # psutil returns `0.` for `cpu_percent` the
+            # first time it's sampled on a process,
+            # so save the value only on non-new processes
+            st['cpu'].append(cpu_percent)
+            if cpu_count > 0 and cpu_percent is not None:
+                st['cpu_norm'].append(cpu_percent/cpu_count)
+            else:
+                self.log.debug('could not calculate the normalized '
+                               'cpu pct, cpu_count: {}'.format(cpu_count))
+        st['open_fd'].append(self.psutil_wrapper(p, 'num_fds', None, try_sudo))
+        st['open_handle'].append(self.psutil_wrapper(p, 'num_handles', None, try_sudo))
+
+        st['r_count'].append(ioinfo.get('read_count'))
+        st['w_count'].append(ioinfo.get('write_count'))
+        st['r_bytes'].append(ioinfo.get('read_bytes'))
+        st['w_bytes'].append(ioinfo.get('write_bytes'))
+
+        (minflt, cminflt, majflt, cmajflt) = pagefault_stats
+        st['minflt'].append(minflt)
+        st['cminflt'].append(cminflt)
+        st['majflt'].append(majflt)
+        st['cmajflt'].append(cmajflt)
+
+        # calculate process run time
+        create_time = self.psutil_wrapper(p, 'create_time', None, try_sudo)
+        if create_time is not None:
+            now = time.time()
+            run_time = now - create_time
+            st['run_time'].append(run_time)
+
+    def _get_cpu_percent(self, cpu_samples, pid, cpu_time, new_process):
+        """
+        Same as psutil's `cpu_percent`, from the CPU time read in `/proc/<pid>/stat`: the CPU time
+        used by the process since the previous run, in percent of the time elapsed since then.
+        """
+        if cpu_time is None:
+            cpu_samples.pop(pid, None)
+            return None
 
-        # http://man7.org/linux/man-pages/man5/proc.5.html
-        try:
-            data = file_to_string('/{}/{}/stat'.format(psutil.PROCFS_PATH, pid))
-        except Exception:
-            self.log.debug('error getting proc stats: file_to_string failed',
-                           'for /{}/{}/stat'.format(psutil.PROCFS_PATH, pid))
+        now = time.time()
+        previous = None if new_process else cpu_samples.get(pid)
+        cpu_samples[pid] = (now, cpu_time)
+        if previous is None or now <= previous[0]:
             return None
 
-        return map(lambda i: int(i), data.split()[9:13])
+        return round((cpu_time - previous[1]) * 100 / (now - previous[0]), 1)
 
     def _get_child_processes(self, pids):
         children_pids = set()
@@ -363,6 +438,7 @@ class ProcessCheck(AgentCheck):
         collect_children = _is_affirmative(instance.get('collect_children', False))
         user = instance.get('user', False)
         try_sudo = instance.get('try_sudo', False)
+        collection_workers = int(instance.get('collection_workers', 1))
 
         if self._conflicting_procfs:
             self.warning('The `procfs_path` defined in `process.yaml is different from the one defined in '
@@ -413,7 +489,7 @@ class ProcessCheck(AgentCheck):
         if user:
             pids = self._filter_by_user(user, pids)
 
-        proc_state = self.get_process_state(name, pids, try_sudo)
+        proc_state = self.get_process_state(name, pids, try_sudo, collection_workers)
 
         # FIXME 6.x remove the `name` tag
         tags.extend(['process_name:{}'.format(name), name])
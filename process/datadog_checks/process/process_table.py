@@ -0,0 +1,88 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+"""
+Snapshot of the process table, shared by the instances of the process check.
+"""
+from collections import defaultdict
+import threading
+import time
+
+import psutil
+
+# Instances matching their processes within this number of seconds share the same snapshot,
+# this must stay below the collection interval
+PROCESS_TABLE_MAX_AGE = 5
+
+_process_table = None
+_process_table_lock = threading.Lock()
+
+
+def get_process_table(max_age=PROCESS_TABLE_MAX_AGE):
+    """Return the latest snapshot of the process table if it was taken less than `max_age` seconds ago."""
+    global _process_table
+    with _process_table_lock:
+        if _process_table is None or time.time() - _process_table.timestamp > max_age:
+            _process_table = ProcessTable(psutil.process_iter())
+        return _process_table
+
+
+class ProcessEntry(object):
+    """
+    A process of the snapshot. Its name and command line are read from the system the first time
+    they're needed, and then shared by all the instances. Errors aren't kept, the next call tries again.
+    """
+    __slots__ = ('pid', 'process', '_name', '_cmdline')
+
+    def __init__(self, process):
+        self.pid = process.pid
+        self.process = process
+        self._name = None
+        self._cmdline = None
+
+    def name(self):
+        if self._name is None:
+            self._name = self.process.name()
+        return self._name
+
+    def cmdline(self):
+        """Return the command line, its arguments joined by spaces."""
+        if self._cmdline is None:
+            self._cmdline = ' '.join(self.process.cmdline())
+        return self._cmdline
+
+
+class ProcessTable(object):
+    """
+    Processes running at `timestamp`, with an index of their names built the first time
+    an instance looks processes up by name.
+    """
+    def __init__(self, processes, timestamp=None):
+        self.entries = [ProcessEntry(p) for p in processes]
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self._name_indexes = {}
+        self._lock = threading.Lock()
+
+    def name_index(self, ignore_case=False):
+        """
+        Return a dict of the entries by name, lowercased if `ignore_case`,
+        and the list of the entries whose name couldn't be read.
+        """
+        with self._lock:
+            index = self._name_indexes.get(ignore_case)
+            if index is None:
+                index = self._name_indexes[ignore_case] = self._build_name_index(ignore_case)
+            return index
+
+    def _build_name_index(self, ignore_case):
+        by_name = defaultdict(list)
+        unnamed = []
+        for entry in self.entries:
+            try:
+                name = entry.name()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                unnamed.append(entry)
+                continue
+            by_name[name.lower() if ignore_case else name].append(entry)
+
+        return by_name, unnamed
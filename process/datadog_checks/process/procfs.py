@@ -0,0 +1,85 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+"""
+Stats of a process read straight from its procfs directory, Linux only.
+
+psutil reads and parses `/proc/<pid>/stat` and `status` again for each of its methods,
+its `oneshot` context caching them is only available with psutil 5.0+.
+"""
+from collections import namedtuple
+import os
+
+try:
+    CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+except (AttributeError, ValueError):
+    CLOCK_TICKS = None
+
+# The stats read from a file that can't be read, e.g. `io` of a process of another user, are None
+ProcessStats = namedtuple('ProcessStats', [
+    'cpu_time', 'num_threads', 'minflt', 'cminflt', 'majflt', 'cmajflt',
+    'ctx_switches_vol', 'ctx_switches_invol',
+    'read_count', 'write_count', 'read_bytes', 'write_bytes',
+])
+
+# Fields of `/proc/<pid>/status` and `io`, by name of the stat
+STATUS_FIELDS = {
+    'voluntary_ctxt_switches': 'ctx_switches_vol',
+    'nonvoluntary_ctxt_switches': 'ctx_switches_invol',
+}
+IO_FIELDS = {
+    'syscr': 'read_count',
+    'syscw': 'write_count',
+    'read_bytes': 'read_bytes',
+    'write_bytes': 'write_bytes',
+}
+
+
+def read_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except EnvironmentError:
+        return None
+
+
+def read_process_stats(procfs_path, pid):
+    """
+    Read the stats of the process from its `stat`, `status` and `io` files, each of them once.
+    Return None if `stat` can't be read, e.g. if the process is gone.
+    """
+    root = os.path.join(procfs_path, str(pid))
+    stat = read_file(os.path.join(root, 'stat'))
+    if stat is None:
+        return None
+
+    stats = dict.fromkeys(ProcessStats._fields)
+    # The command name can contain spaces and parentheses, the fields start after the last one
+    fields = stat[stat.rfind(')') + 2:].split()
+    try:
+        stats['minflt'], stats['cminflt'], stats['majflt'], stats['cmajflt'] = [int(f) for f in fields[7:11]]
+        if CLOCK_TICKS:
+            stats['cpu_time'] = (int(fields[11]) + int(fields[12])) / float(CLOCK_TICKS)
+        stats['num_threads'] = int(fields[17])
+    except (IndexError, ValueError):
+        pass
+
+    _parse_fields(read_file(os.path.join(root, 'status')), STATUS_FIELDS, stats)
+    _parse_fields(read_file(os.path.join(root, 'io')), IO_FIELDS, stats)
+
+    return ProcessStats(**stats)
+
+
+def _parse_fields(data, names, stats):
+    """Set the stats of `names` from the `name: value` lines of `data`."""
+    if data is None:
+        return
+
+    for line in data.splitlines():
+        name, _, value = line.partition(':')
+        stat = names.get(name)
+        if stat is not None:
+            try:
+                stats[stat] = int(value)
+            except ValueError:
+                pass
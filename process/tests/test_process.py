@@ -2,11 +2,14 @@
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
 
+from collections import namedtuple
 import contextlib
 import os
 from mock import patch, MagicMock
 import psutil
 from datadog_checks.process import ProcessCheck
+from datadog_checks.process import process_table, procfs
+from datadog_checks.utils.platform import Platform
 import common
 import pytest
 
@@ -41,6 +44,11 @@ def get_psutil_proc():
     return psutil.Process(os.getpid())
 
 
+@pytest.fixture(autouse=True)
+def reset_process_table():
+    process_table._process_table = None
+
+
 @pytest.fixture
 def aggregator():
     from datadog_checks.stubs import aggregator
@@ -352,3 +360,145 @@ def test_relocated_procfs(aggregator):
     expected_tags = generate_expected_tags(config['instances'][0])
     expected_tags += ['process:moved_procfs']
     aggregator.assert_service_check('process.up', count=1, tags=expected_tags)
+    # The memory of the system can't be read from the relocated procfs
+    assert 'system.processes.mem.pct' not in aggregator.metric_names
+
+
+class NamedProcess(object):
+    def __init__(self, pid, name, cmdline):
+        self.pid = pid
+        self._name = name
+        self._cmdline = cmdline
+        self.calls = 0
+
+    def name(self):
+        self.calls += 1
+        return self._name
+
+    def cmdline(self):
+        self.calls += 1
+        return self._cmdline
+
+
+def named_processes():
+    return [
+        NamedProcess(1, 'nginx', ['nginx: master process', '/usr/sbin/nginx']),
+        NamedProcess(2, 'nginx', ['nginx: worker process']),
+        NamedProcess(3, 'python', ['python', '/opt/app/manage.py', 'runserver']),
+        NamedProcess(4, 'gunicorn', ['/usr/bin/python', '/usr/bin/gunicorn', 'app:wsgi']),
+    ]
+
+
+def test_find_pids_shared_process_table(aggregator):
+    processes = named_processes()
+    process = ProcessCheck(common.CHECK_NAME, {}, {})
+
+    with patch('psutil.process_iter', return_value=processes) as process_iter:
+        assert process.find_pids('web', ['nginx'], True) == {1, 2}
+        assert process.find_pids('app', ['gunicorn', 'python'], True) == {3, 4}
+        assert process.find_pids('django', ['manage.py', 'app:wsgi'], False) == {3, 4}
+        assert process.find_pids('workers', ['worker process'], False) == {2}
+
+    # The process table is read once, and each process is asked its name and command line once
+    assert process_iter.call_count == 1
+    assert [p.calls for p in processes] == [2, 2, 2, 2]
+
+
+def test_find_pids_shared_process_table_refresh(aggregator):
+    process = ProcessCheck(common.CHECK_NAME, {}, {})
+
+    with patch('psutil.process_iter', return_value=named_processes()) as process_iter:
+        process.find_pids('web', ['nginx'], True)
+        process_table._process_table.timestamp -= process_table.PROCESS_TABLE_MAX_AGE + 1
+        process.find_pids('app', ['python'], True)
+
+    assert process_iter.call_count == 2
+
+
+class StatsProcess(object):
+    """Process returning the same memory stats for every pid, the others are read from procfs."""
+    def __init__(self, pid):
+        self.pid = pid
+
+    def is_running(self):
+        return True
+
+    def memory_info(self):
+        return namedtuple('pmem', 'rss vms shared')(100, 200, 40)
+
+    def num_fds(self):
+        return 5
+
+    def create_time(self):
+        return 0
+
+
+def write_process_stats(procfs, pid, cpu_ticks, comm='web server'):
+    proc_root = procfs.ensure(str(pid), dir=True)
+    # Fields after the command name: state, ..., minflt (7) to cmajflt (10), utime, stime, ..., num_threads (17)
+    fields = ['S'] + ['1'] * 6 + ['1', '2', '3', '4', str(cpu_ticks), '0'] + ['0'] * 4 + ['2'] + ['0'] * 30
+    proc_root.join('stat').write('{} ({}) {}\n'.format(pid, comm, ' '.join(fields)))
+    proc_root.join('status').write('Name:\tweb\nThreads:\t2\nvoluntary_ctxt_switches:\t3\n'
+                                   'nonvoluntary_ctxt_switches:\t4\n')
+    proc_root.join('io').write('rchar: 10\nwchar: 20\nsyscr: 1\nsyscw: 2\nread_bytes: 3\nwrite_bytes: 4\n'
+                               'cancelled_write_bytes: 0\n')
+
+
+@pytest.mark.parametrize('collection_workers', [1, 4])
+def test_get_process_state(collection_workers, aggregator, tmpdir):
+    process = ProcessCheck(common.CHECK_NAME, {}, {})
+    pids = set(range(1, 601))
+    now = [1000.0]
+
+    with patch('psutil.Process', side_effect=StatsProcess), \
+            patch.object(psutil, 'PROCFS_PATH', str(tmpdir)), \
+            patch.object(Platform, 'is_linux', return_value=True), \
+            patch('datadog_checks.process.process.time', MagicMock(time=lambda: now[0])), \
+            patch('psutil.virtual_memory', return_value=MagicMock(total=1000)), \
+            patch('datadog_checks.process.procfs.read_file', side_effect=procfs.read_file) as read_file:
+        for pid in pids:
+            write_process_stats(tmpdir, pid, 0)
+        process.get_process_state('web', pids, False, collection_workers)
+
+        # 1 second of CPU time over 10 seconds
+        for pid in pids:
+            write_process_stats(tmpdir, pid, procfs.CLOCK_TICKS)
+        now[0] += 10
+        st = process.get_process_state('web', pids, False, collection_workers)
+
+    assert sorted(st['pids']) == sorted(pids)
+    assert sum(st['rss']) == 600 * 100
+    assert sum(st['real']) == 600 * 60
+    assert sum(st['mem_pct']) == 600 * 10.0
+    assert sum(st['thr']) == 600 * 2
+    assert sum(st['ctx_swtch_invol']) == 600 * 4
+    assert sum(st['cpu']) == 600 * 10.0
+    assert sum(st['r_bytes']) == 600 * 3
+    assert sum(st['w_count']) == 600 * 2
+    assert sum(st['cmajflt']) == 600 * 4
+    # `stat`, `status` and `io` are read once per process and run
+    assert len(read_file.call_args_list) == 2 * 600 * 3
+
+
+def test_read_process_stats(tmpdir):
+    write_process_stats(tmpdir, 42, 3 * procfs.CLOCK_TICKS, comm='my (odd) cmd')
+    stats = procfs.read_process_stats(str(tmpdir), 42)
+
+    assert stats.cpu_time == 3.0
+    assert stats.num_threads == 2
+    assert (stats.minflt, stats.cminflt, stats.majflt, stats.cmajflt) == (1, 2, 3, 4)
+    assert (stats.ctx_switches_vol, stats.ctx_switches_invol) == (3, 4)
+    assert (stats.read_count, stats.write_count, stats.read_bytes, stats.write_bytes) == (1, 2, 3, 4)
+
+
+def test_read_process_stats_unreadable(tmpdir):
+    # `io` can't be read for the processes of other users
+    write_process_stats(tmpdir, 42, 0)
+    tmpdir.join('42', 'io').remove()
+    stats = procfs.read_process_stats(str(tmpdir), 42)
+
+    assert stats.num_threads == 2
+    assert stats.read_bytes is None and stats.write_count is None
+
+    # The process is gone
+    assert procfs.read_process_stats(str(tmpdir), 43) is None
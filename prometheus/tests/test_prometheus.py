@@ -47,7 +47,7 @@ def poll_mock():
     g3.labels(matched_label="foobar", node="host2", timestamp="456").set(float('inf'))
 
     poll_mock = mock.patch(
-        'requests.get',
+        'requests.Session.get',
         return_value=mock.MagicMock(
             status_code=200,
             iter_lines=lambda **kwargs: generate_latest(registry).split("\n"),
@@ -17,6 +17,7 @@ from requests.exceptions import RequestException
 # project
 from checks import AgentCheck
 from config import _is_affirmative
+from datadog_checks.utils.http import HTTPClient
 
 EVENT_TYPE = SOURCE_TYPE_NAME = 'rabbitmq'
 EXCHANGE_TYPE = 'exchanges'
@@ -146,6 +147,8 @@ class RabbitMQ(AgentCheck):
         AgentCheck.__init__(self, name, init_config, agentConfig, instances)
         self.already_alerted = []
         self.cached_vhosts = {} # this is used to send CRITICAL rabbitmq.aliveness check if the server goes down
+        # HTTP sessions keeping the connections to the management API alive across runs, by instance
+        self.sessions = {}
 
     def _get_config(self, instance):
         # make sure 'rabbitmq_api_url' is present and get parameters
@@ -212,7 +215,8 @@ class RabbitMQ(AgentCheck):
             # Fetch a list of _all_ vhosts from the API.
             vhosts_url = urlparse.urljoin(base_url, 'vhosts')
             vhost_proxy = self.get_instance_proxy(instance, vhosts_url)
-            vhosts_response = self._get_data(vhosts_url, auth=auth, ssl_verify=ssl_verify, proxies=vhost_proxy)
+            vhosts_response = self._get_data(vhosts_url, auth=auth, ssl_verify=ssl_verify, proxies=vhost_proxy,
+                                             instance=instance)
             vhosts = [v['name'] for v in vhosts_response]
 
         return vhosts
@@ -255,11 +259,19 @@ class RabbitMQ(AgentCheck):
             for vhost in self.cached_vhosts.get(base_url, []):
                 self.service_check('rabbitmq.aliveness', AgentCheck.CRITICAL, ['vhost:%s' % vhost] + custom_tags, message=u"Could not contact aliveness API")
 
-    def _get_data(self, url, auth=None, ssl_verify=True, proxies=None):
+    def _get_session(self, instance):
+        key = (instance.get('rabbitmq_api_url'), instance.get('rabbitmq_user', 'guest'))
+        if key not in self.sessions:
+            self.sessions[key] = HTTPClient.from_config(instance, self.init_config).session
+        return self.sessions[key]
+
+    def _get_data(self, url, auth=None, ssl_verify=True, proxies=None, instance=None):
         if proxies is None:
             proxies = {}
+        session = self._get_session(instance or {})
         try:
-            r = requests.get(url, auth=auth, proxies=proxies, timeout=self.default_integration_http_timeout, verify=ssl_verify)
+            r = session.get(url, auth=auth, proxies=proxies, timeout=self.default_integration_http_timeout,
+                            verify=ssl_verify)
             r.raise_for_status()
             return r.json()
         except RequestException as e:
@@ -351,12 +363,12 @@ class RabbitMQ(AgentCheck):
                 url = '{}/{}'.format(object_type, urllib.quote_plus(vhost))
                 try:
                     data += self._get_data(urlparse.urljoin(base_url, url), auth=auth,
-                                           ssl_verify=ssl_verify, proxies=instance_proxy)
+                                           ssl_verify=ssl_verify, proxies=instance_proxy, instance=instance)
                 except Exception as e:
                     self.log.debug("Couldn't grab queue data from vhost, {}: {}".format(vhost, e))
         else:
             data = self._get_data(urlparse.urljoin(base_url, object_type), auth=auth,
-                                  ssl_verify=ssl_verify, proxies=instance_proxy)
+                                  ssl_verify=ssl_verify, proxies=instance_proxy, instance=instance)
 
         """ data is a list of nodes or queues:
         data = [
@@ -419,7 +431,7 @@ class RabbitMQ(AgentCheck):
             tags = self._get_tags(item, object_type, custom_tags)
             url = '{}/{}/{}/bindings'.format(QUEUE_TYPE, urllib.quote_plus(vhost), urllib.quote_plus(item['name']))
             bindings_count = len(self._get_data(urlparse.urljoin(base_url, url), auth=auth,
-                    ssl_verify=ssl_verify, proxies=instance_proxy))
+                    ssl_verify=ssl_verify, proxies=instance_proxy, instance=instance))
 
             self.gauge('rabbitmq.queue.bindings.count', bindings_count, tags)
 
@@ -438,7 +450,7 @@ class RabbitMQ(AgentCheck):
                 url = "vhosts/{}/{}".format(urllib.quote_plus(vhost), object_type)
                 try:
                     data += self._get_data(urlparse.urljoin(base_url, url), auth=auth,
-                                          ssl_verify=ssl_verify, proxies=instance_proxy)
+                                          ssl_verify=ssl_verify, proxies=instance_proxy, instance=instance)
                 except Exception as e:
                     # This will happen if there is no connection data to grab
                     self.log.debug("Couldn't grab connection data from vhost, {}: {}".format(vhost, e))
@@ -446,7 +458,7 @@ class RabbitMQ(AgentCheck):
         # sometimes it seems to need to fall back to this
         if grab_all_data or not len(data):
             data = self._get_data(urlparse.urljoin(base_url, object_type), auth=auth,
-                                  ssl_verify=ssl_verify, proxies=instance_proxy)
+                                  ssl_verify=ssl_verify, proxies=instance_proxy, instance=instance)
 
         stats = {vhost: 0 for vhost in vhosts}
         connection_states = defaultdict(int)
@@ -511,7 +523,8 @@ class RabbitMQ(AgentCheck):
             path = u'aliveness-test/%s' % (urllib.quote_plus(vhost))
             aliveness_url = urlparse.urljoin(base_url, path)
             aliveness_proxy = self.get_instance_proxy(instance, aliveness_url)
-            aliveness_response = self._get_data(aliveness_url, auth=auth, ssl_verify=ssl_verify, proxies=aliveness_proxy)
+            aliveness_response = self._get_data(aliveness_url, auth=auth, ssl_verify=ssl_verify,
+                                                proxies=aliveness_proxy, instance=instance)
             message = u"Response from aliveness API: %s" % aliveness_response
 
             if aliveness_response.get('status') == 'ok':
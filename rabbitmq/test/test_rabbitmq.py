@@ -322,11 +322,11 @@ class TestRabbitMQ(AgentCheckTest):
         sys.path.pop()
 
     def test__get_data(self):
-        with mock.patch('datadog_checks.rabbitmq.rabbitmq.requests') as r:
+        with mock.patch('datadog_checks.utils.http.requests') as r:
             from datadog_checks.rabbitmq import RabbitMQ  # pylint: disable=import-error,no-name-in-module
             from datadog_checks.rabbitmq.rabbitmq import RabbitMQException  # pylint: disable=import-error,no-name-in-module
             check = RabbitMQ('rabbitmq', {}, {"instances": [{"rabbitmq_api_url": "http://example.com"}]})
-            r.get.side_effect = [requests.exceptions.HTTPError, ValueError]
+            r.Session.return_value.get.side_effect = [requests.exceptions.HTTPError, ValueError]
             self.assertRaises(RabbitMQException, check._get_data, '')
             self.assertRaises(RabbitMQException, check._get_data, '')
 
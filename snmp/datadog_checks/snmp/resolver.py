@@ -0,0 +1,83 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+
+# 3rd party
+from pyasn1.error import PyAsn1Error
+from pysnmp.error import PySnmpError
+from pysnmp.hlapi.varbinds import CommandGeneratorVarBinds
+from pysnmp.proto import rfc1902, rfc1905
+from pysnmp.smi.rfc1902 import ObjectIdentity
+
+# Above this number of OIDs, e.g. for tables whose rows keep changing, the cache starts over
+DEFAULT_MAX_CACHED_OIDS = 100000
+
+# Values without a syntax to cast
+UNRESOLVED_VALUES = (rfc1905.UnSpecified, rfc1905.NoSuchObject, rfc1905.NoSuchInstance, rfc1905.EndOfMibView)
+
+
+class OidResolver(object):
+    '''
+    Resolution of the OIDs returned by a device, kept across the runs of the check.
+
+    The first time an OID is seen, it's resolved with the MIBs into its dotted name,
+    the MIB symbol and row indexes, and the syntax of its values. The next times,
+    the raw values are cast to the cached syntax, without MIB lookup. The tags
+    rendered from the row indexes are cached as well.
+    '''
+
+    def __init__(self, snmp_engine, max_size=DEFAULT_MAX_CACHED_OIDS):
+        self.mib_view_controller = CommandGeneratorVarBinds().getMibViewController(snmp_engine)
+        self._mib_objects = self.mib_view_controller.mibBuilder.importSymbols(
+            'SNMPv2-SMI', 'MibScalar', 'MibTableColumn')
+        self.max_size = max_size
+        # oid tuple -> (dotted name, symbol, indexes, syntax)
+        self._oids = {}
+        # (indexes, index tags) -> tags
+        self._index_tags = {}
+
+    def resolve(self, oid, value):
+        '''
+        Return the dotted name, the MIB symbol, the row indexes of the `oid` tuple,
+        and the `value` cast to its syntax. A value that can't be cast, e.g. out of
+        the range of its syntax, is returned as is.
+        '''
+        entry = self._oids.get(oid)
+        if entry is None:
+            if len(self._oids) >= self.max_size:
+                self._oids.clear()
+                self._index_tags.clear()
+            entry = self._oids[oid] = self._resolve(oid)
+
+        name, symbol, indexes, syntax = entry
+        if syntax is not None and not isinstance(value, UNRESOLVED_VALUES):
+            try:
+                value = self._cast(syntax, value)
+            except (PySnmpError, PyAsn1Error):
+                pass
+        return name, symbol, indexes, value
+
+    def index_tags(self, indexes, index_tags, render):
+        '''
+        Return the tags of the row `indexes` for the (tag, index) pairs of `index_tags`,
+        rendered by `render(indexes, index_tags)` the first time.
+        '''
+        key = (indexes, index_tags)
+        tags = self._index_tags.get(key)
+        if tags is None:
+            tags = self._index_tags[key] = render(indexes, index_tags)
+        return tags
+
+    def _resolve(self, oid):
+        identity = ObjectIdentity(oid).resolveWithMib(self.mib_view_controller)
+        _, symbol, indexes = identity.getMibSymbol()
+        node = identity.getMibNode()
+        syntax = node.getSyntax() if isinstance(node, self._mib_objects) else None
+        return ".".join([str(i) for i in oid]), symbol, indexes, syntax
+
+    def _cast(self, syntax, value):
+        # Same conversion as the MIB lookup of pysnmp
+        value = syntax.clone(value)
+        if rfc1902.ObjectIdentifier().isSuperTypeOf(value, matchConstraints=False):
+            value = ObjectIdentity(value).resolveWithMib(self.mib_view_controller)
+        return value
@@ -0,0 +1,155 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+
+# std
+from collections import deque
+
+# 3rd party
+from pyasn1.type.univ import Null
+from pysnmp.error import PySnmpError
+from pysnmp.hlapi.asyncore import bulkCmd, getCmd, nextCmd
+from pysnmp.smi.exval import endOfMibView
+
+NULL = Null('')
+
+
+class AsyncSession(object):
+    '''
+    Requests to a device sent with the asyncore API of pysnmp, without waiting
+    for the response of a request before sending the next one.
+
+    At most `max_in_flight` requests are in flight for the device, and a permit of
+    the `limiter` semaphore, shared by all the devices, is held for each of them.
+    Subtrees are walked with GETBULK requests of `max_repetitions` rows, or with
+    GETNEXT requests if `bulk` is False, e.g. for SNMP v1.
+
+    Requests are queued with `get` and `walk`, and sent by `run`. Their callbacks
+    are called with (error_indication, error_status, var_binds) and can queue more.
+    '''
+
+    def __init__(self, snmp_engine, auth_data, transport_target, context_data, lookup_mib,
+                 limiter, max_in_flight, max_repetitions, bulk=True, ignore_nonincreasing_oid=False, log=None):
+        self.snmp_engine = snmp_engine
+        self.auth_data = auth_data
+        self.transport_target = transport_target
+        self.context_data = context_data
+        self.lookup_mib = lookup_mib
+        self.limiter = limiter
+        self.max_in_flight = max_in_flight
+        self.max_repetitions = max_repetitions
+        self.bulk = bulk
+        self.ignore_nonincreasing_oid = ignore_nonincreasing_oid
+        self.log = log
+
+        self.pending = deque()
+        self.in_flight = 0
+        self.send_errors = []
+
+    def get(self, oids, callback):
+        self.pending.append((self._send_get, (oids, callback)))
+
+    def walk(self, root_oid, callback):
+        '''
+        Fetch all the variables of the subtree of `root_oid`, a tuple. The callback is
+        called with the variables of each response.
+        '''
+        root_oid = tuple(root_oid)
+        self.pending.append((self._send_walk, (root_oid, root_oid, callback)))
+
+    def run(self):
+        '''
+        Send the queued requests and wait for all the responses.
+        Return the PySnmpErrors raised while sending requests.
+        '''
+        try:
+            while self.pending:
+                # Nothing is in flight for this device, wait for any device to free a permit
+                self.limiter.acquire()
+                self._send(*self.pending.popleft())
+                self._send_next()
+                if self.in_flight:
+                    self.snmp_engine.transportDispatcher.runDispatcher()
+        finally:
+            # Requests left unanswered after an error of the dispatcher
+            for _ in xrange(self.in_flight):
+                self.limiter.release()
+            self.in_flight = 0
+
+        send_errors, self.send_errors = self.send_errors, []
+        return send_errors
+
+    def _send(self, send, args):
+        # A permit of the limiter is held for the request
+        try:
+            send(*args)
+        except PySnmpError as e:
+            self.limiter.release()
+            self.send_errors.append(e)
+        else:
+            self.in_flight += 1
+
+    def _send_next(self):
+        while self.pending and self.in_flight < self.max_in_flight and self.limiter.acquire(False):
+            self._send(*self.pending.popleft())
+
+    def _complete(self, callback, error_indication, error_status, var_binds):
+        self.in_flight -= 1
+        self.limiter.release()
+        try:
+            callback(error_indication, error_status, var_binds)
+        except Exception:
+            # Exceptions would stop the dispatcher with the other requests in flight
+            if self.log:
+                self.log.exception("Error processing the SNMP response")
+        self._send_next()
+
+    def _send_get(self, oids, callback):
+        getCmd(self.snmp_engine, self.auth_data, self.transport_target, self.context_data,
+               *[(oid, NULL) for oid in oids],
+               cbFun=self._on_get_response, cbCtx=callback, lookupMib=self.lookup_mib)
+
+    def _on_get_response(self, snmp_engine, send_request_handle, error_indication, error_status, error_index,
+                         var_binds, callback):
+        self._complete(callback, error_indication, error_status, var_binds)
+
+    def _send_walk(self, root_oid, from_oid, callback):
+        if self.bulk:
+            bulkCmd(self.snmp_engine, self.auth_data, self.transport_target, self.context_data,
+                    0, self.max_repetitions, (from_oid, NULL),
+                    cbFun=self._on_walk_response, cbCtx=(root_oid, from_oid, callback), lookupMib=self.lookup_mib)
+        else:
+            nextCmd(self.snmp_engine, self.auth_data, self.transport_target, self.context_data,
+                    (from_oid, NULL),
+                    cbFun=self._on_walk_response, cbCtx=(root_oid, from_oid, callback), lookupMib=self.lookup_mib)
+
+    def _on_walk_response(self, snmp_engine, send_request_handle, error_indication, error_status, error_index,
+                          var_bind_table, cb_ctx):
+        root_oid, from_oid, callback = cb_ctx
+        var_binds = []
+        last_oid = from_oid
+        done = error_indication or error_status or not var_bind_table
+
+        if not done:
+            for row in var_bind_table:
+                oid, value = row[0]
+                oid = oid.asTuple()
+                if endOfMibView.isSameTypeWith(value) or oid[:len(root_oid)] != root_oid:
+                    done = True
+                    break
+                if oid <= last_oid:
+                    if self.ignore_nonincreasing_oid:
+                        continue
+                    if self.log:
+                        self.log.warning("OIDs are not increasing after %s, stopping the walk of %s",
+                                         '.'.join(str(i) for i in last_oid), '.'.join(str(i) for i in root_oid))
+                    done = True
+                    break
+                var_binds.append(row[0])
+                last_oid = oid
+
+        # The rest of the subtree is requested before more of the queued requests are sent
+        if not done and last_oid != from_oid:
+            self.pending.appendleft((self._send_walk, (root_oid, last_oid, callback)))
+
+        self._complete(callback, error_indication, error_status, var_binds)
@@ -5,6 +5,7 @@
 # std
 from collections import defaultdict
 from functools import wraps
+import threading
 
 # 3rd party
 from pysnmp.entity.rfc3413.oneliner import cmdgen
@@ -17,7 +18,8 @@ from pyasn1.type.univ import OctetString
 # project
 from checks.network_checks import NetworkCheck, Status
 from config import _is_affirmative
-
+from .resolver import OidResolver
+from .session import AsyncSession
 
 
 # Additional types that are not part of the SNMP protocol. cf RFC 2856
@@ -40,6 +42,9 @@ SNMP_GAUGES = frozenset([
     snmp_type.Integer32.__name__])
 
 DEFAULT_OID_BATCH_SIZE = 10
+DEFAULT_BULK_MAX_REPETITIONS = 10
+DEFAULT_MAX_REQUESTS_IN_FLIGHT = 64
+DEFAULT_MAX_REQUESTS_PER_DEVICE = 4
 
 
 def reply_invalid(oid):
@@ -61,10 +66,18 @@ class SnmpCheck(NetworkCheck):
                 instance['name'] = self._get_instance_key(instance)
 
         self.generators = {}
+        self.resolvers = {}
 
         # Set OID batch size
         self.oid_batch_size = int(init_config.get("oid_batch_size", DEFAULT_OID_BATCH_SIZE))
 
+        # Send the requests of the devices asynchronously, with at most max_requests_in_flight
+        # requests in flight for all the devices polled by the worker threads of the check
+        self.async_requests = _is_affirmative(init_config.get("async_requests", False))
+        self.bulk_max_repetitions = int(init_config.get("bulk_max_repetitions", DEFAULT_BULK_MAX_REPETITIONS))
+        self.requests_limiter = threading.BoundedSemaphore(
+            int(init_config.get("max_requests_in_flight", DEFAULT_MAX_REQUESTS_IN_FLIGHT)))
+
         # Load Custom MIB directory
         self.mibs_path = None
         self.ignore_nonincreasing_oid = False
@@ -224,6 +237,25 @@ class SnmpCheck(NetworkCheck):
             instance["service_check_error"] = message
             raise Exception(message)
 
+    def report_error_status(self, error_status, instance):
+        message = "{0} for instance {1}".format(error_status.prettyPrint(),
+                                                instance["ip_address"])
+        instance["service_check_error"] = message
+
+        # submit CRITICAL service check if we can't connect to device
+        if 'unknownUserName' in message:
+            instance["service_check_severity"] = Status.CRITICAL
+            self.log.error(message)
+        else:
+            self.warning(message)
+
+    def report_collection_error(self, error, instance):
+        if "service_check_error" not in instance:
+            instance["service_check_error"] = "Fail to collect some metrics: {0}".format(error)
+        if "service_check_severity" not in instance:
+            instance["service_check_severity"] = Status.CRITICAL
+        self.warning("Fail to collect some metrics: {0}".format(error))
+
     def check_table(self, instance, cmd_generator, oids, lookup_names,
                     timeout, retries, enforce_constraints=False):
         '''
@@ -252,7 +284,6 @@ class SnmpCheck(NetworkCheck):
 
         first_oid = 0
         all_binds = []
-        results = defaultdict(dict)
 
         while first_oid < len(oids):
             try:
@@ -263,6 +294,7 @@ class SnmpCheck(NetworkCheck):
                     *(oids[first_oid:first_oid + self.oid_batch_size]),
                     lookupValues=enforce_constraints,
                     lookupNames=lookup_names,
+                    lookupMib=False,
                     contextEngineId=context_engine_id,
                     contextName=context_name
                 )
@@ -290,6 +322,7 @@ class SnmpCheck(NetworkCheck):
                         *missing_results,
                         lookupValues=enforce_constraints,
                         lookupNames=lookup_names,
+                        lookupMib=False,
                         contextEngineId=context_engine_id,
                         contextName=context_name
                     )
@@ -298,16 +331,7 @@ class SnmpCheck(NetworkCheck):
                     self.raise_on_error_indication(error_indication, instance)
 
                     if error_status:
-                        message = "{0} for instance {1}".format(error_status.prettyPrint(),
-                                                                instance["ip_address"])
-                        instance["service_check_error"] = message
-
-                        # submit CRITICAL service check if we can't connect to device
-                        if 'unknownUserName' in message:
-                            instance["service_check_severity"] = Status.CRITICAL
-                            self.log.error(message)
-                        else:
-                            self.warning(message)
+                        self.report_error_status(error_status, instance)
 
                     for table_row in var_binds_table:
                         complete_results.extend(table_row)
@@ -315,26 +339,103 @@ class SnmpCheck(NetworkCheck):
                 all_binds.extend(complete_results)
 
             except PySnmpError as e:
-                if "service_check_error" not in instance:
-                    instance["service_check_error"] = "Fail to collect some metrics: {0}".format(e)
-                if "service_check_severity" not in instance:
-                    instance["service_check_severity"] = Status.CRITICAL
-                self.warning("Fail to collect some metrics: {0}".format(e))
+                self.report_collection_error(e, instance)
 
             # if we fail move onto next batch
             first_oid = first_oid + self.oid_batch_size
 
+        return self.make_results(instance, self.get_resolver(instance, cmd_generator), all_binds, lookup_names)
+
+    def check_table_async(self, instance, cmd_generator, oids, lookup_names,
+                          timeout, retries, enforce_constraints=False):
+        '''
+        Same as check_table, with the requests sent asynchronously: all the snmpget
+        batches are sent at once, and the oids not found are walked with GETBULK
+        requests of bulk_max_repetitions rows, or snmpgetnext for SNMP v1.
+        At most max_requests_per_device requests are in flight for the device.
+        '''
+        transport_target = self.get_transport_target(instance, timeout, retries)
+        auth_data = self.get_auth_data(instance)
+        context_engine_id, context_name = self.get_context_data(instance)
+        bulk = "community_string" not in instance or int(instance.get("snmp_version", 2)) != 1
+
+        session = AsyncSession(
+            cmd_generator.snmpEngine, auth_data, transport_target,
+            cmdgen.ContextData(context_engine_id, context_name),
+            # The results are resolved with the MIBs by the OidResolver of the device
+            lookup_mib=False,
+            limiter=self.requests_limiter,
+            max_in_flight=int(instance.get('max_requests_per_device', DEFAULT_MAX_REQUESTS_PER_DEVICE)),
+            max_repetitions=self.bulk_max_repetitions,
+            bulk=bulk,
+            ignore_nonincreasing_oid=self.ignore_nonincreasing_oid,
+            log=self.log
+        )
+
+        all_binds = []
+        error_indications = []
+
+        def on_walk_response(error_indication, error_status, var_binds):
+            if error_indication:
+                error_indications.append(error_indication)
+                return
+            if error_status:
+                self.report_error_status(error_status, instance)
+            all_binds.extend(var_binds)
+
+        def on_get_response(error_indication, error_status, var_binds):
+            if error_indication:
+                error_indications.append(error_indication)
+                return
+            self.log.debug("Returned vars: {0}".format(var_binds))
+            for var in var_binds:
+                result_oid, value = var
+                if reply_invalid(value):
+                    # If we didn't catch the metric using snmpget, walk it
+                    session.walk(result_oid.asTuple(), on_walk_response)
+                else:
+                    all_binds.append(var)
+
+        for first_oid in xrange(0, len(oids), self.oid_batch_size):
+            session.get(oids[first_oid:first_oid + self.oid_batch_size], on_get_response)
+
+        try:
+            send_errors = session.run()
+        except PySnmpError as e:
+            send_errors = [e]
+        for e in send_errors:
+            self.report_collection_error(e, instance)
+
+        # Raise on error_indication
+        if error_indications:
+            self.raise_on_error_indication(error_indications[0], instance)
+
+        return self.make_results(instance, self.get_resolver(instance, cmd_generator), all_binds, lookup_names)
+
+    def get_resolver(self, instance, cmd_generator):
+        '''
+        Return the OidResolver of the device, caching the resolution of its OIDs
+        with the MIBs loaded by the command generator.
+        '''
+        instance_key = instance['name']
+        resolver = self.resolvers.get(instance_key)
+        if resolver is None:
+            resolver = self.resolvers[instance_key] = OidResolver(cmd_generator.snmpEngine)
+        return resolver
+
+    def make_results(self, instance, resolver, all_binds, lookup_names):
+        results = defaultdict(dict)
+
         # if we've collected some variables, it's not that bad.
         if "service_check_severity" in instance and len(all_binds):
             instance["service_check_severity"] = Status.WARNING
 
+        # The values are raw, they're cast to the syntax of their MIB object by the resolver
         for result_oid, value in all_binds:
+            matching, metric, indexes, value = resolver.resolve(result_oid.asTuple(), value)
             if lookup_names:
-                _, metric, indexes = result_oid.getMibSymbol()
                 results[metric][indexes] = value
             else:
-                oid = result_oid.asTuple()
-                matching = ".".join([str(i) for i in oid])
                 results[matching] = value
         self.log.debug("Raw results: {0}".format(results))
         return results
@@ -346,6 +447,7 @@ class SnmpCheck(NetworkCheck):
         '''
 
         cmd_generator, ip_address, tags, metrics, timeout, retries, enforce_constraints = self._load_conf(instance)
+        check_table = self.check_table_async if self.async_requests else self.check_table
 
         if not metrics:
             raise Exception('Metrics list must contain at least one metric')
@@ -372,14 +474,15 @@ class SnmpCheck(NetworkCheck):
         try:
             if table_oids:
                 self.log.debug("Querying device %s for %s oids", ip_address, len(table_oids))
-                table_results = self.check_table(instance, cmd_generator, table_oids, True, timeout, retries,
-                                                 enforce_constraints=enforce_constraints)
-                self.report_table_metrics(metrics, table_results, tags)
+                table_results = check_table(instance, cmd_generator, table_oids, True, timeout, retries,
+                                            enforce_constraints=enforce_constraints)
+                self.report_table_metrics(metrics, table_results, tags,
+                                          resolver=self.get_resolver(instance, cmd_generator))
 
             if raw_oids:
                 self.log.debug("Querying device %s for %s oids", ip_address, len(raw_oids))
-                raw_results = self.check_table(instance, cmd_generator, raw_oids, False, timeout, retries,
-                                               enforce_constraints=False)
+                raw_results = check_table(instance, cmd_generator, raw_oids, False, timeout, retries,
+                                          enforce_constraints=False)
                 self.report_raw_metrics(metrics, raw_results, tags)
         except Exception as e:
             if "service_check_error" not in instance:
@@ -436,10 +539,11 @@ class SnmpCheck(NetworkCheck):
                     metric_tags = metric_tags + metric.get('metric_tags')
                 self.submit_metric(name, value, forced_type, metric_tags)
 
-    def report_table_metrics(self, metrics, results, tags):
+    def report_table_metrics(self, metrics, results, tags, resolver=None):
         '''
         For each of the metrics specified as needing to be resolved with mib,
         gather the tags requested in the instance conf for each row.
+        The tags of the row indexes are cached by the resolver, if any.
 
         Submit the results to the aggregator.
         '''
@@ -461,8 +565,9 @@ class SnmpCheck(NetworkCheck):
                 for value_to_collect in metric.get("symbols", []):
                     for index, val in results[value_to_collect].items():
                         metric_tags = tags + self.get_index_tags(index, results,
-                                                                 index_based_tags,
-                                                                 column_based_tags)
+                                                                 tuple(index_based_tags),
+                                                                 column_based_tags,
+                                                                 resolver)
                         self.submit_metric(value_to_collect, val, forced_type, metric_tags)
 
             elif 'symbol' in metric:
@@ -481,7 +586,7 @@ class SnmpCheck(NetworkCheck):
             else:
                 raise Exception('Unsupported metric in config file: %s' % metric)
 
-    def get_index_tags(self, index, results, index_tags, column_tags):
+    def get_index_tags(self, index, results, index_tags, column_tags, resolver=None):
         '''
         Gather the tags for this row of the table (index) based on the
         results (all the results from the query).
@@ -493,15 +598,10 @@ class SnmpCheck(NetworkCheck):
            could be a potential result, to use as a tage
            cf. ifDescr in the IF-MIB::ifTable for example
         '''
-        tags = []
-        for idx_tag in index_tags:
-            tag_group = idx_tag[0]
-            try:
-                tag_value = index[idx_tag[1] - 1].prettyPrint()
-            except IndexError:
-                self.log.warning("Not enough indexes, skipping this tag")
-                continue
-            tags.append("{0}:{1}".format(tag_group, tag_value))
+        if resolver is not None:
+            tags = list(resolver.index_tags(index, tuple(index_tags), self.render_index_tags))
+        else:
+            tags = self.render_index_tags(index, index_tags)
         for col_tag in column_tags:
             tag_group = col_tag[0]
             try:
@@ -517,6 +617,18 @@ class SnmpCheck(NetworkCheck):
             tags.append("{0}:{1}".format(tag_group, tag_value))
         return tags
 
+    def render_index_tags(self, index, index_tags):
+        tags = []
+        for idx_tag in index_tags:
+            tag_group = idx_tag[0]
+            try:
+                tag_value = index[idx_tag[1] - 1].prettyPrint()
+            except IndexError:
+                self.log.warning("Not enough indexes, skipping this tag")
+                continue
+            tags.append("{0}:{1}".format(tag_group, tag_value))
+        return tags
+
     def submit_metric(self, name, snmp_value, forced_type, tags=None):
         '''
         Convert the values reported as pysnmp-Managed Objects to values and
@@ -0,0 +1,38 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+
+# stdlib
+import unittest
+
+# 3rd party
+from pysnmp.entity.engine import SnmpEngine
+from pysnmp.proto.rfc1902 import Integer, Integer32
+
+# project
+from datadog_checks.snmp.resolver import OidResolver
+
+SYS_SERVICES = (1, 3, 6, 1, 2, 1, 1, 7, 0)
+
+
+class TestOidResolver(unittest.TestCase):
+
+    def setUp(self):
+        self.resolver = OidResolver(SnmpEngine())
+        self.resolver.mib_view_controller.mibBuilder.loadModules('SNMPv2-MIB')
+
+    def test_resolve(self):
+        for _ in range(2):
+            name, symbol, indexes, value = self.resolver.resolve(SYS_SERVICES, Integer(72))
+            self.assertEqual(name, '1.3.6.1.2.1.1.7.0')
+            self.assertEqual(symbol, 'sysServices')
+            self.assertEqual([i.prettyPrint() for i in indexes], ['0'])
+            self.assertTrue(Integer32().isSameTypeWith(value, matchConstraints=False))
+            self.assertEqual(int(value), 72)
+
+    def test_value_out_of_range(self):
+        # sysServices is in 0..127, the values that can't be cast are kept as returned by the device
+        for raw in [Integer(200), Integer(72), Integer(300)]:
+            _, symbol, _, value = self.resolver.resolve(SYS_SERVICES, raw)
+            self.assertEqual(symbol, 'sysServices')
+            self.assertEqual(int(value), int(raw))
@@ -0,0 +1,235 @@
+# (C) Datadog, Inc. 2018
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+
+# stdlib
+import threading
+import unittest
+
+# 3rd party
+import mock
+from pysnmp.error import PySnmpError
+from pysnmp.proto.rfc1902 import Integer32, ObjectName
+from pysnmp.smi.exval import endOfMibView
+
+# project
+from datadog_checks.snmp.session import AsyncSession
+
+ROOT = (1, 3, 6, 1, 2, 1, 2, 2, 1, 10)
+
+
+def oid(*suffix):
+    return ROOT + suffix
+
+
+class FakeDevice(object):
+    '''
+    Stand-in for the asyncore API of pysnmp and the device it sends requests to.
+
+    The requests are answered by `runDispatcher`, in the order they were sent, with the
+    variables of `table`, a list of (oid tuple, value) in the order the device walks them.
+    '''
+
+    def __init__(self, table):
+        self.table = table
+        self.transportDispatcher = self
+        self.requests = []
+        self.max_in_flight = 0
+        self._in_flight = []
+
+    def patch(self):
+        return mock.patch.multiple('datadog_checks.snmp.session',
+                                   bulkCmd=self.bulk_cmd, nextCmd=self.next_cmd, getCmd=self.get_cmd)
+
+    def bulk_cmd(self, snmp_engine, auth_data, transport_target, context_data, non_repeaters, max_repetitions,
+                 var_bind, **kwargs):
+        self._send('bulk', var_bind[0], [[row] for row in self._next_rows(var_bind[0], max_repetitions)], kwargs)
+
+    def next_cmd(self, snmp_engine, auth_data, transport_target, context_data, var_bind, **kwargs):
+        self._send('next', var_bind[0], [[row] for row in self._next_rows(var_bind[0], 1)], kwargs)
+
+    def get_cmd(self, snmp_engine, auth_data, transport_target, context_data, *var_binds, **kwargs):
+        values = dict(self.table)
+        self._send('get', var_binds[0][0], [(ObjectName(o), values[o]) for o, _ in var_binds], kwargs)
+
+    def runDispatcher(self):
+        while self._in_flight:
+            var_binds, kwargs = self._in_flight.pop(0)
+            kwargs['cbFun'](self, None, None, 0, 0, var_binds, kwargs['cbCtx'])
+
+    def _send(self, command, from_oid, var_binds, kwargs):
+        self.requests.append((command, from_oid))
+        self._in_flight.append((var_binds, kwargs))
+        self.max_in_flight = max(self.max_in_flight, len(self._in_flight))
+
+    def _next_rows(self, from_oid, count):
+        oids = [o for o, _ in self.table]
+        start = oids.index(from_oid) + 1 if from_oid in oids else len([o for o in oids if o <= from_oid])
+        rows = [(ObjectName(o), v) for o, v in self.table[start:start + count]]
+        # Past the last variable of the device
+        rows += [(ObjectName(from_oid), endOfMibView)] * (count - len(rows))
+        return rows
+
+
+def get_session(device, limiter=None, max_in_flight=5, max_repetitions=2, **kwargs):
+    if limiter is None:
+        limiter = threading.BoundedSemaphore(10)
+    return AsyncSession(device, None, None, None, False, limiter, max_in_flight, max_repetitions, **kwargs)
+
+
+class Collector(object):
+
+    def __init__(self):
+        self.var_binds = []
+        self.calls = 0
+
+    def __call__(self, error_indication, error_status, var_binds):
+        self.calls += 1
+        self.var_binds.extend(var_binds)
+
+    def oids(self):
+        return [o.asTuple() for o, _ in self.var_binds]
+
+
+class TestAsyncSession(unittest.TestCase):
+
+    def test_walk_pages(self):
+        next_column = (1, 3, 6, 1, 2, 1, 2, 2, 1, 11, 1)
+        device = FakeDevice([(oid(i), Integer32(i)) for i in range(1, 6)] + [(next_column, Integer32(0))])
+        session = get_session(device)
+        collector = Collector()
+
+        with device.patch():
+            session.walk(ROOT, collector)
+            self.assertEqual(session.run(), [])
+
+        # Pages of 2 rows, the third one leaves the subtree after the 5th row
+        self.assertEqual(collector.oids(), [oid(i) for i in range(1, 6)])
+        self.assertEqual(device.requests, [('bulk', ROOT), ('bulk', oid(2)), ('bulk', oid(4))])
+        self.assertEqual(collector.calls, 3)
+
+    def test_walk_end_of_mib_view(self):
+        device = FakeDevice([(oid(i), Integer32(i)) for i in range(1, 4)])
+        session = get_session(device)
+        collector = Collector()
+
+        with device.patch():
+            session.walk(ROOT, collector)
+            session.run()
+
+        self.assertEqual(collector.oids(), [oid(1), oid(2), oid(3)])
+        self.assertEqual(len(device.requests), 2)
+
+    def test_walk_getnext(self):
+        device = FakeDevice([(oid(i), Integer32(i)) for i in range(1, 4)])
+        session = get_session(device, bulk=False)
+        collector = Collector()
+
+        with device.patch():
+            session.walk(ROOT, collector)
+            session.run()
+
+        self.assertEqual(collector.oids(), [oid(1), oid(2), oid(3)])
+        self.assertEqual(device.requests, [('next', ROOT), ('next', oid(1)), ('next', oid(2)), ('next', oid(3))])
+
+    def test_walk_nonincreasing_oids(self):
+        table = [(oid(1), Integer32(1)), (oid(3), Integer32(3)), (oid(2), Integer32(2)), (oid(4), Integer32(4))]
+        log = mock.MagicMock()
+
+        device = FakeDevice(table)
+        collector = Collector()
+        with device.patch():
+            session = get_session(device, max_repetitions=10, log=log)
+            session.walk(ROOT, collector)
+            session.run()
+
+        # The walk stops at the first OID that isn't increasing, instead of looping on the device
+        self.assertEqual(collector.oids(), [oid(1), oid(3)])
+        self.assertEqual(len(device.requests), 1)
+        self.assertEqual(log.warning.call_count, 1)
+
+        device = FakeDevice(table)
+        collector = Collector()
+        with device.patch():
+            session = get_session(device, max_repetitions=10, ignore_nonincreasing_oid=True)
+            session.walk(ROOT, collector)
+            session.run()
+
+        self.assertEqual(collector.oids(), [oid(1), oid(3), oid(4)])
+
+    def test_get(self):
+        device = FakeDevice([(oid(1), Integer32(1)), (oid(2), Integer32(2))])
+        session = get_session(device)
+        collector = Collector()
+
+        with device.patch():
+            session.get([oid(2), oid(1)], collector)
+            session.run()
+
+        self.assertEqual(collector.var_binds,
+                         [(ObjectName(oid(2)), Integer32(2)), (ObjectName(oid(1)), Integer32(1))])
+
+    def test_max_in_flight(self):
+        device = FakeDevice([(oid(i), Integer32(i)) for i in range(1, 10)])
+        session = get_session(device, max_in_flight=3)
+        collector = Collector()
+
+        with device.patch():
+            for i in range(1, 10):
+                session.get([oid(i)], collector)
+            session.run()
+
+        self.assertEqual(device.max_in_flight, 3)
+        self.assertEqual(len(collector.var_binds), 9)
+
+    def test_limiter(self):
+        limiter = threading.BoundedSemaphore(2)
+        device = FakeDevice([(oid(i), Integer32(i)) for i in range(1, 10)])
+        session = get_session(device, limiter=limiter, max_in_flight=5)
+        collector = Collector()
+
+        with device.patch():
+            for i in range(1, 10):
+                session.get([oid(i)], collector)
+            session.run()
+
+        # The permits are shared by all the devices and given back once the responses are received
+        self.assertEqual(device.max_in_flight, 2)
+        self.assertEqual(len(collector.var_binds), 9)
+        self.assertTrue(limiter.acquire(False) and limiter.acquire(False))
+
+    def test_limiter_shared(self):
+        limiter = threading.BoundedSemaphore(1)
+        # The only permit is held by a request to another device
+        limiter.acquire()
+        release = threading.Timer(0.1, limiter.release)
+        release.start()
+
+        device = FakeDevice([(oid(i), Integer32(i)) for i in range(1, 4)])
+        session = get_session(device, limiter=limiter)
+        collector = Collector()
+        with device.patch():
+            for i in range(1, 4):
+                session.get([oid(i)], collector)
+            session.run()
+        release.join()
+
+        self.assertEqual(device.max_in_flight, 1)
+        self.assertEqual(len(collector.var_binds), 3)
+
+    def test_limiter_released_on_errors(self):
+        limiter = threading.BoundedSemaphore(2)
+        device = FakeDevice([(oid(1), Integer32(1))])
+        session = get_session(device, limiter=limiter, bulk=False)
+        error = PySnmpError('Bad transport')
+
+        def failing_callback(error_indication, error_status, var_binds):
+            raise Exception('Unexpected value')
+
+        with device.patch(), mock.patch('datadog_checks.snmp.session.nextCmd', side_effect=error):
+            session.walk(ROOT, Collector())
+            session.get([oid(1)], failing_callback)
+            self.assertEqual(session.run(), [error])
+
+        self.assertTrue(limiter.acquire(False) and limiter.acquire(False))
+        self.assertEqual(session.in_flight, 0)
@@ -6,6 +6,7 @@
 import copy
 
 # 3rd party
+import mock
 from nose.plugins.attrib import attr
 
 # agent
@@ -333,6 +334,76 @@ class SNMPTestCase(AgentCheckTest):
         self.coverage_report()
 
 
+    def test_table_async(self):
+        """
+        Support SNMP tabular objects with asynchronous GETBULK requests
+        """
+        config = {
+            'init_config': {
+                'async_requests': True,
+                'bulk_max_repetitions': 2,
+                'max_requests_in_flight': 2,
+            },
+            'instances': [self.generate_instance_config(self.TABULAR_OBJECTS + self.SCALAR_OBJECTS)]
+        }
+        self.run_check_n(config, repeat=3, sleep=2)
+        self.service_checks = self.wait_for_async('get_service_checks', 'service_checks', 1, RESULTS_TIMEOUT)
+
+        # Test metrics
+        for symbol in self.TABULAR_OBJECTS[0]['symbols']:
+            metric_name = "snmp." + symbol
+            self.assertMetric(metric_name, at_least=1)
+            self.assertMetricTag(metric_name, self.CHECK_TAGS[0], at_least=1)
+
+            for mtag in self.TABULAR_OBJECTS[0]['metric_tags']:
+                tag = mtag['tag']
+                self.assertMetricTagPrefix(metric_name, tag, at_least=1)
+
+        for metric in self.SCALAR_OBJECTS:
+            metric_name = "snmp." + (metric.get('name') or metric.get('symbol'))
+            self.assertMetric(metric_name, tags=self.CHECK_TAGS, at_least=1)
+
+        # Test service check
+        self.assertServiceCheck("snmp.can_check", status=AgentCheck.OK,
+                                tags=self.CHECK_TAGS, at_least=1)
+
+        self.coverage_report()
+
+    def test_oid_resolver(self):
+        """
+        OIDs are resolved with the MIBs on the first run only, then served from the cache of the device
+        """
+        config = {
+            'instances': [self.generate_instance_config(self.TABULAR_OBJECTS + self.SCALAR_OBJECTS)]
+        }
+        self.run_check(config)
+        self.wait_for_async('get_service_checks', 'service_checks', 1, RESULTS_TIMEOUT)
+
+        resolver = self.check.resolvers['localhost']
+        with mock.patch.object(resolver, '_resolve', side_effect=AssertionError("OID resolved again")):
+            self.run_check_n(config, repeat=2, sleep=2)
+            self.service_checks = self.wait_for_async('get_service_checks', 'service_checks', 1, RESULTS_TIMEOUT)
+
+        # Test metrics
+        for symbol in self.TABULAR_OBJECTS[0]['symbols']:
+            metric_name = "snmp." + symbol
+            self.assertMetric(metric_name, at_least=1)
+            self.assertMetricTag(metric_name, self.CHECK_TAGS[0], at_least=1)
+
+            for mtag in self.TABULAR_OBJECTS[0]['metric_tags']:
+                tag = mtag['tag']
+                self.assertMetricTagPrefix(metric_name, tag, at_least=1)
+
+        for metric in self.SCALAR_OBJECTS:
+            metric_name = "snmp." + (metric.get('name') or metric.get('symbol'))
+            self.assertMetric(metric_name, tags=self.CHECK_TAGS, at_least=1)
+
+        # Test service check
+        self.assertServiceCheck("snmp.can_check", status=AgentCheck.OK,
+                                tags=self.CHECK_TAGS, at_least=1)
+
+        self.coverage_report()
+
     def test_table_v3_MD5_DES(self):
         """
         Support SNMP V3 priv modes: MD5 + DES
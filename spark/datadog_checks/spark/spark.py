@@ -4,13 +4,13 @@
 from urlparse import urljoin, urlsplit, urlunsplit, urlparse
 from collections import namedtuple
 
-import requests
 from requests.exceptions import Timeout, HTTPError, InvalidURL, ConnectionError
 from simplejson import JSONDecodeError
 from bs4 import BeautifulSoup
 
 from datadog_checks.checks import AgentCheck
 from datadog_checks.config import is_affirmative
+from datadog_checks.utils.executor import BoundedExecutor
 
 # Identifier for cluster master address in `spark.yaml`
 MASTER_ADDRESS = 'spark_url'
@@ -26,6 +26,9 @@ SPARK_MESOS_MODE = 'spark_mesos_mode'
 # option enabling compatibility mode for Spark ver < 2
 SPARK_PRE_20_MODE = 'spark_pre_20_mode'
 
+# Maximum number of REST requests made concurrently to the Spark applications
+DEFAULT_MAX_CONCURRENT_REQUESTS = 10
+
 # Service Checks
 SPARK_STANDALONE_SERVICE_CHECK = 'spark.standalone_master.can_connect'
 YARN_SERVICE_CHECK = 'spark.resource_manager.can_connect'
@@ -136,6 +139,10 @@ RequestsConfig = namedtuple(
 
 class SparkCheck(AgentCheck):
 
+    def get_http_min_pool_size(self, instance):
+        # Keep a connection to the applications for each of the concurrent requests
+        return int(instance.get('max_concurrent_requests', DEFAULT_MAX_CONCURRENT_REQUESTS))
+
     def check(self, instance):
         # Get additional tags from the conf file
         tags = instance.get('tags', [])
@@ -152,17 +159,19 @@ class SparkCheck(AgentCheck):
 
         spark_apps = self._get_running_apps(instance, requests_config)
 
+        executor = BoundedExecutor.from_config(instance, DEFAULT_MAX_CONCURRENT_REQUESTS, name='spark')
+
         # Get the job metrics
-        self._spark_job_metrics(instance, spark_apps, tags, requests_config)
+        self._spark_job_metrics(instance, spark_apps, tags, requests_config, executor)
 
         # Get the stage metrics
-        self._spark_stage_metrics(instance, spark_apps, tags, requests_config)
+        self._spark_stage_metrics(instance, spark_apps, tags, requests_config, executor)
 
         # Get the executor metrics
-        self._spark_executor_metrics(instance, spark_apps, tags, requests_config)
+        self._spark_executor_metrics(instance, spark_apps, tags, requests_config, executor)
 
         # Get the rdd metrics
-        self._spark_rdd_metrics(instance, spark_apps, tags, requests_config)
+        self._spark_rdd_metrics(instance, spark_apps, tags, requests_config, executor)
 
         # Report success after gathering all metrics from the ApplicationMaster
         if spark_apps:
@@ -436,17 +445,12 @@ class SparkCheck(AgentCheck):
 
         return spark_apps
 
-    def _spark_job_metrics(self, instance, running_apps, addl_tags, requests_config):
+    def _spark_job_metrics(self, instance, running_apps, addl_tags, requests_config, executor):
         '''
         Get metrics for each Spark job.
         '''
-        for app_id, (app_name, tracking_url) in running_apps.iteritems():
-
-            base_url = self._get_request_url(instance, tracking_url)
-            response = self._rest_request_to_json(
-                base_url,
-                SPARK_APPS_PATH,
-                SPARK_SERVICE_CHECK, requests_config, addl_tags, app_id, 'jobs')
+        for app_name, response in self._get_apps_json(
+                instance, running_apps, addl_tags, requests_config, executor, 'jobs'):
 
             for job in response:
 
@@ -459,17 +463,12 @@ class SparkCheck(AgentCheck):
                 self._set_metrics_from_json(tags, job, SPARK_JOB_METRICS)
                 self._set_metric('spark.job.count', INCREMENT, 1, tags)
 
-    def _spark_stage_metrics(self, instance, running_apps, addl_tags, requests_config):
+    def _spark_stage_metrics(self, instance, running_apps, addl_tags, requests_config, executor):
         '''
         Get metrics for each Spark stage.
         '''
-        for app_id, (app_name, tracking_url) in running_apps.iteritems():
-
-            base_url = self._get_request_url(instance, tracking_url)
-            response = self._rest_request_to_json(
-                base_url,
-                SPARK_APPS_PATH,
-                SPARK_SERVICE_CHECK, requests_config, addl_tags, app_id, 'stages')
+        for app_name, response in self._get_apps_json(
+                instance, running_apps, addl_tags, requests_config, executor, 'stages'):
 
             for stage in response:
 
@@ -482,41 +481,31 @@ class SparkCheck(AgentCheck):
                 self._set_metrics_from_json(tags, stage, SPARK_STAGE_METRICS)
                 self._set_metric('spark.stage.count', INCREMENT, 1, tags)
 
-    def _spark_executor_metrics(self, instance, running_apps, addl_tags, requests_config):
+    def _spark_executor_metrics(self, instance, running_apps, addl_tags, requests_config, executor):
         '''
         Get metrics for each Spark executor.
         '''
-        for app_id, (app_name, tracking_url) in running_apps.iteritems():
-
-            base_url = self._get_request_url(instance, tracking_url)
-            response = self._rest_request_to_json(
-                base_url,
-                SPARK_APPS_PATH,
-                SPARK_SERVICE_CHECK, requests_config, addl_tags, app_id, 'executors')
+        for app_name, response in self._get_apps_json(
+                instance, running_apps, addl_tags, requests_config, executor, 'executors'):
 
             tags = ['app_name:%s' % str(app_name)]
             tags.extend(addl_tags)
 
-            for executor in response:
-                if executor.get('id') == 'driver':
-                    self._set_metrics_from_json(tags, executor, SPARK_DRIVER_METRICS)
+            for executor_json in response:
+                if executor_json.get('id') == 'driver':
+                    self._set_metrics_from_json(tags, executor_json, SPARK_DRIVER_METRICS)
                 else:
-                    self._set_metrics_from_json(tags, executor, SPARK_EXECUTOR_METRICS)
+                    self._set_metrics_from_json(tags, executor_json, SPARK_EXECUTOR_METRICS)
 
             if len(response):
                 self._set_metric('spark.executor.count', INCREMENT, len(response), tags)
 
-    def _spark_rdd_metrics(self, instance, running_apps, addl_tags, requests_config):
+    def _spark_rdd_metrics(self, instance, running_apps, addl_tags, requests_config, executor):
         '''
         Get metrics for each Spark RDD.
         '''
-        for app_id, (app_name, tracking_url) in running_apps.iteritems():
-
-            base_url = self._get_request_url(instance, tracking_url)
-            response = self._rest_request_to_json(
-                base_url,
-                SPARK_APPS_PATH,
-                SPARK_SERVICE_CHECK, requests_config, addl_tags, app_id, 'storage/rdd')
+        for app_name, response in self._get_apps_json(
+                instance, running_apps, addl_tags, requests_config, executor, 'storage/rdd'):
 
             tags = ['app_name:%s' % str(app_name)]
             tags.extend(addl_tags)
@@ -527,6 +516,33 @@ class SparkCheck(AgentCheck):
             if len(response):
                 self._set_metric('spark.rdd.count', INCREMENT, len(response), tags)
 
+    def _get_apps_json(self, instance, running_apps, addl_tags, requests_config, executor, object_path):
+        '''
+        Query the given path of each Spark application concurrently.
+
+        Return an iterator of (app_name, JSON response) in the order of `running_apps`.
+        The requests run on the threads of the executor, and only return their response
+        or raise: a failed request is reported from the check thread, when its response
+        is reached, and stops the iteration.
+        '''
+        apps = []
+        requests_args = []
+        for app_id, (app_name, tracking_url) in running_apps.iteritems():
+            base_url = self._get_request_url(instance, tracking_url)
+            url = self._build_url(base_url, SPARK_APPS_PATH, app_id, object_path)
+            apps.append((app_name, base_url, url))
+            requests_args.append((url, requests_config))
+
+        responses = executor.map(self._get_json, requests_args)
+        for app_name, base_url, url in apps:
+            try:
+                response = next(responses)
+            except Exception as e:
+                self._report_request_error(SPARK_SERVICE_CHECK, base_url, url, addl_tags, e)
+                raise
+
+            yield app_name, response
+
     def _set_metrics_from_json(self, tags, metrics_json, metrics):
         '''
         Parse the JSON response and set the metrics
@@ -556,14 +572,52 @@ class SparkCheck(AgentCheck):
         '''
         Query the given URL and return the response
         '''
-        response = None
-        service_check_tags = ['url:%s' % self._get_url_base(address)] + tags
+        url = self._build_url(address, object_path, *args, **kwargs)
+
+        try:
+            return self._get(url, requests_config)
+        except Exception as e:
+            self._report_request_error(service_name, address, url, tags, e)
+            raise
+
+    def _rest_request_to_json(self, address, object_path, service_name, requests_config, tags, *args, **kwargs):
+        '''
+        Query the given URL and return the JSON response
+        '''
+        url = self._build_url(address, object_path, *args, **kwargs)
 
+        try:
+            return self._get_json(url, requests_config)
+        except Exception as e:
+            self._report_request_error(service_name, address, url, tags, e)
+            raise
+
+    def _build_url(self, address, object_path, *args, **kwargs):
+        '''
+        Return the URL of the object path, directories `args` and query arguments `kwargs` on `address`
+        '''
         url = address
 
         if object_path:
             url = self._join_url_dir(url, object_path)
 
+        # Add args to the url
+        if args:
+            for directory in args:
+                url = self._join_url_dir(url, directory)
+
+        # Add kwargs as arguments
+        if kwargs:
+            query = '&'.join(['{0}={1}'.format(key, value) for key, value in kwargs.iteritems()])
+            url = urljoin(url, '?' + query)
+
+        return url
+
+    def _get(self, url, requests_config):
+        '''
+        Query the given URL and return the response, raise if the request failed.
+        It can run on the threads of an executor, so it doesn't submit anything.
+        '''
         # Load SSL configuration, if available.
         # ssl_verify can be a bool or a string
         # (http://docs.python-requests.org/en/latest/user/advanced/#ssl-cert-verification)
@@ -578,71 +632,44 @@ class SparkCheck(AgentCheck):
         else:
             cert = None
 
-        # Add args to the url
-        if args:
-            for directory in args:
-                url = self._join_url_dir(url, directory)
-
-        # Add kwargs as arguments
-        if kwargs:
-            query = '&'.join(['{0}={1}'.format(key, value) for key, value in kwargs.iteritems()])
-            url = urljoin(url, '?' + query)
-
-        try:
-            self.log.debug('Spark check URL: %s' % url)
-            response = requests.get(
-                url,
-                auth=requests_config.auth,
-                verify=verify,
-                cert=cert
-            )
-
-            response.raise_for_status()
-
-        except Timeout as e:
-            self.service_check(
-                service_name,
-                AgentCheck.CRITICAL,
-                tags=service_check_tags,
-                message='Request timeout: {0}, {1}'.format(url, e))
-            raise
-
-        except (HTTPError, InvalidURL, ConnectionError) as e:
-            self.service_check(
-                service_name,
-                AgentCheck.CRITICAL,
-                tags=service_check_tags,
-                message='Request failed: {0}, {1}'.format(url, e))
-            raise
-
-        except ValueError as e:
-            self.service_check(
-                service_name,
-                AgentCheck.CRITICAL,
-                tags=service_check_tags,
-                message=str(e))
-            raise
+        self.log.debug('Spark check URL: %s' % url)
+        response = self.http.get(
+            url,
+            auth=requests_config.auth,
+            verify=verify,
+            cert=cert
+        )
 
+        response.raise_for_status()
         return response
 
-    def _rest_request_to_json(self, address, object_path, service_name, requests_config, tags, *args, **kwargs):
+    def _get_json(self, url, requests_config):
         '''
-        Query the given URL and return the JSON response
+        Query the given URL and return the JSON response, raise if the request failed.
+        It can run on the threads of an executor, so it doesn't submit anything.
         '''
-        response = self._rest_request(address, object_path, service_name, requests_config, tags, *args, **kwargs)
+        return self._get(url, requests_config).json()
 
-        try:
-            response_json = response.json()
-
-        except JSONDecodeError as e:
-            self.service_check(
-                service_name,
-                AgentCheck.CRITICAL,
-                tags=['url:%s' % self._get_url_base(address)] + tags,
-                message='JSON Parse failed: {0}'.format(e))
-            raise
+    def _report_request_error(self, service_name, address, url, tags, error):
+        '''
+        Report the service check of a request to `address` that failed with `error`
+        '''
+        if isinstance(error, Timeout):
+            message = 'Request timeout: {0}, {1}'.format(url, error)
+        elif isinstance(error, (HTTPError, InvalidURL, ConnectionError)):
+            message = 'Request failed: {0}, {1}'.format(url, error)
+        elif isinstance(error, JSONDecodeError):
+            message = 'JSON Parse failed: {0}'.format(error)
+        elif isinstance(error, ValueError):
+            message = str(error)
+        else:
+            return
 
-        return response_json
+        self.service_check(
+            service_name,
+            AgentCheck.CRITICAL,
+            tags=['url:%s' % self._get_url_base(address)] + tags,
+            message=message)
 
     def _join_url_dir(self, url, *args):
         '''
@@ -13,12 +13,15 @@ import BaseHTTPServer
 import threading
 import ssl
 import time
+from collections import OrderedDict
 import requests
 import mock
 import pytest
 
 from datadog_checks.stubs import aggregator as _aggregator
 from datadog_checks.spark import SparkCheck
+from datadog_checks.utils.executor import BoundedExecutor
+from datadog_checks.utils.timeout import TimeoutException
 
 # IDs
 YARN_APP_ID = 'application_1459362484344_0011'
@@ -548,7 +551,7 @@ SPARK_METRIC_TAGS = [
 
 
 def test_yarn(aggregator):
-    with mock.patch('requests.get', yarn_requests_get_mock):
+    with mock.patch('requests.Session.get', side_effect=yarn_requests_get_mock):
         c = SparkCheck('spark', None, {}, [YARN_CONFIG])
         c.check(YARN_CONFIG)
 
@@ -614,7 +617,7 @@ def test_yarn(aggregator):
 
 
 def test_auth_yarn(aggregator):
-    with mock.patch('requests.get', yarn_requests_auth_mock):
+    with mock.patch('requests.Session.get', side_effect=yarn_requests_auth_mock):
         c = SparkCheck('spark', None, {}, [YARN_AUTH_CONFIG])
         c.check(YARN_AUTH_CONFIG)
 
@@ -633,7 +636,7 @@ def test_auth_yarn(aggregator):
 
 
 def test_mesos(aggregator):
-    with mock.patch('requests.get', mesos_requests_get_mock):
+    with mock.patch('requests.Session.get', side_effect=mesos_requests_get_mock):
         c = SparkCheck('spark', None, {}, [MESOS_CONFIG])
         c.check(MESOS_CONFIG)
 
@@ -705,7 +708,7 @@ def test_mesos(aggregator):
 
 
 def test_mesos_filter(aggregator):
-    with mock.patch('requests.get', mesos_requests_get_mock):
+    with mock.patch('requests.Session.get', side_effect=mesos_requests_get_mock):
         c = SparkCheck('spark', None, {}, [MESOS_FILTERED_CONFIG])
         c.check(MESOS_FILTERED_CONFIG)
 
@@ -717,7 +720,7 @@ def test_mesos_filter(aggregator):
 
 
 def test_standalone(aggregator):
-    with mock.patch('requests.get', standalone_requests_get_mock):
+    with mock.patch('requests.Session.get', side_effect=standalone_requests_get_mock):
         c = SparkCheck('spark', None, {}, [STANDALONE_CONFIG])
         c.check(STANDALONE_CONFIG)
 
@@ -787,7 +790,7 @@ def test_standalone(aggregator):
 
 
 def test_standalone_pre20(aggregator):
-    with mock.patch('requests.get', standalone_requests_pre20_get_mock):
+    with mock.patch('requests.Session.get', side_effect=standalone_requests_pre20_get_mock):
         c = SparkCheck('spark', None, {}, [STANDALONE_CONFIG_PRE_20])
         c.check(STANDALONE_CONFIG_PRE_20)
 
@@ -856,6 +859,101 @@ def test_standalone_pre20(aggregator):
             assert sc.tags == ['url:http://localhost:4040', 'cluster_name:SparkCluster']
 
 
+class MockJobsResponse(object):
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+    def json(self):
+        return [{'status': 'RUNNING', 'numTasks': 1}]
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise requests.exceptions.HTTPError('{} Server Error'.format(self.status_code))
+
+
+def concurrent_requests_get_mock(delays, failing=()):
+    """
+    Answer the jobs requests of the applications `app_<i>` after `delays[i]` seconds,
+    with an error for the applications of `failing`
+    """
+    def get(url, *args, **kwargs):
+        app_id = url.split('/')[-2]
+        time.sleep(delays[int(app_id.split('_')[1])])
+        return MockJobsResponse(500 if app_id in failing else 200)
+
+    return get
+
+
+def running_apps(count):
+    return OrderedDict(('app_{}'.format(i), ('app{}'.format(i), SPARK_APP_URL)) for i in range(count))
+
+
+def test_concurrent_requests(aggregator):
+    c = SparkCheck('spark', None, {}, [YARN_CONFIG])
+    requests_config = c._get_requests_config(YARN_CONFIG)
+
+    # Responses complete in the reverse order of the requests
+    with mock.patch('requests.Session.get', side_effect=concurrent_requests_get_mock([0.3, 0.2, 0.1, 0])):
+        c._spark_job_metrics(YARN_CONFIG, running_apps(4), CUSTOM_TAGS, requests_config, BoundedExecutor(4))
+
+    # Metrics are submitted in the order of the applications
+    assert [m.tags[0] for m in aggregator.metrics('spark.job.count')] == [
+        'app_name:app{}'.format(i) for i in range(4)]
+
+
+def test_concurrent_request_failure(aggregator):
+    c = SparkCheck('spark', None, {}, [YARN_CONFIG])
+    requests_config = c._get_requests_config(YARN_CONFIG)
+    submitting_threads = set()
+    service_check = c.service_check
+
+    def record_service_check(*args, **kwargs):
+        submitting_threads.add(threading.current_thread())
+        service_check(*args, **kwargs)
+
+    get = concurrent_requests_get_mock([0.1, 0, 0, 0], failing=('app_1', 'app_2'))
+    with mock.patch('requests.Session.get', side_effect=get), \
+            mock.patch.object(c, 'service_check', record_service_check):
+        with pytest.raises(requests.exceptions.HTTPError):
+            c._spark_job_metrics(YARN_CONFIG, running_apps(4), CUSTOM_TAGS, requests_config, BoundedExecutor(4))
+
+    # The metrics of the application before the failing one are submitted,
+    # and only the first failure is reported, from the check thread
+    aggregator.assert_metric('spark.job.count', count=1)
+    aggregator.assert_service_check(
+        SPARK_SERVICE_CHECK,
+        status=SparkCheck.CRITICAL,
+        tags=['url:' + SPARK_APP_URL] + CUSTOM_TAGS,
+        count=1)
+    assert len(aggregator.service_checks(SPARK_SERVICE_CHECK)) == 1
+    assert submitting_threads == {threading.current_thread()}
+
+
+def test_concurrent_requests_timeout(aggregator):
+    c = SparkCheck('spark', None, {}, [YARN_CONFIG])
+    requests_config = c._get_requests_config(YARN_CONFIG)
+
+    get = concurrent_requests_get_mock([0, 0.5, 0], failing=('app_1',))
+    with mock.patch('requests.Session.get', side_effect=get):
+        with pytest.raises(TimeoutException):
+            c._spark_job_metrics(
+                YARN_CONFIG, running_apps(3), CUSTOM_TAGS, requests_config, BoundedExecutor(3, timeout=0.2))
+
+        # The request still in flight fails after the check run, without submitting anything
+        time.sleep(0.5)
+
+    aggregator.assert_metric('spark.job.count', count=1)
+    assert not aggregator.service_checks(SPARK_SERVICE_CHECK)
+
+
+def test_http_pool_size():
+    c = SparkCheck('spark', None, {}, [dict(YARN_CONFIG, max_concurrent_requests=32)])
+    assert c.http.pool_size == 32
+
+    c = SparkCheck('spark', None, {}, [YARN_CONFIG])
+    assert c.http.pool_size == 10
+
+
 def test_ssl():
     run_ssl_server()
     c = SparkCheck('spark', None, {}, [SSL_CONFIG])
@@ -84,7 +84,6 @@ from urlparse import urljoin, urlsplit, urlunsplit
 
 # 3rd party
 from requests.exceptions import Timeout, HTTPError, InvalidURL, ConnectionError, SSLError
-import requests
 
 # Project
 from datadog_checks.checks import AgentCheck
@@ -428,7 +427,7 @@ class YarnCheck(AgentCheck):
             url = urljoin(url, '?' + query)
 
         try:
-            response = requests.get(url, auth=auth, verify=ssl_verify, timeout=self.default_integration_http_timeout)
+            response = self.http.get(url, auth=auth, verify=ssl_verify, timeout=self.default_integration_http_timeout)
             response.raise_for_status()
             response_json = response.json()
 
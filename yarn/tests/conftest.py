@@ -24,7 +24,7 @@ def aggregator():
 
 @pytest.fixture
 def mocked_request():
-    with patch("requests.get", new=requests_get_mock):
+    with patch("requests.Session.get", side_effect=requests_get_mock):
         yield
 
 
@@ -40,7 +40,7 @@ def mocked_auth_request():
         # Return mocked request.get(...)
         return requests_get_mock(*args, **kwargs)
 
-    with patch("requests.get", new=requests_auth_get):
+    with patch("requests.Session.get", side_effect=requests_auth_get):
         yield
 
 
@@ -59,7 +59,7 @@ def mocked_bad_cert_request():
         # Return the actual response
         return requests_get_mock(*args, **kwargs)
 
-    with patch("requests.get", new=requests_bad_cert_get):
+    with patch("requests.Session.get", side_effect=requests_bad_cert_get):
         yield
 
 